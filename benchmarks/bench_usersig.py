@@ -0,0 +1,75 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+user sig generation throughput
+
+    python benchmarks/bench_usersig.py [count] [processes]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from TLSSigAPIv2 import TLSSigAPIv2  # noqa: E402
+
+from tencentcloud_im.usersig import UserSigGenerator  # noqa: E402
+
+SDK_ID = 1400000000
+KEY = "5bd2850fff3ecb11d7c805251c51ee463a25727bddc2385f3fa8bfee1bb93b5e"
+EXPIRE = 180 * 86400
+
+
+def report(name, count, seconds):
+  print(
+    "{:<28}{:>10} sigs {:>8.3f}s {:>12.0f} sigs/sec".format(name, count, seconds, count / seconds)
+  )
+
+
+def bench(name, count, func):
+  start = time.perf_counter()
+  func()
+  report(name, count, time.perf_counter() - start)
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+  processes = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 2)
+  user_ids = ["user{}".format(i) for i in range(count)]
+
+  def new_signer_per_call():
+    for user_id in user_ids:
+      TLSSigAPIv2(SDK_ID, KEY).gen_sig(user_id, EXPIRE)
+
+  bench("new signer per call", count, new_signer_per_call)
+
+  generator = UserSigGenerator(SDK_ID, KEY)
+  bench("gen_many cold", count, lambda: generator.gen_many(user_ids, EXPIRE))
+  bench("gen_many cached", count, lambda: generator.gen_many(user_ids, EXPIRE))
+
+  # pool_threshold=0 so the warm-up batch starts the workers whatever its size
+  pooled = UserSigGenerator(SDK_ID, KEY, cache_size=0, processes=processes, pool_threshold=0)
+  try:
+    pooled.gen_many(user_ids[:processes * 100], EXPIRE)
+    bench(
+      "gen_many {} processes".format(processes), count, lambda: pooled.gen_many(user_ids, EXPIRE)
+    )
+  finally:
+    pooled.close()
+
+
+if __name__ == "__main__":
+  main()
@@ -16,10 +16,11 @@ setuptools.setup(
     package_dir={'': 'src'},
     package_data={'': ['tcim.json', '*.py']},
     install_requires = ['tls-sig-api-v2>=1.1'],
+    extras_require={'async': ['aiohttp>=3.7']},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: Apache Software License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.7',
 )
@@ -0,0 +1,142 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .bulk import (
+  BATCH_SEND_LIMIT, ProgressCounter, batch_send_report, chunked, run_chunks_async,
+  stream_chunks_async
+)
+from .executor import AsyncExecutor
+from .paginate import paginate_async
+from .tcim_client import TCIM_API_BASE, TCIMClient, logger
+from .transport import AsyncTransport
+
+
+class AsyncTCIMClient(TCIMClient):
+  """
+    asyncio Tecent Im Rest API Client
+
+    same methods and payloads as TCIMClient, every rest method is a coroutine:
+
+    >>> async with AsyncTCIMClient(sdk_id, sdk_secret, admin_account) as client:
+    >>>     response = await client.check_user_online(["user0"])
+
+    get_user_sig does no io and stays a plain method. the iter_* methods return async
+    generators:
+
+    >>> async for friend in client.iter_friends("user0"):
+    >>>     print(friend["To_Account"])
+
+    Attributes
+      transport: non-blocking pooled http transport shared by all in-flight calls
+      executor: AsyncExecutor(transport) by default
+    """
+
+  def __init__(
+    self,
+    sdk_id,
+    key,
+    admin,
+    tencent_url=TCIM_API_BASE,
+    expire_time=60 * 5,
+    transport: AsyncTransport = None,
+    executor=None,
+    rate_limiter=None,
+    retry_policy=None,
+    endpoint_guard=None,
+    cache=None
+  ):
+    """
+        :param sdk_id: IM SDK ID
+        :param key:    IM SDK SECRET KEY
+        :param admin:  ADMIN
+        :param tencent_url: tencent rest url
+        :param expire_time:   expire time
+        :param transport: async http transport, a default AsyncTransport is created when omitted
+        :param executor: executor with an async execute, AsyncExecutor(transport) by default
+        :param rate_limiter: ratelimit.RateLimiter, callers wait on it without blocking the loop
+        :param retry_policy: retry.RetryPolicy, backoff waits without blocking the loop
+        :param endpoint_guard: breaker.EndpointGuard, waits without blocking the loop
+        :param cache: cache.ResponseCache of read-only endpoints
+        """
+    transport = transport if transport is not None else AsyncTransport()
+    super(AsyncTCIMClient, self).__init__(
+      sdk_id,
+      key,
+      admin,
+      tencent_url=tencent_url,
+      expire_time=expire_time,
+      transport=transport,
+      executor=executor if executor is not None else AsyncExecutor(transport),
+      rate_limiter=rate_limiter,
+      retry_policy=retry_policy,
+      endpoint_guard=endpoint_guard,
+      cache=cache
+    )
+
+  async def _call(self, path: str, data, error_message: str):
+    try:
+      return await self.executor.execute(self.build_request(path, data))
+    except Exception as e:
+      logger.error("{}:{}".format(error_message, e))
+      return None
+
+  async def _reject(self, error_message: str):
+    logger.error(error_message)
+    return None
+
+  async def _run_bulk(self, func, chunks, merge, max_workers: int):
+    return merge(chunks, await run_chunks_async(func, chunks, max_workers))
+
+  def _paginate(self, fetch, cursor, advance, prefetch: bool):
+    return paginate_async(fetch, cursor, advance, prefetch)
+
+  async def broadcast_message(
+    self,
+    message,
+    recipients,
+    batch_size: int = BATCH_SEND_LIMIT,
+    max_workers: int = 4,
+    rate: float = 0
+  ):
+    """
+        async generator counterpart of TCIMClient.broadcast_message
+
+        >>> async for report in client.broadcast_message(message, recipients):
+        >>>     print(report.done, report.failed)
+        """
+    progress = ProgressCounter()
+    async for index, accounts, response in stream_chunks_async(
+      lambda accounts: self.batch_send_message(self._batch_message_for(message, accounts)),
+      chunked(recipients, batch_size),
+      max_workers=max_workers,
+      rate=rate
+    ):
+      yield progress.update(batch_send_report(index, accounts, response))
+
+  async def close(self):
+    """
+        close pooled connections of the transport
+        """
+    await self.transport.close()
+    self.sig_generator.close()
+
+  def __enter__(self):
+    raise TypeError("use 'async with' with AsyncTCIMClient")
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    await self.close()
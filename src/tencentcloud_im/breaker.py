@@ -0,0 +1,427 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import time
+from collections import deque, namedtuple
+
+from .request import TCIMRequest
+from .retry import REJECTED, TRANSIENT, RetryPolicy
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# returned by CircuitBreaker.allow(): generation of the state the call was admitted in and
+# whether it took a half open trial slot
+Permit = namedtuple("Permit", ["generation", "trial"])
+
+
+class CircuitOpenError(Exception):
+  """
+    the circuit of the endpoint family is open, the call was not sent
+    """
+  retryable = False
+
+
+class CircuitBreaker(object):
+  """
+    closed: calls go through, the last window outcomes are tracked. once at least
+    min_calls are tracked and the failure ratio reaches failure_threshold it opens.
+    open: calls fail fast until reset_timeout has passed, then it becomes half open.
+    half open: up to half_open_calls trial calls go through, a success closes it and a
+    failure opens it again.
+
+    Attributes
+      state: CLOSED, OPEN or HALF_OPEN
+      rejected: calls refused while open
+    """
+
+  def __init__(
+    self,
+    failure_threshold: float = 0.5,
+    window: int = 50,
+    min_calls: int = 20,
+    reset_timeout: float = 10.0,
+    half_open_calls: int = 1,
+    clock=time.monotonic
+  ):
+    """
+        :param failure_threshold: failure ratio of the window that opens the circuit
+        :param window: number of recent outcomes tracked
+        :param min_calls: outcomes needed before the ratio is trusted
+        :param reset_timeout: seconds open before trial calls are let through
+        :param half_open_calls: concurrent trial calls while half open
+        :param clock: monotonic clock
+        """
+    self.failure_threshold = failure_threshold
+    self.min_calls = min_calls
+    self.reset_timeout = reset_timeout
+    self.half_open_calls = half_open_calls
+    self.clock = clock
+    self.state = CLOSED
+    self.rejected = 0
+    self._outcomes = deque(maxlen=window)
+    self._opened_at = 0.0
+    self._trials = 0
+    self._generation = 0
+    self._lock = threading.Lock()
+
+  def allow(self):
+    """
+        :return: Permit if a call may be sent, it must then be followed by record() or
+        cancel(), False otherwise
+        """
+    with self._lock:
+      if self.state == OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+        self._set_state(HALF_OPEN)
+        self._trials = 0
+      if self.state == CLOSED:
+        return Permit(self._generation, False)
+      if self.state == HALF_OPEN and self._trials < self.half_open_calls:
+        self._trials += 1
+        return Permit(self._generation, True)
+      self.rejected += 1
+      return False
+
+  def cancel(self, permit: Permit = None):
+    """
+        give back a call allowed by allow() without an outcome, eg: never sent or cancelled
+        """
+    with self._lock:
+      if permit is None or (permit.trial and permit.generation == self._generation):
+        if self.state == HALF_OPEN:
+          self._trials = max(0, self._trials - 1)
+
+  def record(self, success: bool, permit: Permit = None):
+    """
+        :param permit: Permit of the call, its outcome is ignored when the state changed
+        since the call was allowed
+        """
+    with self._lock:
+      if permit is not None and permit.generation != self._generation:
+        return
+      if self.state == HALF_OPEN:
+        self._trials = max(0, self._trials - 1)
+        if success:
+          self._set_state(CLOSED)
+          self._outcomes.clear()
+        else:
+          self._open()
+        return
+      if self.state != CLOSED:
+        return
+      self._outcomes.append(success)
+      if len(self._outcomes) >= self.min_calls and self._failure_rate() >= self.failure_threshold:
+        self._open()
+
+  def _set_state(self, state: str):
+    self.state = state
+    self._generation += 1
+
+  def _open(self):
+    self._set_state(OPEN)
+    self._opened_at = self.clock()
+    self._outcomes.clear()
+
+  def _failure_rate(self):
+    if not self._outcomes:
+      return 0.0
+    return 1.0 - sum(self._outcomes) / float(len(self._outcomes))
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      return {"state": self.state, "failure_rate": self._failure_rate(), "rejected": self.rejected}
+
+
+class AIMDLimiter(object):
+  """
+    adaptive limit of in-flight calls
+
+    every success adds increase / limit (about +increase per round trip of the whole
+    window), a failure or a latency above tolerance times the moving average latency
+    multiplies the limit by decrease, at most once per cooldown.
+
+    Attributes
+      limit: current max in-flight calls
+      inflight: calls in flight
+      latency: exponential moving average of successful call latency(seconds)
+    """
+
+  def __init__(
+    self,
+    initial: int = 32,
+    min_limit: int = 1,
+    max_limit: int = 256,
+    increase: float = 1.0,
+    decrease: float = 0.7,
+    tolerance: float = 2.0,
+    latency_floor: float = 0.05,
+    cooldown: float = 1.0,
+    clock=time.monotonic
+  ):
+    """
+        :param initial: starting limit
+        :param min_limit: lowest limit
+        :param max_limit: highest limit
+        :param increase: additive increase per window of successes
+        :param decrease: multiplicative decrease factor
+        :param tolerance: latency above tolerance * average latency counts as congestion
+        :param latency_floor: latencies below this never count as congestion(seconds)
+        :param cooldown: min seconds between two decreases
+        :param clock: monotonic clock
+        """
+    self.limit = float(initial)
+    self.min_limit = min_limit
+    self.max_limit = max_limit
+    self.increase = increase
+    self.decrease = decrease
+    self.tolerance = tolerance
+    self.latency_floor = latency_floor
+    self.cooldown = cooldown
+    self.clock = clock
+    self.inflight = 0
+    self.latency = None
+    self._decreased_at = None
+    self._lock = threading.Lock()
+    self._condition = threading.Condition(self._lock)
+    self._async_waiters = deque()
+
+  def _try_acquire(self) -> bool:
+    if self.inflight < int(self.limit):
+      self.inflight += 1
+      return True
+    return False
+
+  def acquire(self):
+    """
+        block until a call may be sent
+        """
+    with self._condition:
+      while not self._try_acquire():
+        self._condition.wait()
+
+  async def acquire_async(self):
+    """
+        wait without blocking the event loop until a call may be sent
+        """
+    loop = asyncio.get_running_loop()
+    while True:
+      with self._lock:
+        if self._try_acquire():
+          return
+        waiter = loop.create_future()
+        self._async_waiters.append((loop, waiter))
+      try:
+        await waiter
+      except asyncio.CancelledError:
+        with self._lock:
+          try:
+            self._async_waiters.remove((loop, waiter))
+          except ValueError:
+            # release already handed this waiter a slot, pass it on
+            self._wake_async(1)
+        raise
+
+  def _wake_async(self, free: int):
+    while free > 0 and self._async_waiters:
+      loop, waiter = self._async_waiters.popleft()
+      if waiter.done():
+        continue
+      loop.call_soon_threadsafe(_wake, waiter)
+      free -= 1
+
+  def release(self, latency: float, success: bool):
+    """
+        :param latency: seconds the call took
+        :param success: False if the call failed because of the server
+        """
+    with self._condition:
+      self.inflight -= 1
+      congested = not success
+      if success:
+        if self.latency is not None and latency > max(
+          self.latency_floor, self.tolerance * self.latency
+        ):
+          congested = True
+        self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+
+      now = self.clock()
+      if congested:
+        if self._decreased_at is None or now - self._decreased_at >= self.cooldown:
+          self.limit = max(float(self.min_limit), self.limit * self.decrease)
+          self._decreased_at = now
+      else:
+        self.limit = min(float(self.max_limit), self.limit + self.increase / self.limit)
+
+      self._notify(int(self.limit) - self.inflight)
+
+  def cancel(self):
+    """
+        give back the slot of a call without a latency or outcome, eg: cancelled
+        """
+    with self._condition:
+      self.inflight -= 1
+      self._notify(int(self.limit) - self.inflight)
+
+  def _notify(self, free: int):
+    """
+        called with the lock held
+        """
+    self._condition.notify(max(0, free))
+    self._wake_async(free)
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      return {"limit": self.limit, "inflight": self.inflight, "latency": self.latency}
+
+
+def _wake(waiter):
+  if not waiter.done():
+    waiter.set_result(None)
+
+
+class EndpointGuard(object):
+  """
+    one CircuitBreaker and one AIMDLimiter per endpoint family (the first path segment,
+    eg: "group_open_http_svc"), created on first use
+
+    a call counts as failed when it raises or gets an error the RetryPolicy classifies
+    as rejected or transient (overload, timeouts, 5xx); other error codes are the
+    caller's fault and count as success.
+
+    >>> guard = EndpointGuard()
+    >>> client = TCIMClient(sdk_id, sdk_secret, admin_account, endpoint_guard=guard)
+    >>> guard.snapshot()["group_open_http_svc"]
+    """
+
+  def __init__(self, breaker_factory=CircuitBreaker, limiter_factory=AIMDLimiter, policy=None):
+    """
+        :param breaker_factory: returns a new CircuitBreaker
+        :param limiter_factory: returns a new AIMDLimiter, None disables concurrency limiting
+        :param policy: RetryPolicy used to classify failures
+        """
+    self.breaker_factory = breaker_factory
+    self.limiter_factory = limiter_factory
+    self.policy = policy if policy is not None else RetryPolicy()
+    self.breakers = {}
+    self.limiters = {}
+    self._lock = threading.Lock()
+
+  def get(self, family: str):
+    """
+        :return: (CircuitBreaker, AIMDLimiter or None) of the family
+        """
+    breaker = self.breakers.get(family)
+    if breaker is None:
+      with self._lock:
+        if family not in self.breakers:
+          self.breakers[family] = self.breaker_factory()
+          if self.limiter_factory is not None:
+            self.limiters[family] = self.limiter_factory()
+        breaker = self.breakers[family]
+    return breaker, self.limiters.get(family)
+
+  def is_failure(self, response=None, error: Exception = None) -> bool:
+    kind, _ = self.policy.classify(response, error)
+    return kind in (REJECTED, TRANSIENT)
+
+  def snapshot(self) -> dict:
+    """
+        :return: {family: {"state", "failure_rate", "rejected", "limit", "inflight", "latency"}}
+        """
+    states = {}
+    for family in list(self.breakers):
+      breaker, limiter = self.get(family)
+      state = breaker.snapshot()
+      if limiter is not None:
+        state.update(limiter.snapshot())
+      states[family] = state
+    return states
+
+
+class GuardedExecutor(object):
+  """
+    run the inner executor behind the EndpointGuard of request.family
+    """
+
+  def __init__(self, executor, guard: EndpointGuard):
+    self.executor = executor
+    self.guard = guard
+    self.is_async = executor.is_async
+
+  def execute(self, request: TCIMRequest):
+    if self.is_async:
+      return self._execute_async(request)
+    breaker, limiter = self.guard.get(request.family)
+    permit = breaker.allow()
+    if not permit:
+      raise CircuitOpenError("circuit of {} is open".format(request.family))
+    if limiter is not None:
+      try:
+        limiter.acquire()
+      except BaseException:
+        breaker.cancel(permit)
+        raise
+    started_at = time.monotonic()
+    response, error = None, None
+    try:
+      response = self.executor.execute(request)
+      return response
+    except BaseException as e:
+      error = e
+      raise
+    finally:
+      self._record(breaker, permit, limiter, started_at, response, error)
+
+  async def _execute_async(self, request: TCIMRequest):
+    breaker, limiter = self.guard.get(request.family)
+    permit = breaker.allow()
+    if not permit:
+      raise CircuitOpenError("circuit of {} is open".format(request.family))
+    if limiter is not None:
+      try:
+        await limiter.acquire_async()
+      except BaseException:
+        # eg: cancelled while waiting, the half open trial slot must not leak
+        breaker.cancel(permit)
+        raise
+    started_at = time.monotonic()
+    response, error = None, None
+    try:
+      response = await self.executor.execute(request)
+      return response
+    except BaseException as e:
+      error = e
+      raise
+    finally:
+      self._record(breaker, permit, limiter, started_at, response, error)
+
+  def _record(self, breaker, permit, limiter, started_at, response, error):
+    if isinstance(error, asyncio.CancelledError
+                  ) or (error is not None and not isinstance(error, Exception)):
+      # cancelled or interrupted: the call says nothing about the server
+      breaker.cancel(permit)
+      if limiter is not None:
+        limiter.cancel()
+      return
+    success = not self.guard.is_failure(response, error)
+    breaker.record(success, permit)
+    if limiter is not None:
+      limiter.release(time.monotonic() - started_at, success)
+
+  def close(self):
+    return self.executor.close()
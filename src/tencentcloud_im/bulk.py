@@ -0,0 +1,336 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Iterable, List
+
+# max accounts per call of multiaccount_import, account_delete and account_check
+ACCOUNT_BATCH_LIMIT = 100
+
+# max members per call of group_open_http_svc/delete_group_member
+GROUP_MEMBER_DELETE_LIMIT = 100
+
+# max groups per call of group_open_http_svc/get_group_info
+GROUP_INFO_BATCH_LIMIT = 50
+
+# max accounts per call of openim/query_online_status
+ONLINE_STATUS_BATCH_LIMIT = 500
+
+# max recipients per call of openim/batchsendmsg
+BATCH_SEND_LIMIT = 500
+
+# max friends per call of sns/friend_add, friend_delete and friend_update
+FRIEND_BATCH_LIMIT = 100
+
+# max members per call of add_group_member and import_group_member
+GROUP_MEMBER_BATCH_LIMIT = 300
+
+# max messages per call of group_open_http_svc/import_group_msg
+GROUP_IMPORT_BATCH_LIMIT = 20
+
+# ErrorCode reported for items of a chunk that got no parsable response
+NO_RESPONSE_ERROR_CODE = -1
+
+
+def chunked(items: Iterable, size: int):
+  """
+    lazily split items into lists of at most size items
+    """
+  iterator = iter(items)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def parse_response(response):
+  """
+    :param response: requests.Response, BufferedResponse or None
+    :return: decoded json body, None if there is no response or it is not json
+    """
+  if response is None:
+    return None
+  try:
+    return json.loads(response.content)
+  except (AttributeError, TypeError, ValueError):
+    return None
+
+
+def is_ok(result) -> bool:
+  """
+    :param result: decoded json body
+    """
+  return result is not None and result.get("ActionStatus") == "OK"
+
+
+def run_chunks(func, chunks: List[list], max_workers: int = 4) -> list:
+  """
+    call func(chunk) for every chunk on a thread pool
+    :return: responses in chunk order
+    """
+  if max_workers <= 1 or len(chunks) <= 1:
+    return [func(chunk) for chunk in chunks]
+  with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+    return list(pool.map(func, chunks))
+
+
+async def run_chunks_async(func, chunks: List[list], max_workers: int = 4) -> list:
+  """
+    await func(chunk) for every chunk, at most max_workers at a time
+    :return: responses in chunk order
+    """
+  semaphore = asyncio.Semaphore(max_workers)
+
+  async def run(chunk):
+    async with semaphore:
+      return await func(chunk)
+
+  return await asyncio.gather(*[run(chunk) for chunk in chunks])
+
+
+def _merged_status(results):
+  merged = {"ActionStatus": "OK", "ErrorCode": 0, "ErrorInfo": ""}
+  for result in results:
+    if not is_ok(result):
+      merged["ActionStatus"] = "FAIL"
+      if merged["ErrorCode"] == 0:
+        merged["ErrorCode"] = NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+        merged["ErrorInfo"] = "no response" if result is None else result.get("ErrorInfo", "")
+  return merged
+
+
+def merge_fail_accounts(chunks: List[list], responses: list) -> dict:
+  """
+    merge chunked responses listing failed ids in "FailAccounts"
+
+    every account of a chunk without an OK response is reported as failed
+    :return: {"ActionStatus", "ErrorCode", "ErrorInfo", "FailAccounts"}
+    """
+  results = [parse_response(response) for response in responses]
+  merged = _merged_status(results)
+  fail_accounts = []
+  for chunk, result in zip(chunks, results):
+    if is_ok(result):
+      fail_accounts.extend(result.get("FailAccounts", []))
+    else:
+      fail_accounts.extend(chunk)
+  merged["FailAccounts"] = fail_accounts
+  return merged
+
+
+def merge_result_items(chunks: List[list], responses: list, account_field: str = "UserID") -> dict:
+  """
+    merge chunked responses with a per-account "ResultItem" list
+
+    every account of a chunk without an OK response gets a ResultItem carrying the chunk's
+    ErrorCode/ErrorInfo
+    :return: {"ActionStatus", "ErrorCode", "ErrorInfo", "ResultItem"}
+    """
+  results = [parse_response(response) for response in responses]
+  merged = _merged_status(results)
+  items = []
+  for chunk, result in zip(chunks, results):
+    if is_ok(result):
+      items.extend(result.get("ResultItem", []))
+      continue
+    error_code = NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+    error_info = "no response" if result is None else result.get("ErrorInfo", "")
+    for account in chunk:
+      items.append({account_field: account, "ResultCode": error_code, "ResultInfo": error_info})
+  merged["ResultItem"] = items
+  return merged
+
+
+def group_member_jobs(groups: dict, chunk_size: int) -> List[tuple]:
+  """
+    :param groups: {group_id: [GroupMemObj]}
+    :return: [(group_id, chunk of at most chunk_size members)] of every group
+    """
+  return [
+    (group_id, chunk)
+    for group_id, members in groups.items()
+    for chunk in chunked(members, chunk_size)
+  ]
+
+
+def merge_member_results(jobs: List[tuple], responses: list) -> dict:
+  """
+    merge the chunked add_group_member / import_group_member responses of every group
+
+    every member of a chunk without an OK response gets Result 0 and the chunk's ErrorCode
+    :return: {group_id: {"ActionStatus", "ErrorCode", "ErrorInfo", "MemberList"}}
+    """
+  per_group = {}
+  for (group_id, members), response in zip(jobs, responses):
+    per_group.setdefault(group_id, ([], []))
+    per_group[group_id][0].append(members)
+    per_group[group_id][1].append(parse_response(response))
+
+  merged_groups = {}
+  for group_id, (chunks, results) in per_group.items():
+    merged = _merged_status(results)
+    items = []
+    for members, result in zip(chunks, results):
+      if is_ok(result):
+        items.extend(result.get("MemberList", []))
+        continue
+      error_code = NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+      for member in members:
+        items.append(
+          {
+            "Member_Account": member.Member_Account,
+            "Result": 0,
+            "ErrorCode": error_code
+          }
+        )
+    merged["MemberList"] = items
+    merged_groups[group_id] = merged
+  return merged_groups
+
+
+class _Pacer(object):
+  """
+    space calls at least 1 / rate seconds apart, rate <= 0 means no limit
+    """
+
+  def __init__(self, rate: float = 0):
+    self.interval = 1.0 / rate if rate > 0 else 0
+    self.next_at = 0
+
+  def delay(self) -> float:
+    now = time.monotonic()
+    wait_time = max(0, self.next_at - now)
+    self.next_at = max(now, self.next_at) + self.interval
+    return wait_time
+
+
+def stream_chunks(func, chunks: Iterable[list], max_workers: int = 4, rate: float = 0):
+  """
+    call func(chunk) on a thread pool while lazily pulling chunks, at most max_workers
+    in flight and at most rate calls per second
+    :return: generator of (index, chunk, response) in completion order
+    """
+  pacer = _Pacer(rate)
+  iterator = enumerate(chunks)
+  exhausted = False
+  pending = {}
+  with ThreadPoolExecutor(max_workers=max_workers) as pool:
+    while True:
+      while not exhausted and len(pending) < max_workers:
+        try:
+          index, chunk = next(iterator)
+        except StopIteration:
+          exhausted = True
+          break
+        time.sleep(pacer.delay())
+        pending[pool.submit(func, chunk)] = (index, chunk)
+      if not pending:
+        return
+      done, _ = wait(pending, return_when=FIRST_COMPLETED)
+      for future in done:
+        index, chunk = pending.pop(future)
+        yield index, chunk, future.result()
+
+
+async def stream_chunks_async(func, chunks: Iterable[list], max_workers: int = 4, rate: float = 0):
+  """
+    async counterpart of stream_chunks, func is a coroutine function
+    :return: async generator of (index, chunk, response) in completion order
+    """
+  pacer = _Pacer(rate)
+  iterator = enumerate(chunks)
+  exhausted = False
+  pending = {}
+  try:
+    while True:
+      while not exhausted and len(pending) < max_workers:
+        try:
+          index, chunk = next(iterator)
+        except StopIteration:
+          exhausted = True
+          break
+        await asyncio.sleep(pacer.delay())
+        pending[asyncio.ensure_future(func(chunk))] = (index, chunk)
+      if not pending:
+        return
+      done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        index, chunk = pending.pop(task)
+        yield index, chunk, task.result()
+  finally:
+    for task in pending:
+      task.cancel()
+
+
+class BatchReport(object):
+  """
+    outcome of one chunk of a streamed bulk call
+
+    Attributes
+      index: chunk index in submission order
+      accounts: accounts of the chunk
+      result: decoded json response, None if the call failed
+      failed: {account: ErrorCode} of the accounts that failed
+      done: accounts finished so far, this chunk included
+      failed_total: accounts failed so far, this chunk included
+    """
+
+  def __init__(self, index: int, accounts: List[str], result, failed: dict):
+    self.index = index
+    self.accounts = accounts
+    self.result = result
+    self.failed = failed
+    self.done = 0
+    self.failed_total = 0
+
+  @property
+  def ok(self):
+    return not self.failed
+
+
+def batch_send_report(index: int, accounts: List[str], response) -> BatchReport:
+  """
+    per-recipient outcome of one openim/batchsendmsg call, failures come from ErrorList
+    or, if the whole call failed, from its ErrorCode
+    """
+  result = parse_response(response)
+  if is_ok(result):
+    failed = {item["To_Account"]: item.get("ErrorCode") for item in result.get("ErrorList", [])}
+  else:
+    error_code = NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+    failed = {account: error_code for account in accounts}
+  return BatchReport(index, accounts, result, failed)
+
+
+class ProgressCounter(object):
+  """
+    fills the running totals of streamed BatchReports
+    """
+
+  def __init__(self):
+    self.done = 0
+    self.failed = 0
+
+  def update(self, report: BatchReport) -> BatchReport:
+    self.done += len(report.accounts)
+    self.failed += len(report.failed)
+    report.done = self.done
+    report.failed_total = self.failed
+    return report
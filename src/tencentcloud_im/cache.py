@@ -0,0 +1,532 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Iterable, List
+
+from .request import TCIMRequest
+from .transport import BufferedResponse
+
+# seconds a successful response of a read-only endpoint is cached, keyed by endpoint path.
+# endpoints missing here are never cached.
+DEFAULT_TTLS = {
+  "group_open_http_svc/get_group_info": 30,
+  "group_open_http_svc/get_role_in_group": 30,
+  "group_open_attr_http_svc/get_group_attr": 10,
+  "group_open_http_svc/get_online_member_num": 5,
+  "group_open_http_svc/get_joined_group_list": 30,
+  "im_open_login_svc/account_check": 60,
+}
+
+
+def _accounts(items):
+  return [
+    item.get("Member_Account", item.get("UserID")) if isinstance(item, dict) else item
+    for item in items or []
+  ]
+
+
+def _group_tags(body) -> List[str]:
+  tags = ["group:{}".format(group_id) for group_id in body.get("GroupIdList", [])]
+  if "GroupId" in body:
+    tags.append("group:{}".format(body["GroupId"]))
+  return tags
+
+
+def _member_tags(*fields):
+  """
+    tags of the group of the call and of the users in fields
+    """
+
+  def tags(body):
+    accounts = []
+    for field in fields:
+      value = body.get(field)
+      if isinstance(value, list):
+        accounts.extend(_accounts(value))
+      elif value is not None:
+        accounts.append(value)
+    return _group_tags(body) + ["user:{}".format(account) for account in accounts]
+
+  return tags
+
+
+# tags of the cached entries a successful read stores, keyed by endpoint path
+READ_TAGS = {
+  "group_open_http_svc/get_group_info": _group_tags,
+  "group_open_http_svc/get_role_in_group": _group_tags,
+  "group_open_attr_http_svc/get_group_attr": _group_tags,
+  "group_open_http_svc/get_online_member_num": _group_tags,
+  "group_open_http_svc/get_joined_group_list": _member_tags("Member_Account"),
+  "im_open_login_svc/account_check": _member_tags("CheckItem"),
+}
+
+# tags of the cached entries a mutation makes stale, keyed by endpoint path
+INVALIDATES = {
+  "im_open_login_svc/account_import": _member_tags("UserID"),
+  "im_open_login_svc/multiaccount_import": _member_tags("Accounts"),
+  "im_open_login_svc/account_delete": _member_tags("DeleteItem"),
+  "group_open_http_svc/create_group": _member_tags("Owner_Account", "MemberList"),
+  "group_open_http_svc/modify_group_base_info": _group_tags,
+  "group_open_http_svc/add_group_member": _member_tags("MemberList"),
+  "group_open_http_svc/delete_group_member": _member_tags("MemberToDel_Account"),
+  "group_open_http_svc/import_group_member": _member_tags("MemberList"),
+  "group_open_http_svc/modify_group_member_info": _member_tags("Member_Account"),
+  "group_open_http_svc/forbid_send_msg": _group_tags,
+  "group_open_http_svc/change_group_owner": _member_tags("NewOwner_Account"),
+  "group_open_http_svc/destroy_group": _group_tags,
+  "group_open_http_svc/modify_group_attr": _group_tags,
+  "group_open_http_svc/clear_group_attr": _group_tags,
+}
+
+# tag buckets tracking the invalidations a read in flight may have missed
+INVALIDATION_BUCKETS = 4096
+
+
+class CacheBackend(object):
+  """
+    entry store shared by ResponseCaches
+
+    an entry is a value (bytes) stored under a key for ttl seconds with a list of tags,
+    invalidate(tags) drops every entry carrying one of the tags.
+    """
+
+  def get(self, key: str):
+    """
+        :return: value, None if missing or expired
+        """
+    raise NotImplementedError()
+
+  def set(self, key: str, value: bytes, ttl: float, tags: List[str] = ()):
+    raise NotImplementedError()
+
+  def invalidate(self, tags: Iterable[str]) -> int:
+    """
+        :return: number of entries dropped
+        """
+    raise NotImplementedError()
+
+  def clear(self):
+    raise NotImplementedError()
+
+
+class LocalCache(CacheBackend):
+  """
+    in-process TTL cache holding at most max_entries entries, least recently used first out
+    """
+
+  def __init__(self, max_entries: int = 10000, clock=time.monotonic):
+    """
+        :param max_entries: entries kept before the least recently used one is evicted
+        :param clock: monotonic clock
+        """
+    self.max_entries = max_entries
+    self.clock = clock
+    self.evictions = 0
+    self._entries = OrderedDict()
+    self._tags = {}
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def get(self, key: str):
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None:
+        return None
+      value, expires_at, _ = entry
+      if expires_at <= self.clock():
+        self._drop(key)
+        return None
+      self._entries.move_to_end(key)
+      return value
+
+  def set(self, key: str, value: bytes, ttl: float, tags: List[str] = ()):
+    with self._lock:
+      if key in self._entries:
+        self._drop(key)
+      self._entries[key] = (value, self.clock() + ttl, tuple(tags))
+      for tag in tags:
+        self._tags.setdefault(tag, set()).add(key)
+      while len(self._entries) > self.max_entries:
+        self._drop(next(iter(self._entries)))
+        self.evictions += 1
+
+  def invalidate(self, tags: Iterable[str]) -> int:
+    with self._lock:
+      keys = set()
+      for tag in tags:
+        keys.update(self._tags.get(tag, ()))
+      for key in keys:
+        self._drop(key)
+      return len(keys)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      self._tags.clear()
+
+  def _drop(self, key):
+    _, _, tags = self._entries.pop(key)
+    for tag in tags:
+      keys = self._tags.get(tag)
+      if keys is not None:
+        keys.discard(key)
+        if not keys:
+          del self._tags[tag]
+
+
+class SQLiteCache(CacheBackend):
+  """
+    TTL cache in a local SQLite database shared by every process of the host
+
+    entries survive restarts, expiry uses the wall clock. past max_entries the least
+    recently used entries are evicted; the check runs every prune_every writes so the
+    table may briefly hold a few more. concurrent writers are serialized by SQLite (WAL).
+
+    >>> cache = ResponseCache(backend=SQLiteCache("/var/tmp/tcim-cache.db"))
+    """
+
+  def __init__(
+    self,
+    path: str,
+    max_entries: int = 100000,
+    prune_every: int = 100,
+    touch_interval: float = 1.0,
+    timeout: float = 5.0,
+    clock=time.time
+  ):
+    """
+        :param path: database file, created if missing
+        :param max_entries: entries kept before the least recently used ones are evicted
+        :param prune_every: writes between two size checks
+        :param touch_interval: min seconds between two recency updates of an entry, reads
+        within it do not write
+        :param timeout: seconds to wait for a lock held by another process
+        :param clock: wall clock shared by the processes
+        """
+    self.path = path
+    self.max_entries = max_entries
+    self.prune_every = max(1, prune_every)
+    self.touch_interval = touch_interval
+    self.timeout = timeout
+    self.clock = clock
+    self.evictions = 0
+    self._local = threading.local()
+    self._writes = 0
+    self._db().execute("PRAGMA journal_mode=WAL")
+    with self._transaction() as db:
+      db.execute(
+        "CREATE TABLE IF NOT EXISTS entries "
+        "(key TEXT PRIMARY KEY, value BLOB, expires_at REAL, used_at REAL)"
+      )
+      db.execute("CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)")
+      db.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+      db.execute("CREATE INDEX IF NOT EXISTS tags_key ON tags (key)")
+
+  def _db(self):
+    """
+        one autocommit connection per thread, reopened in a forked child
+        """
+    db = getattr(self._local, "db", None)
+    if db is None or self._local.pid != os.getpid():
+      db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+      self._local.db = db
+      self._local.pid = os.getpid()
+    return db
+
+  def _transaction(self):
+    return _Transaction(self._db())
+
+  def __len__(self):
+    return self._db().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+  def get(self, key: str):
+    now = self.clock()
+    db = self._db()
+    row = db.execute("SELECT value, expires_at, used_at FROM entries WHERE key = ?",
+                     (key,)).fetchone()
+    if row is None:
+      return None
+    value, expires_at, used_at = row
+    if expires_at <= now:
+      with self._transaction() as db:
+        self._delete(db, [key])
+      return None
+    if now - used_at >= self.touch_interval:
+      db.execute("UPDATE entries SET used_at = ? WHERE key = ?", (now, key))
+    return bytes(value)
+
+  def set(self, key: str, value: bytes, ttl: float, tags: List[str] = ()):
+    now = self.clock()
+    with self._transaction() as db:
+      self._delete(db, [key])
+      db.execute(
+        "INSERT INTO entries (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+        (key, sqlite3.Binary(value), now + ttl, now)
+      )
+      db.executemany(
+        "INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags]
+      )
+      self._writes += 1
+      if self._writes % self.prune_every == 0:
+        self._prune(db, now)
+
+  def _prune(self, db, now):
+    expired = [
+      row[0] for row in db.execute("SELECT key FROM entries WHERE expires_at <= ?", (now,))
+    ]
+    self._delete(db, expired)
+    extra = db.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+    if extra > 0:
+      oldest = [
+        row[0] for row in db.execute("SELECT key FROM entries ORDER BY used_at LIMIT ?", (extra,))
+      ]
+      self._delete(db, oldest)
+      self.evictions += len(oldest)
+
+  def _delete(self, db, keys):
+    for key in keys:
+      db.execute("DELETE FROM entries WHERE key = ?", (key,))
+      db.execute("DELETE FROM tags WHERE key = ?", (key,))
+
+  def invalidate(self, tags: Iterable[str]) -> int:
+    with self._transaction() as db:
+      keys = set()
+      for tag in tags:
+        keys.update(row[0] for row in db.execute("SELECT key FROM tags WHERE tag = ?", (tag,)))
+      self._delete(db, keys)
+      return len(keys)
+
+  def clear(self):
+    with self._transaction() as db:
+      db.execute("DELETE FROM entries")
+      db.execute("DELETE FROM tags")
+
+  def close(self):
+    db = getattr(self._local, "db", None)
+    if db is not None and self._local.pid == os.getpid():
+      db.close()
+    self._local.db = None
+
+
+class _Transaction(object):
+  """
+    BEGIN IMMEDIATE ... COMMIT around the statements of one backend call
+    """
+
+  def __init__(self, db):
+    self.db = db
+
+  def __enter__(self):
+    self.db.execute("BEGIN IMMEDIATE")
+    return self.db
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+class CacheStats(object):
+  """
+    Attributes
+      hits: reads answered from the cache
+      misses: cacheable reads sent to the server
+      invalidations: entries dropped by mutations or invalidate calls
+    """
+
+  def __init__(self):
+    self.hits = 0
+    self.misses = 0
+    self.invalidations = 0
+    self._lock = threading.Lock()
+
+  def add(self, field: str, count: int = 1):
+    with self._lock:
+      setattr(self, field, getattr(self, field) + count)
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      total = self.hits + self.misses
+      return {
+        "hits": self.hits,
+        "misses": self.misses,
+        "invalidations": self.invalidations,
+        "hit_ratio": self.hits / float(total) if total else 0.0,
+      }
+
+
+class ResponseCache(object):
+  """
+    cache of successful responses of read-only endpoints
+
+    entries are keyed by endpoint path and request body and tagged with the groups/users
+    they describe; a mutation sent through the same client drops the entries of its group
+    and members once it returns, whatever its outcome. a read in flight while one of its
+    tags is invalidated is not stored, it may describe the state before the mutation.
+
+    >>> cache = ResponseCache(ttls={"group_open_http_svc/get_group_info": 60})
+    >>> client = TCIMClient(sdk_id, sdk_secret, admin_account, cache=cache)
+    >>> cache.stats.snapshot()
+
+    Attributes
+      ttls: {endpoint path: seconds}, endpoints missing are not cached
+      backend: CacheBackend holding the entries
+      stats: CacheStats
+    """
+
+  def __init__(self, ttls: dict = None, backend: CacheBackend = None, max_entries: int = 10000):
+    """
+        :param ttls: {endpoint path: seconds}, merged over DEFAULT_TTLS, 0 disables an endpoint
+        :param backend: CacheBackend, LocalCache(max_entries) by default
+        :param max_entries: size of the default LocalCache
+        """
+    self.ttls = dict(DEFAULT_TTLS)
+    self.ttls.update(ttls or {})
+    self.backend = backend if backend is not None else LocalCache(max_entries)
+    self.stats = CacheStats()
+    # invalidation sequence number of the last invalidation of each tag bucket, tags share
+    # a bucket by crc32 so memory stays fixed; a shared bucket only skips a store
+    self._sequence = 0
+    self._invalidated = [0] * INVALIDATION_BUCKETS
+    self._lock = threading.Lock()
+
+  def ttl(self, path: str) -> float:
+    return self.ttls.get(path, 0)
+
+  def key(self, request: TCIMRequest) -> str:
+    body = json.dumps(request.json(), sort_keys=True).encode("utf8")
+    return "{}:{}".format(request.path, hashlib.blake2b(body, digest_size=16).hexdigest())
+
+  def lookup(self, request: TCIMRequest):
+    """
+        :return: cached BufferedResponse, None on a miss
+        """
+    content = self.backend.get(self.key(request))
+    if content is None:
+      self.stats.add("misses")
+      return None
+    self.stats.add("hits")
+    return BufferedResponse(200, content, url=request.url)
+
+  def sequence(self) -> int:
+    """
+        :return: invalidation sequence number to pass to store(), taken before the read is sent
+        """
+    return self._sequence
+
+  def store(self, request: TCIMRequest, response, since: int = None):
+    """
+        keep response if the call succeeded and none of its tags was invalidated after since
+        """
+    content = getattr(response, "content", None)
+    if getattr(response, "status_code", None) != 200 or not content:
+      return
+    try:
+      if json.loads(content).get("ActionStatus") != "OK":
+        return
+    except (AttributeError, ValueError):
+      return
+    tags = READ_TAGS.get(request.path, lambda body: [])(request.json())
+    with self._lock:
+      if since is not None and any(self._invalidated[_bucket(tag)] > since for tag in tags):
+        return
+      self.backend.set(self.key(request), content, self.ttl(request.path), tags)
+
+  def after_mutation(self, request: TCIMRequest):
+    tags = INVALIDATES.get(request.path)
+    if tags is not None:
+      self.invalidate(tags(request.json()))
+
+  def invalidate(self, tags: Iterable[str]) -> int:
+    """
+        :param tags: "group:<GroupId>" or "user:<UserID>"
+        :return: number of entries dropped
+        """
+    tags = list(tags)
+    with self._lock:
+      self._sequence += 1
+      for tag in tags:
+        self._invalidated[_bucket(tag)] = self._sequence
+    dropped = self.backend.invalidate(tags)
+    self.stats.add("invalidations", dropped)
+    return dropped
+
+  def invalidate_group(self, group_id: str) -> int:
+    return self.invalidate(["group:{}".format(group_id)])
+
+  def invalidate_user(self, user_id: str) -> int:
+    return self.invalidate(["user:{}".format(user_id)])
+
+  def clear(self):
+    with self._lock:
+      self._sequence += 1
+      self._invalidated = [self._sequence] * INVALIDATION_BUCKETS
+    self.backend.clear()
+
+
+def _bucket(tag: str) -> int:
+  return zlib.crc32(tag.encode("utf8")) % INVALIDATION_BUCKETS
+
+
+class CachingExecutor(object):
+  """
+    answer cacheable reads from a ResponseCache and invalidate it after mutations
+    """
+
+  def __init__(self, executor, cache: ResponseCache):
+    self.executor = executor
+    self.cache = cache
+    self.is_async = executor.is_async
+
+  def execute(self, request: TCIMRequest):
+    if self.is_async:
+      return self._execute_async(request)
+    if self.cache.ttl(request.path) > 0:
+      cached = self.cache.lookup(request)
+      if cached is not None:
+        return cached
+      since = self.cache.sequence()
+      response = self.executor.execute(request)
+      self.cache.store(request, response, since)
+      return response
+    try:
+      return self.executor.execute(request)
+    finally:
+      self.cache.after_mutation(request)
+
+  async def _execute_async(self, request: TCIMRequest):
+    if self.cache.ttl(request.path) > 0:
+      cached = self.cache.lookup(request)
+      if cached is not None:
+        return cached
+      since = self.cache.sequence()
+      response = await self.executor.execute(request)
+      self.cache.store(request, response, since)
+      return response
+    try:
+      return await self.executor.execute(request)
+    finally:
+      self.cache.after_mutation(request)
+
+  def close(self):
+    return self.executor.close()
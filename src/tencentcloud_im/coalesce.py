@@ -0,0 +1,501 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List
+
+from .bulk import (
+  ACCOUNT_BATCH_LIMIT, BATCH_SEND_LIMIT, GROUP_INFO_BATCH_LIMIT, NO_RESPONSE_ERROR_CODE,
+  ONLINE_STATUS_BATCH_LIMIT, batch_send_report, is_ok, parse_response
+)
+
+
+def _error_of(result):
+  """
+    :return: (ErrorCode, ErrorInfo) for the keys a response gives no entry for
+    """
+  if result is None:
+    return NO_RESPONSE_ERROR_CODE, "no response"
+  if is_ok(result):
+    return NO_RESPONSE_ERROR_CODE, "missing from response"
+  return result.get("ErrorCode"), result.get("ErrorInfo", "")
+
+
+def _no_response():
+  return {"ActionStatus": "FAIL", "ErrorCode": NO_RESPONSE_ERROR_CODE, "ErrorInfo": "no response"}
+
+
+class _Batch(object):
+  """
+    calls buffered for one group key
+
+    Attributes
+      group_key: key of the group
+      context: what the calls of the group share, handed to _dispatch
+      items: {key: (item, [futures])} in arrival order
+      deadline: monotonic time the batch is sent at the latest
+      handle: asyncio.TimerHandle of the deadline (async only)
+    """
+
+  def __init__(self, group_key, context, deadline: float):
+    self.group_key = group_key
+    self.context = context
+    self.items = OrderedDict()
+    self.deadline = deadline
+    self.handle = None
+
+
+class _Coalescer(object):
+  """
+    buffer single-item calls for up to max_delay seconds and send those with the same
+    group key as one batch call of at most max_batch items
+
+    with a TCIMClient every call returns a concurrent.futures.Future, the batches are sent
+    on a thread pool of max_workers threads and a timer thread sends the expired ones.
+    with an AsyncTCIMClient every call must be made inside the event loop and returns an
+    asyncio.Future, max_delay 0 sends the batch on the next loop iteration.
+
+    subclasses implement _dispatch(context, items) -> response and
+    _resolve(context, keys, response) -> {key: result}. if dedupe, calls for a key already
+    buffered or in flight in the group share its slot and its result.
+
+    Attributes
+      submitted: calls received
+      dispatched: batch calls sent
+    """
+
+  dedupe = False
+
+  def __init__(self, client, max_delay: float, max_batch: int, max_workers: int = 4):
+    self.client = client
+    self.max_delay = max_delay
+    self.max_batch = max_batch
+    self.max_workers = max_workers
+    self.is_async = getattr(client.executor, "is_async", False)
+    self.submitted = 0
+    self.dispatched = 0
+    self._pending = {}
+    self._running = set()
+    self._loading = {}
+    self._lock = threading.Lock()
+    self._wakeup = threading.Condition(self._lock)
+    self._pool = None
+    self._timer = None
+    self._closed = False
+
+  def _submit(self, group_key, context, key, item):
+    if self.is_async:
+      future = asyncio.get_running_loop().create_future()
+    else:
+      future = concurrent.futures.Future()
+    ready = []
+    with self._lock:
+      self.submitted += 1
+      batch = self._loading.get((group_key, key)) if self.dedupe else None
+      if batch is None:
+        batch = self._pending.get(group_key)
+      if batch is not None and key in batch.items and self.dedupe:
+        batch.items[key][1].append(future)
+        return future
+      if batch is not None and key in batch.items:
+        # the same key never appears twice in one call
+        ready.append(self._pending.pop(group_key))
+        batch = None
+      if batch is None:
+        batch = self._pending[group_key] = _Batch(
+          group_key, context,
+          time.monotonic() + self.max_delay
+        )
+        self._schedule(group_key, batch)
+      batch.items[key] = (item, [future])
+      if len(batch.items) >= self.max_batch:
+        ready.append(self._pending.pop(group_key))
+      for batch in ready:
+        self._start(batch)
+    return future
+
+  def _schedule(self, group_key, batch: _Batch):
+    if self.is_async:
+      batch.handle = asyncio.get_running_loop().call_later(
+        self.max_delay, self._expire, group_key, batch
+      )
+      return
+    if self._timer is None:
+      self._timer = threading.Thread(target=self._run_timer, name="tcim-coalescer", daemon=True)
+      self._timer.start()
+    self._wakeup.notify()
+
+  def _expire(self, group_key, batch: _Batch):
+    with self._lock:
+      if self._pending.get(group_key) is batch:
+        self._start(self._pending.pop(group_key))
+
+  def _run_timer(self):
+    with self._lock:
+      while not self._closed:
+        now = time.monotonic()
+        for group_key in [k for k, b in self._pending.items() if b.deadline <= now]:
+          self._start(self._pending.pop(group_key))
+        if self._pending:
+          self._wakeup.wait(min(b.deadline for b in self._pending.values()) - now)
+        else:
+          self._wakeup.wait()
+
+  def _start(self, batch: _Batch):
+    """
+        send the batch, called with the lock held
+        """
+    self.dispatched += 1
+    if self.dedupe:
+      for key in batch.items:
+        self._loading[(batch.group_key, key)] = batch
+    if self.is_async:
+      if batch.handle is not None:
+        batch.handle.cancel()
+      running = asyncio.ensure_future(self._run_async(batch))
+    else:
+      if self._pool is None:
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+          max_workers=self.max_workers, thread_name_prefix="tcim-coalescer"
+        )
+      running = self._pool.submit(self._run, batch)
+    self._running.add(running)
+    running.add_done_callback(self._running.discard)
+
+  def _run(self, batch: _Batch):
+    try:
+      response = self._dispatch(batch.context, [item for item, _ in batch.items.values()])
+      self._settle(batch, self._resolve(batch.context, list(batch.items), response))
+    except Exception as e:
+      self._settle(batch, error=e)
+
+  async def _run_async(self, batch: _Batch):
+    try:
+      response = await self._dispatch(batch.context, [item for item, _ in batch.items.values()])
+      self._settle(batch, self._resolve(batch.context, list(batch.items), response))
+    except Exception as e:
+      self._settle(batch, error=e)
+
+  def _settle(self, batch: _Batch, results: dict = None, error: Exception = None):
+    with self._lock:
+      # no caller can join the batch once it is out of _loading
+      for key in batch.items:
+        self._loading.pop((batch.group_key, key), None)
+      waiting = [(key, list(futures)) for key, (_, futures) in batch.items.items()]
+    for key, futures in waiting:
+      for future in futures:
+        if future.done():
+          continue
+        if error is not None:
+          future.set_exception(error)
+        else:
+          future.set_result(results[key])
+
+  def _dispatch(self, context, items):
+    raise NotImplementedError
+
+  def _resolve(self, context, keys, response):
+    raise NotImplementedError
+
+  def flush(self):
+    """
+        send every buffered call now and wait for all batch calls to finish,
+        a coroutine with an AsyncTCIMClient
+        """
+    with self._lock:
+      for batch in list(self._pending.values()):
+        self._start(batch)
+      self._pending.clear()
+      running = list(self._running)
+    if self.is_async:
+      return self._wait_async(running)
+    concurrent.futures.wait(running)
+
+  async def _wait_async(self, running):
+    if running:
+      await asyncio.wait(running)
+
+  def close(self):
+    """
+        flush, then stop the timer thread and the thread pool,
+        a coroutine with an AsyncTCIMClient
+        """
+    if self.is_async:
+      return self.flush()
+    self.flush()
+    with self._lock:
+      self._closed = True
+      self._wakeup.notify()
+    if self._pool is not None:
+      self._pool.shutdown(wait=True)
+
+
+class MessageCoalescer(_Coalescer):
+  """
+    fold concurrent send_message calls sharing From_Account, MsgBody, SyncOtherMachine
+    and CloudCustomData into openim/batchsendmsg calls
+
+    >>> coalescer = MessageCoalescer(client, max_delay=0.005)
+    >>> future = coalescer.send_message(MessageObj("admin", "user0", [MessageText("hi")]))
+    >>> future.result()["ActionStatus"]
+
+    each future resolves to the sendmsg-like result of its own recipient:
+    {"ActionStatus", "ErrorCode", "ErrorInfo"} plus "MsgKey" and "MsgTime" on success.
+    a batch of one message is sent with sendmsg, a recipient appears at most once per batch.
+    """
+
+  def __init__(
+    self,
+    client,
+    max_delay: float = 0.005,
+    max_batch: int = BATCH_SEND_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        :param client: TCIMClient or AsyncTCIMClient
+        :param max_delay: seconds a call may wait for others to join its batch
+        :param max_batch: max recipients per batchsendmsg call, at most 500
+        :param max_workers: concurrent batch calls (sync client only)
+        """
+    super(MessageCoalescer,
+          self).__init__(client, max_delay, min(max_batch, BATCH_SEND_LIMIT), max_workers)
+
+  def send_message(self, messgeObj):
+    """
+        :param messgeObj: MessageObj
+        :return: future of the per-recipient result
+        """
+    shared = dict(messgeObj.__dict__)
+    to_account = shared.pop("To_Account")
+    shared.pop("MsgRandom", None)
+    group_key = json.dumps(shared, sort_keys=True, ensure_ascii=False)
+    return self._submit(group_key, messgeObj, to_account, messgeObj)
+
+  def _dispatch(self, message, messages):
+    if len(messages) == 1:
+      return self.client.send_message(messages[0])
+    return self.client.batch_send_message(
+      self.client._batch_message_for(message, [m.To_Account for m in messages])
+    )
+
+  def _resolve(self, message, keys, response):
+    if len(keys) == 1:
+      result = parse_response(response)
+      return {keys[0]: result if result is not None else _no_response()}
+
+    report = batch_send_report(0, keys, response)
+    if report.result is None:
+      return {key: _no_response() for key in keys}
+    info = "" if is_ok(report.result) else report.result.get("ErrorInfo", "")
+    results = {}
+    for key in keys:
+      if key in report.failed:
+        results[key] = {"ActionStatus": "FAIL", "ErrorCode": report.failed[key], "ErrorInfo": info}
+      else:
+        results[key] = {
+          "ActionStatus": "OK",
+          "ErrorCode": 0,
+          "ErrorInfo": "",
+          "MsgKey": report.result.get("MsgKey"),
+          "MsgTime": report.result.get("MsgTime")
+        }
+    return results
+
+
+class _KeyLoader(_Coalescer):
+  """
+    DataLoader-style loader: load(key) calls made within max_delay are deduplicated and
+    sent as one list call of at most max_batch keys, every caller gets its own entry
+    """
+  dedupe = True
+
+  def load(self, key: str):
+    """
+        :return: future of the entry of key
+        """
+    return self._submit(None, None, key, key)
+
+  def load_many(self, keys: List[str]):
+    """
+        :return: futures of the entries of keys, in keys order
+        """
+    return [self.load(key) for key in keys]
+
+
+class OnlineStatusLoader(_KeyLoader):
+  """
+    coalesce check_user_online calls for single users into openim/query_online_status calls
+
+    >>> loader = OnlineStatusLoader(client)
+    >>> loader.load("user0").result()["Status"]
+
+    the entry is the QueryResult item of the user, or its ErrorList item
+    {"To_Account", "ErrorCode"}, or {"To_Account", "ErrorCode", "ErrorInfo"} carrying the
+    error of the whole call.
+    """
+
+  def __init__(
+    self,
+    client,
+    max_delay: float = 0.002,
+    max_batch: int = ONLINE_STATUS_BATCH_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        :param client: TCIMClient or AsyncTCIMClient
+        :param max_delay: seconds a call may wait for others to join its batch
+        :param max_batch: max accounts per call, at most 500
+        :param max_workers: concurrent calls (sync client only)
+        """
+    super(OnlineStatusLoader,
+          self).__init__(client, max_delay, min(max_batch, ONLINE_STATUS_BATCH_LIMIT), max_workers)
+
+  def _dispatch(self, context, user_ids):
+    return self.client.check_user_online(user_ids)
+
+  def _resolve(self, context, user_ids, response):
+    result = parse_response(response)
+    entries = {}
+    if is_ok(result):
+      for item in result.get("QueryResult", []) + result.get("ErrorList", []):
+        entries[item["To_Account"]] = item
+    code, info = _error_of(result)
+    return {
+      user_id: entries.get(user_id, {
+        "To_Account": user_id,
+        "ErrorCode": code,
+        "ErrorInfo": info
+      }) for user_id in user_ids
+    }
+
+
+class AccountLoader(_KeyLoader):
+  """
+    coalesce search_user calls for single users into im_open_login_svc/account_check calls
+
+    >>> loader = AccountLoader(client)
+    >>> loader.load("user0").result()["AccountStatus"]
+
+    the entry is the ResultItem of the user, or {"UserID", "ResultCode", "ResultInfo"}
+    carrying the error of the whole call.
+    """
+
+  def __init__(
+    self,
+    client,
+    max_delay: float = 0.002,
+    max_batch: int = ACCOUNT_BATCH_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        :param client: TCIMClient or AsyncTCIMClient
+        :param max_delay: seconds a call may wait for others to join its batch
+        :param max_batch: max accounts per call, at most 100
+        :param max_workers: concurrent calls (sync client only)
+        """
+    super(AccountLoader,
+          self).__init__(client, max_delay, min(max_batch, ACCOUNT_BATCH_LIMIT), max_workers)
+
+  def _dispatch(self, context, user_ids):
+    return self.client.search_user(user_ids)
+
+  def _resolve(self, context, user_ids, response):
+    result = parse_response(response)
+    entries = {}
+    if is_ok(result):
+      entries = {item["UserID"]: item for item in result.get("ResultItem", [])}
+    code, info = _error_of(result)
+    return {
+      user_id: entries.get(user_id, {
+        "UserID": user_id,
+        "ResultCode": code,
+        "ResultInfo": info
+      }) for user_id in user_ids
+    }
+
+
+class GroupDetailLoader(_KeyLoader):
+  """
+    coalesce get_group_detail calls for single groups into group_open_http_svc/get_group_info
+    calls of at most 50 groups; only calls with the same filters share a call
+
+    >>> loader = GroupDetailLoader(client)
+    >>> loader.load("@TGS#2J4SZEAEL", baseInfoFilter=["Name", "MemberNum"]).result()["Name"]
+
+    the entry is the GroupInfo item of the group, its own ErrorCode tells if it was found,
+    or {"GroupId", "ErrorCode", "ErrorInfo"} carrying the error of the whole call.
+    """
+
+  def __init__(
+    self,
+    client,
+    max_delay: float = 0.002,
+    max_batch: int = GROUP_INFO_BATCH_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        :param client: TCIMClient or AsyncTCIMClient
+        :param max_delay: seconds a call may wait for others to join its batch
+        :param max_batch: max groups per call, at most 50
+        :param max_workers: concurrent calls (sync client only)
+        """
+    super(GroupDetailLoader,
+          self).__init__(client, max_delay, min(max_batch, GROUP_INFO_BATCH_LIMIT), max_workers)
+
+  def load(
+    self,
+    group_id: str,
+    baseInfoFilter: List[str] = [],
+    memInfoFilter: List[str] = [],
+    appDefineDataFilterGroup: List[str] = [],
+    appDefineDataFilterMem: List[str] = []
+  ):
+    """
+        filters are those of TCIMClient.get_group_detail
+        :return: future of the GroupInfo item of group_id
+        """
+    filters = (
+      tuple(baseInfoFilter), tuple(memInfoFilter), tuple(appDefineDataFilterGroup),
+      tuple(appDefineDataFilterMem)
+    )
+    return self._submit(filters, filters, group_id, group_id)
+
+  def load_many(self, group_ids: List[str], **filters):
+    """
+        :return: futures of the GroupInfo items of group_ids, in group_ids order
+        """
+    return [self.load(group_id, **filters) for group_id in group_ids]
+
+  def _dispatch(self, filters, group_ids):
+    return self.client.get_group_detail(group_ids, *[list(f) for f in filters])
+
+  def _resolve(self, filters, group_ids, response):
+    result = parse_response(response)
+    entries = {}
+    if is_ok(result):
+      entries = {item["GroupId"]: item for item in result.get("GroupInfo", [])}
+    code, info = _error_of(result)
+    return {
+      group_id: entries.get(group_id, {
+        "GroupId": group_id,
+        "ErrorCode": code,
+        "ErrorInfo": info
+      }) for group_id in group_ids
+    }
@@ -0,0 +1,125 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .request import TCIMRequest
+
+
+class SyncExecutor(object):
+  """
+    send a TCIMRequest over a blocking transport, eg: PooledTransport
+    """
+  is_async = False
+
+  def __init__(self, transport):
+    self.transport = transport
+
+  def execute(self, request: TCIMRequest):
+    return self.transport.post(request.url, params=request.params, data=request.body)
+
+  def close(self):
+    self.transport.close()
+
+
+class AsyncExecutor(object):
+  """
+    send a TCIMRequest over a non-blocking transport, eg: AsyncTransport
+    """
+  is_async = True
+
+  def __init__(self, transport):
+    self.transport = transport
+
+  async def execute(self, request: TCIMRequest):
+    return await self.transport.post(request.url, params=request.params, data=request.body)
+
+  async def close(self):
+    await self.transport.close()
+
+
+class FanoutExecutor(object):
+  """
+    run a blocking executor on a thread pool, execute returns a concurrent.futures.Future
+
+    >>> fanout = client.with_executor(FanoutExecutor(client.executor, max_workers=16))
+    >>> futures = [fanout.send_message(message) for message in messages]
+    """
+  is_async = False
+
+  def __init__(self, executor, max_workers: int = 8):
+    """
+        :param executor: blocking executor doing the io
+        :param max_workers: max in-flight requests
+        """
+    self.executor = executor
+    self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+  def execute(self, request: TCIMRequest):
+    return self.pool.submit(self.executor.execute, request)
+
+  def close(self):
+    self.pool.shutdown(wait=True)
+
+
+class RecordingExecutor(object):
+  """
+    record requests instead of sending them
+
+    execute returns the canned response if given, else the request itself, so a client
+    using it builds requests without any io:
+
+    >>> builder = client.with_executor(RecordingExecutor())
+    >>> request = builder.add_group_member(group_id, mem_list)
+    """
+  is_async = False
+
+  def __init__(self, response=None):
+    self.response = response
+    self.requests = []
+    self._lock = threading.Lock()
+
+  def execute(self, request: TCIMRequest):
+    with self._lock:
+      self.requests.append(request)
+    return request if self.response is None else self.response
+
+  def close(self):
+    pass
+
+
+class RateLimitedExecutor(object):
+  """
+    wait on a ratelimit.RateLimiter keyed by request.path before running the inner executor
+    """
+
+  def __init__(self, executor, limiter):
+    self.executor = executor
+    self.limiter = limiter
+    self.is_async = executor.is_async
+
+  def execute(self, request: TCIMRequest):
+    if self.is_async:
+      return self._execute_async(request)
+    self.limiter.acquire(request.path)
+    return self.executor.execute(request)
+
+  async def _execute_async(self, request: TCIMRequest):
+    await self.limiter.acquire_async(request.path)
+    return await self.executor.execute(request)
+
+  def close(self):
+    return self.executor.close()
@@ -0,0 +1,338 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from urllib.parse import quote
+
+from .bulk import stream_chunks
+from .paginate import c2c_history_page, group_history_page, paginate_pages
+from .ratelimit import RateLimiter, rate_limited
+
+# max messages per call of group_open_http_svc/group_msg_get_simple
+GROUP_HISTORY_PAGE_LIMIT = 20
+
+
+class Checkpoint(object):
+  """
+    json state file replaced atomically, so a crash leaves either the old or the new state
+    """
+
+  def __init__(self, path: str):
+    self.path = path
+
+  def load(self):
+    """
+        :return: saved state, None if there is none
+        """
+    try:
+      with open(self.path, "r") as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return None
+
+  def save(self, state: dict):
+    tmp_path = "{}.tmp".format(self.path)
+    with open(tmp_path, "w") as f:
+      json.dump(state, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self.path)
+
+  def clear(self):
+    try:
+      os.remove(self.path)
+    except FileNotFoundError:
+      pass
+
+
+class NDJSONSink(object):
+  """
+    append-only NDJSON file written one page at a time
+
+    with compress every page is appended as its own gzip member, the file stays a valid
+    gzip stream (gzip.open reads all members) and every page ends on a member boundary,
+    so the file can be cut back to the offset of any page.
+    """
+
+  def __init__(self, path: str, compress: bool = None, offset: int = 0):
+    """
+        :param path: output file, created if missing
+        :param compress: gzip the pages, default True if path ends with .gz
+        :param offset: bytes to keep, what follows is the partial page of a crashed export
+        """
+    self.path = path
+    self.compress = path.endswith(".gz") if compress is None else compress
+    self._file = open(path, "ab")
+    self._file.truncate(offset)
+    self._file.seek(offset)
+
+  def write_page(self, records) -> int:
+    """
+        :param records: json serializable records
+        :return: file offset after the page
+        """
+    data = b"".join(
+      json.dumps(record, ensure_ascii=False).encode("utf8") + b"\n" for record in records
+    )
+    if data:
+      self._file.write(gzip.compress(data) if self.compress else data)
+      self._file.flush()
+      os.fsync(self._file.fileno())
+    return self._file.tell()
+
+  def close(self):
+    self._file.close()
+
+
+class ExportReport(object):
+  """
+    Attributes
+      path: output file
+      count: records exported, previous runs included
+      pages: pages fetched by this run
+      complete: True once the whole history is exported
+      cursor: cursor of the next page, None when complete
+    """
+
+  def __init__(self, path: str, count: int, pages: int, complete: bool, cursor):
+    self.path = path
+    self.count = count
+    self.pages = pages
+    self.complete = complete
+    self.cursor = cursor
+
+  def __repr__(self):
+    return "ExportReport({!r}, count={}, complete={})".format(self.path, self.count, self.complete)
+
+
+def export_pages(
+  fetch,
+  cursor,
+  advance,
+  path: str,
+  checkpoint_path: str = None,
+  compress: bool = None,
+  prefetch: bool = True
+) -> ExportReport:
+  """
+    write every page of a paginated endpoint to an NDJSON file, checkpointing the cursor
+    after each page; a new call with the same paths resumes where the last one stopped
+
+    :param fetch: fetch(cursor) -> response, see paginate.paginate_pages
+    :param cursor: cursor of the first page, ignored when resuming
+    :param advance: advance(result, cursor) -> (items, next cursor or None)
+    :param path: output file
+    :param checkpoint_path: state file, default path + ".checkpoint"
+    :param compress: gzip the output, default True if path ends with .gz
+    :param prefetch: fetch the next page while the current one is written
+    :return: ExportReport, raises paginate.PageError if a page fails (the checkpoint is kept)
+    """
+  checkpoint = Checkpoint(checkpoint_path or "{}.checkpoint".format(path))
+  state = checkpoint.load() or {"cursor": cursor, "offset": 0, "count": 0, "complete": False}
+  if state["complete"]:
+    return ExportReport(path, state["count"], 0, True, None)
+
+  sink = NDJSONSink(path, compress=compress, offset=state["offset"])
+  pages = 0
+  try:
+    for items, next_cursor in paginate_pages(fetch, state["cursor"], advance, prefetch):
+      pages += 1
+      state = {
+        "cursor": next_cursor,
+        "offset": sink.write_page(items),
+        "count": state["count"] + len(items),
+        "complete": next_cursor is None,
+        "updated_at": time.time(),
+      }
+      checkpoint.save(state)
+  finally:
+    sink.close()
+  return ExportReport(path, state["count"], pages, state["complete"], state["cursor"])
+
+
+def export_c2c_history(
+  client,
+  from_account: str,
+  to_account: str,
+  path: str,
+  min_time: int = 0,
+  max_time: int = None,
+  page_size: int = 100,
+  **kwargs
+) -> ExportReport:
+  """
+    stream the one-to-one history of two users, newest first, to NDJSON
+
+    >>> export_c2c_history(client, "user0", "user1", "/data/user0-user1.ndjson.gz")
+
+    :param client: TCIMClient
+    :param min_time: oldest MsgTimeStamp exported
+    :param max_time: newest MsgTimeStamp exported, default now
+    :param page_size: messages per get_message_list call
+    :param kwargs: checkpoint_path, compress, prefetch of export_pages
+    :return: ExportReport
+    """
+  max_time = int(time.time()) if max_time is None else max_time
+  return export_pages(
+    lambda cursor: client.
+    get_message_list(from_account, to_account, page_size, min_time, cursor[0], cursor[1]),
+    [max_time, ""], c2c_history_page, path, **kwargs
+  )
+
+
+def export_group_history(
+  client,
+  group_id: str,
+  path: str,
+  from_seq: int = 0,
+  page_size: int = GROUP_HISTORY_PAGE_LIMIT,
+  with_recalled_msg: int = 1,
+  **kwargs
+) -> ExportReport:
+  """
+    stream the history of a group, newest first, to NDJSON
+
+    >>> export_group_history(client, "@TGS#2J4SZEAEL", "/data/group.ndjson")
+
+    :param client: TCIMClient
+    :param from_seq: MsgSeq of the newest message exported, 0 means the latest
+    :param page_size: messages per get_msg_in_group call, at most 20
+    :param with_recalled_msg: also export recalled messages
+    :param kwargs: checkpoint_path, compress, prefetch of export_pages
+    :return: ExportReport
+    """
+  page_size = min(page_size, GROUP_HISTORY_PAGE_LIMIT)
+  return export_pages(
+    lambda msg_seq: client.get_msg_in_group(group_id, page_size, with_recalled_msg, msg_seq),
+    from_seq, group_history_page, path, **kwargs
+  )
+
+
+class Manifest(object):
+  """
+    append-only NDJSON log of finished groups of an export job, the last record of a group
+    wins. records: {"group_id", "status": "done" | "failed", "count", "path", "error"}
+    """
+
+  def __init__(self, path: str):
+    self.path = path
+    self._lock = threading.Lock()
+
+  def load(self) -> dict:
+    """
+        :return: {group_id: last record}
+        """
+    records = {}
+    try:
+      with open(self.path, "r", encoding="utf8") as f:
+        for line in f:
+          try:
+            record = json.loads(line)
+          except ValueError:
+            # torn last line of a crashed run
+            continue
+          records[record["group_id"]] = record
+    except FileNotFoundError:
+      pass
+    return records
+
+  def append(self, record: dict):
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with self._lock:
+      with open(self.path, "a", encoding="utf8") as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def in_shard(group_id: str, shard_index: int, shard_count: int) -> bool:
+  """
+    stable split of group ids between shard_count machines
+    """
+  return zlib.crc32(group_id.encode("utf8")) % shard_count == shard_index
+
+
+def export_app_group_history(
+  client,
+  out_dir: str,
+  shard_index: int = 0,
+  shard_count: int = 1,
+  max_workers: int = 8,
+  group_type: str = "",
+  compress: bool = True,
+  rate_limiter: RateLimiter = None,
+  retry_failed: bool = True
+):
+  """
+    export the history of every group of the app, one NDJSON file per group, exporting
+    max_workers groups at a time
+
+    groups are listed lazily with iter_app_groups, the groups of other shards are skipped.
+    every finished group is appended to out_dir/manifest-<shard_index>-of-<shard_count>.ndjson;
+    a rerun skips the groups done in the manifest and resumes unfinished groups from their
+    checkpoints. run each shard on its own machine to split the job.
+
+    >>> for record in export_app_group_history(client, "/data/export", shard_index=0, shard_count=4):
+    >>>     print(record["group_id"], record["status"], record["count"])
+
+    :param client: TCIMClient
+    :param out_dir: output directory, created if missing
+    :param shard_index: shard of this process, 0 <= shard_index < shard_count
+    :param shard_count: number of shards
+    :param max_workers: groups exported concurrently
+    :param group_type: only export groups of this type, see get_group
+    :param compress: gzip the group files
+    :param rate_limiter: limiter of the calls of the job, the client's own or
+    RateLimiter() by default
+    :param retry_failed: also export the groups the manifest records as failed
+    :return: generator of the manifest records of this run, in completion order
+    """
+  os.makedirs(out_dir, exist_ok=True)
+  client = rate_limited(client, rate_limiter)
+  manifest = Manifest(
+    os.path.join(out_dir, "manifest-{}-of-{}.ndjson".format(shard_index, shard_count))
+  )
+  finished = {
+    group_id for group_id, record in manifest.load().items()
+    if record["status"] == "done" or not retry_failed
+  }
+
+  def pending():
+    for group in client.iter_app_groups(group_type, prefetch=True):
+      group_id = group["GroupId"]
+      if in_shard(group_id, shard_index, shard_count) and group_id not in finished:
+        yield group_id
+
+  def export(group_id):
+    path = os.path.join(
+      out_dir, "{}.ndjson{}".format(quote(group_id, safe=""), ".gz" if compress else "")
+    )
+    record = {"group_id": group_id, "path": path}
+    try:
+      report = export_group_history(client, group_id, path, compress=compress, prefetch=False)
+      record.update(status="done", count=report.count, error=None)
+    except Exception as e:
+      # eg: PageError, OSError writing the group file; the other groups go on
+      record.update(status="failed", count=None, error=str(e))
+    return record
+
+  for _, _, record in stream_chunks(export, pending(), max_workers=max_workers):
+    manifest.append(record)
+    yield record
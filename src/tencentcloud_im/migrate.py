@@ -0,0 +1,458 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable
+
+from .bulk import (GROUP_IMPORT_BATCH_LIMIT, NO_RESPONSE_ERROR_CODE, chunked, is_ok, parse_response)
+from .export import Checkpoint
+from .ratelimit import RateLimiter, rate_limited
+from .tcim_client import GroupMessageObj, MessageObj
+
+_STOP = object()
+
+
+def read_ndjson(path: str, position: int = 0):
+  """
+    :param position: byte offset of the first line to read
+    :return: generator of (record, byte offset after the record)
+    """
+  with open(path, "rb") as f:
+    f.seek(position)
+    for line in iter(f.readline, b""):
+      position += len(line)
+      if line.strip():
+        yield json.loads(line), position
+
+
+def _stable_random(message) -> int:
+  """
+    random derived from the message, so a message imported twice after a crash is
+    deduplicated by the server
+    """
+  return zlib.crc32(json.dumps(message, sort_keys=True).encode("utf8"))
+
+
+def _restore(cls, fields: dict):
+  message = cls.__new__(cls)
+  message.__dict__.update(fields)
+  return message
+
+
+def message_of(record, offset: int = None):
+  """
+    :param record: (MessageObj, MsgTimeStamp) or dict with From_Account, To_Account, MsgBody,
+    MsgTimeStamp and optional MsgRandom, CloudCustomData
+    :param offset: position of the record in its source, mixed into the derived MsgRandom so
+    identical messages sent in the same second stay distinct
+    :return: (MessageObj, MsgTimeStamp), a MessageObj gets a derived MsgRandom in place of
+    the one drawn by its constructor, a dict keeps its own MsgRandom if it has one
+    """
+  if isinstance(record, (tuple, list)):
+    message, timestamp = record
+    fields = dict(message.__dict__)
+    fields.pop("MsgRandom", None)
+  else:
+    fields = dict(record)
+    timestamp = fields.pop("MsgTimeStamp")
+  fields.pop("SyncFromOldSystem", None)
+  if "MsgRandom" not in fields:
+    fields["MsgRandom"] = _stable_random([fields, timestamp, offset])
+  return _restore(MessageObj, fields), timestamp
+
+
+class MigrationReport(object):
+  """
+    Attributes
+      imported: messages imported by this run
+      failed: messages the server refused in this run, see failed_path
+      offset: records of the source committed so far, previous runs included
+      complete: True once the whole source is committed
+    """
+
+  def __init__(self, imported: int, failed: int, offset: int, complete: bool):
+    self.imported = imported
+    self.failed = failed
+    self.offset = offset
+    self.complete = complete
+
+  def __repr__(self):
+    return "MigrationReport(imported={}, failed={}, offset={})".format(
+      self.imported, self.failed, self.offset
+    )
+
+
+class _Watermark(object):
+  """
+    lowest source offset below which every record is finished, records finish out of order
+    """
+
+  def __init__(self, offset: int, position: int):
+    self.offset = offset
+    self.position = position
+    self._done = []
+
+  def finish(self, offset: int, position: int):
+    heapq.heappush(self._done, (offset, position))
+    while self._done and self._done[0][0] == self.offset:
+      _, self.position = heapq.heappop(self._done)
+      self.offset += 1
+
+
+class C2CMigration(object):
+  """
+    import one-to-one history with import_message_to_im, max_workers messages at a time
+
+    the messages of a conversation (the pair of users, both directions) are imported one by
+    one in source order by the same worker, different conversations run in parallel. calls
+    go through the client's rate limiter, or a default RateLimiter (importmsg: 200/s) when
+    the client has none.
+
+    progress is checkpointed every checkpoint_every records as the offset below which every
+    record is finished; a rerun resumes from it. records finished after the checkpoint are
+    imported again, the server drops duplicates by MsgRandom, which message_of derives from
+    the message and its source offset unless a dict record sets it. an error of a worker,
+    eg: an OSError writing failed_path, stops the run and is raised once the progress up to
+    it is checkpointed.
+
+    >>> migration = C2CMigration(client, "/data/migration.checkpoint", max_workers=32)
+    >>> report = migration.run_ndjson("/data/history.ndjson")
+
+    Attributes
+      client: TCIMClient
+      checkpoint: export.Checkpoint of the progress
+      failed_path: NDJSON file receiving refused records with their ErrorCode
+    """
+
+  def __init__(
+    self,
+    client,
+    checkpoint_path: str,
+    max_workers: int = 16,
+    queue_size: int = 256,
+    checkpoint_every: int = 1000,
+    failed_path: str = None,
+    rate_limiter: RateLimiter = None,
+    sync_from_old: int = 1
+  ):
+    """
+        :param client: TCIMClient
+        :param checkpoint_path: progress file
+        :param max_workers: concurrent conversations
+        :param queue_size: records buffered per worker
+        :param checkpoint_every: records finished between two checkpoints
+        :param failed_path: refused records file, default checkpoint_path + ".failed"
+        :param rate_limiter: limiter of the import calls
+        :param sync_from_old: SyncFromOldSystem of import_message_to_im
+        """
+    self.client = rate_limited(client, rate_limiter)
+    self.checkpoint = Checkpoint(checkpoint_path)
+    self.max_workers = max_workers
+    self.queue_size = queue_size
+    self.checkpoint_every = checkpoint_every
+    self.failed_path = failed_path or "{}.failed".format(checkpoint_path)
+    self.sync_from_old = sync_from_old
+    self._lock = threading.Lock()
+
+  def run(self, records) -> MigrationReport:
+    """
+        :param records: iterable of records, see message_of, in the same order on every run
+        :return: MigrationReport
+        """
+    state = self._load()
+    return self._migrate(((record, 0) for record in islice(records, state["offset"], None)), state)
+
+  def run_ndjson(self, path: str) -> MigrationReport:
+    """
+        :param path: NDJSON file of records, see message_of, resumed by byte offset
+        :return: MigrationReport
+        """
+    state = self._load()
+    return self._migrate(read_ndjson(path, state["position"]), state)
+
+  def _load(self):
+    return self.checkpoint.load() or {"offset": 0, "position": 0, "complete": False}
+
+  def _migrate(self, source, state):
+    if state["complete"]:
+      return MigrationReport(0, 0, state["offset"], True)
+    self._watermark = _Watermark(state["offset"], state["position"])
+    self._imported = self._failed = self._since_checkpoint = 0
+    self._error = None
+    queues = [queue.Queue(self.queue_size) for _ in range(self.max_workers)]
+    workers = [threading.Thread(target=self._work, args=(q,), daemon=True) for q in queues]
+    for worker in workers:
+      worker.start()
+
+    complete = False
+    try:
+      offset = state["offset"]
+      for record, position in source:
+        if self._error is not None:
+          break
+        message, timestamp = message_of(record, offset)
+        conversation = "\n".join(sorted((message.From_Account, message.To_Account)))
+        worker_queue = queues[zlib.crc32(conversation.encode("utf8")) % len(queues)]
+        worker_queue.put((offset, position, message, timestamp, record))
+        offset += 1
+      else:
+        complete = True
+    finally:
+      for worker_queue in queues:
+        worker_queue.put(_STOP)
+      for worker in workers:
+        worker.join()
+      with self._lock:
+        self._save(complete and self._error is None)
+    if self._error is not None:
+      raise self._error
+    return MigrationReport(self._imported, self._failed, self._watermark.offset, complete)
+
+  def _work(self, worker_queue):
+    while True:
+      task = worker_queue.get()
+      if task is _STOP:
+        return
+      if self._error is not None:
+        # keep draining so the producer never blocks on a full queue
+        continue
+      try:
+        self._import(*task)
+      except Exception as e:
+        with self._lock:
+          if self._error is None:
+            self._error = e
+
+  def _import(self, offset, position, message, timestamp, record):
+    result = parse_response(
+      self.client.import_message_to_im(message, timestamp, self.sync_from_old)
+    )
+    with self._lock:
+      if is_ok(result):
+        self._imported += 1
+      else:
+        self._failed += 1
+        self._log_failure(record, message, timestamp, result)
+      self._watermark.finish(offset, position)
+      self._since_checkpoint += 1
+      if self._since_checkpoint >= self.checkpoint_every:
+        self._save(False)
+
+  def _log_failure(self, record, message, timestamp, result):
+    if not isinstance(record, dict):
+      record = dict(message.__dict__, MsgTimeStamp=timestamp)
+    failure = {
+      "record": record,
+      "ErrorCode": NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode"),
+      "ErrorInfo": "no response" if result is None else result.get("ErrorInfo", ""),
+    }
+    with open(self.failed_path, "a", encoding="utf8") as f:
+      f.write(json.dumps(failure, ensure_ascii=False) + "\n")
+
+  def _save(self, complete: bool):
+    """
+        called with the lock held
+        """
+    self._since_checkpoint = 0
+    self.checkpoint.save(
+      {
+        "offset": self._watermark.offset,
+        "position": self._watermark.position,
+        "complete": complete,
+        "updated_at": time.time(),
+      }
+    )
+
+
+def group_message_of(record, index: int = None) -> GroupMessageObj:
+  """
+    :param record: GroupMessageObj or dict with From_Account, SendTime, MsgBody and optional
+    Random, CloudCustomData
+    :param index: position of the record in its source, mixed into the derived Random so
+    identical messages sent in the same second stay distinct
+    """
+  if isinstance(record, GroupMessageObj):
+    return record
+  fields = dict(record)
+  if "Random" not in fields:
+    fields["Random"] = _stable_random([fields, index])
+  return _restore(GroupMessageObj, fields)
+
+
+def _spill(run, directory):
+  fd, path = tempfile.mkstemp(prefix="tcim-sort-", suffix=".ndjson", dir=directory)
+  with os.fdopen(fd, "w", encoding="utf8") as f:
+    for key, message in run:
+      f.write(json.dumps([key, message.__dict__], ensure_ascii=False) + "\n")
+  return path
+
+
+def _read_run(path):
+  with open(path, "r", encoding="utf8") as f:
+    for line in f:
+      key, fields = json.loads(line)
+      yield tuple(key), _restore(GroupMessageObj, fields)
+
+
+def sorted_by_send_time(messages: Iterable, buffer_size: int = 100000, tmp_dir: str = None):
+  """
+    sort group messages by SendTime, arrival order breaking ties, holding at most
+    buffer_size messages in memory: longer streams are cut into sorted runs spilled to
+    temporary files, then merged
+
+    :param messages: GroupMessageObj or dicts, see group_message_of
+    :param tmp_dir: directory of the runs, default the system temp directory
+    :return: generator of GroupMessageObj
+    """
+  keyed = ((group_message_of(record, index), index) for index, record in enumerate(messages))
+  runs = []
+  try:
+    for chunk in chunked(keyed, buffer_size):
+      run = sorted(
+        (((message.SendTime, index), message) for message, index in chunk),
+        key=lambda item: item[0]
+      )
+      if not runs and len(chunk) < buffer_size:
+        # everything fit in memory
+        for _, message in run:
+          yield message
+        return
+      runs.append(_spill(run, tmp_dir))
+      del run, chunk
+    for _, message in heapq.merge(*[_read_run(path) for path in runs], key=lambda item: item[0]):
+      yield message
+  finally:
+    for path in runs:
+      os.remove(path)
+
+
+class GroupImportReport(object):
+  """
+    Attributes
+      group_id: group of the messages
+      imported: messages imported
+      failed: [{"Random", "SendTime", "Result"}] of the messages the server refused, Result
+      is the ErrorCode of the whole call when it failed
+    """
+
+  def __init__(self, group_id: str):
+    self.group_id = group_id
+    self.imported = 0
+    self.failed = []
+
+  @property
+  def ok(self):
+    return not self.failed
+
+  def __repr__(self):
+    return "GroupImportReport({!r}, imported={}, failed={})".format(
+      self.group_id, self.imported, len(self.failed)
+    )
+
+
+class GroupHistoryImport(object):
+  """
+    import group history with import_message_to_group in full batches of 20 messages
+
+    the messages of a group may come in any order and in any number: they are sorted by
+    SendTime with bounded memory and imported one batch after the other, groups run in
+    parallel. calls go through the client's rate limiter, or a default RateLimiter when the
+    client has none.
+
+    >>> importer = GroupHistoryImport(client, max_workers=8)
+    >>> reports = importer.run({"@TGS#2J4SZEAEL": messages, "@TGS#2C5SZEAEF": other_messages})
+    >>> reports["@TGS#2J4SZEAEL"].failed
+
+    Attributes
+      client: TCIMClient
+    """
+
+  def __init__(
+    self,
+    client,
+    max_workers: int = 4,
+    batch_size: int = GROUP_IMPORT_BATCH_LIMIT,
+    buffer_size: int = 100000,
+    recent_contact_flag: int = 1,
+    tmp_dir: str = None,
+    rate_limiter: RateLimiter = None
+  ):
+    """
+        :param client: TCIMClient
+        :param max_workers: groups imported concurrently
+        :param batch_size: messages per call, at most 20
+        :param buffer_size: messages of a group sorted in memory, bigger groups spill to disk
+        :param recent_contact_flag: RecentContactFlag of import_message_to_group
+        :param tmp_dir: directory of the sorted runs
+        :param rate_limiter: limiter of the import calls
+        """
+    self.client = rate_limited(client, rate_limiter)
+    self.max_workers = max_workers
+    self.batch_size = min(batch_size, GROUP_IMPORT_BATCH_LIMIT)
+    self.buffer_size = buffer_size
+    self.recent_contact_flag = recent_contact_flag
+    self.tmp_dir = tmp_dir
+
+  def import_group(self, group_id: str, messages: Iterable) -> GroupImportReport:
+    """
+        :param messages: GroupMessageObj or dicts, see group_message_of, in any order
+        :return: GroupImportReport
+        """
+    report = GroupImportReport(group_id)
+    ordered = sorted_by_send_time(messages, self.buffer_size, self.tmp_dir)
+    for batch in chunked(ordered, self.batch_size):
+      response = self.client.import_message_to_group(group_id, self.recent_contact_flag, batch)
+      self._collect(report, batch, parse_response(response))
+    return report
+
+  def _collect(self, report: GroupImportReport, batch, result):
+    if is_ok(result):
+      codes = [item.get("Result", 0) for item in result.get("ImportMsgResult", [])]
+      codes += [0] * (len(batch) - len(codes))
+    else:
+      code = NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+      codes = [code] * len(batch)
+    for message, code in zip(batch, codes):
+      if code == 0:
+        report.imported += 1
+      else:
+        report.failed.append(
+          {
+            "Random": message.Random,
+            "SendTime": message.SendTime,
+            "Result": code
+          }
+        )
+
+  def run(self, groups: Dict[str, Iterable]) -> Dict[str, GroupImportReport]:
+    """
+        :param groups: {group_id: messages}, the iterables are consumed lazily
+        :return: {group_id: GroupImportReport}
+        """
+    with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+      futures = {
+        group_id: pool.submit(self.import_group, group_id, messages)
+        for group_id, messages in groups.items()
+      }
+      return {group_id: future.result() for group_id, future in futures.items()}
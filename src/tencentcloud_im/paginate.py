@@ -0,0 +1,184 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from .bulk import NO_RESPONSE_ERROR_CODE, is_ok, parse_response
+
+
+class PageError(Exception):
+  """
+    a page could not be fetched, iteration stops
+
+    Attributes
+      code: ErrorCode of the page, NO_RESPONSE_ERROR_CODE if there was no response
+      info: ErrorInfo of the page
+    """
+
+  def __init__(self, code: int, info: str):
+    super(PageError, self).__init__("page failed: {} {}".format(code, info))
+    self.code = code
+    self.info = info
+
+
+def _checked(response) -> dict:
+  result = parse_response(response)
+  if result is None:
+    raise PageError(NO_RESPONSE_ERROR_CODE, "no response")
+  if not is_ok(result):
+    raise PageError(result.get("ErrorCode"), result.get("ErrorInfo", ""))
+  return result
+
+
+def paginate_pages(fetch, cursor, advance, prefetch: bool = False):
+  """
+    yield every page, one page in memory at a time
+
+    :param fetch: fetch(cursor) -> response of the page at cursor
+    :param cursor: cursor of the first page
+    :param advance: advance(result, cursor) -> (items, cursor of the next page or None)
+    :param prefetch: fetch the next page on a thread while the current one is consumed
+    :return: generator of (items, cursor of the next page or None), raises PageError if a
+    page fails
+    """
+  pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+  page = pool.submit(fetch, cursor) if pool is not None else None
+  try:
+    while True:
+      result = _checked(page.result() if pool is not None else fetch(cursor))
+      items, cursor = advance(result, cursor)
+      if pool is not None and cursor is not None:
+        page = pool.submit(fetch, cursor)
+      yield items, cursor
+      if cursor is None:
+        return
+  finally:
+    if pool is not None:
+      pool.shutdown(wait=False)
+
+
+async def paginate_pages_async(fetch, cursor, advance, prefetch: bool = False):
+  """
+    async counterpart of paginate_pages, fetch returns a coroutine
+    :return: async generator of (items, cursor of the next page or None)
+    """
+  page = asyncio.ensure_future(fetch(cursor)) if prefetch else None
+  try:
+    while True:
+      result = _checked(await page if prefetch else await fetch(cursor))
+      items, cursor = advance(result, cursor)
+      if prefetch and cursor is not None:
+        page = asyncio.ensure_future(fetch(cursor))
+      yield items, cursor
+      if cursor is None:
+        return
+  finally:
+    if page is not None and not page.done():
+      page.cancel()
+
+
+def paginate(fetch, cursor, advance, prefetch: bool = False):
+  """
+    yield the items of every page of paginate_pages
+    :return: generator of items, raises PageError if a page fails
+    """
+  for items, _ in paginate_pages(fetch, cursor, advance, prefetch):
+    for item in items:
+      yield item
+
+
+async def paginate_async(fetch, cursor, advance, prefetch: bool = False):
+  """
+    async counterpart of paginate, fetch returns a coroutine
+    :return: async generator of items, raises PageError if a page fails
+    """
+  async for items, _ in paginate_pages_async(fetch, cursor, advance, prefetch):
+    for item in items:
+      yield item
+
+
+def friends_page(result, start_index):
+  """
+    sns/friend_get pages, cursor is StartIndex
+    """
+  items = result.get("UserDataItem", [])
+  next_index = result.get("NextStartIndex", 0)
+  if result.get("CompleteFlag", 1) == 1 or not next_index or not items:
+    return items, None
+  return items, next_index
+
+
+def app_groups_page(result, next_num):
+  """
+    group_open_http_svc/get_appid_group_list pages, cursor is Next
+    """
+  items = result.get("GroupIdList", [])
+  return items, (result.get("Next") or None) if items else None
+
+
+def offset_page(items_field: str, total_field: str, limit: int):
+  """
+    pages walked with Offset, the last one is short or reaches the total
+    """
+
+  def advance(result, offset):
+    items = result.get(items_field, [])
+    offset += len(items)
+    if len(items) < limit or offset >= result.get(total_field, offset + 1):
+      return items, None
+    return items, offset
+
+  return advance
+
+
+def group_members_page(limit: int):
+  """
+    group_open_http_svc/get_group_member_info pages, cursor is (Offset, Next); communities
+    return Next, other groups are walked with Offset
+    """
+  by_offset = offset_page("MemberList", "MemberNum", limit)
+
+  def advance(result, cursor):
+    if "Next" not in result:
+      items, offset = by_offset(result, cursor[0])
+      return items, (offset, "") if offset is not None else None
+    items = result.get("MemberList", [])
+    return items, ((0, result["Next"]) if result["Next"] not in ("", "0") and items else None)
+
+  return advance
+
+
+def c2c_history_page(result, cursor):
+  """
+    openim/admin_getroammsg pages, cursor is [MaxTime, LastMsgKey]
+    """
+  items = result.get("MsgList", [])
+  if result.get("Complete", 1) == 1 or not items:
+    return items, None
+  return items, [result.get("LastMsgTime"), result.get("LastMsgKey")]
+
+
+def group_history_page(result, msg_seq):
+  """
+    group_open_http_svc/group_msg_get_simple pages walked towards older messages, cursor
+    is ReqMsgSeq, 0 meaning the latest message. IsFinished only tells whether the page
+    holds all requested messages, 2 means the older ones expired.
+    """
+  items = result.get("RspMsgList", [])
+  if result.get("IsFinished") == 2 or not items:
+    return items, None
+  oldest = min(item["MsgSeq"] for item in items)
+  return items, (oldest - 1 if oldest > 1 else None)
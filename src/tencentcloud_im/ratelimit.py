@@ -0,0 +1,375 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+from .executor import RateLimitedExecutor
+
+# calls per second allowed by tencent im, keyed by endpoint path. "family/*" applies to every
+# endpoint of the family and "*" to everything else. every endpoint gets its own bucket.
+# https://cloud.tencent.com/document/product/269/1519
+DEFAULT_LIMITS = {
+  "openim/sendmsg": 200,
+  "openim/batchsendmsg": 200,
+  "openim/importmsg": 200,
+  "im_open_login_svc/*": 100,
+  "sns/*": 100,
+  "group_open_http_svc/*": 200,
+  "group_open_attr_http_svc/*": 200,
+  "*": 200,
+}
+
+
+class TokenBucket(object):
+  """
+    token bucket refilled at rate tokens per second up to capacity
+
+    reserve() takes the tokens immediately and returns how long the caller must wait
+    before using them, so concurrent callers are served in arrival order.
+    """
+
+  def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+    """
+        :param rate: tokens per second
+        :param capacity: max burst, default rate (one second worth of calls)
+        :param clock: monotonic clock
+        """
+    self.rate = float(rate)
+    self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+    self.clock = clock
+    self.tokens = self.capacity
+    self.updated_at = clock()
+    self._lock = threading.Lock()
+
+  def reserve(self, tokens: float = 1) -> float:
+    """
+        :param tokens: tokens to take
+        :return: seconds to wait before the tokens may be used
+        """
+    with self._lock:
+      now = self.clock()
+      self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+      self.updated_at = now
+      self.tokens -= tokens
+      return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimitBackend(object):
+  """
+    bucket store shared by RateLimiters
+
+    a backend only has to implement reserve(): take tokens from the bucket of key, creating
+    it full if missing, and return the seconds to wait before they may be used. it must be
+    atomic across every limiter sharing the backend.
+
+    with an AsyncTCIMClient, a backend may implement the coroutine reserve_async() with the
+    same arguments. without it, reserve() of a blocking backend (file lock, network round
+    trip) runs in the loop's default executor, and only a backend with blocking = False is
+    called on the event loop itself.
+
+    Attributes
+      blocking: reserve() may block the calling thread
+    """
+  blocking = True
+
+  def reserve(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+    raise NotImplementedError()
+
+
+class LocalBackend(RateLimitBackend):
+  """
+    in-process bucket store, one TokenBucket per key, safe to call on the event loop
+    """
+  blocking = False
+
+  def __init__(self, clock=time.monotonic):
+    self.clock = clock
+    self.buckets = {}
+    self._lock = threading.Lock()
+
+  def reserve(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+    """
+        :return: seconds to wait before the tokens may be used
+        """
+    bucket = self.buckets.get(key)
+    if bucket is None:
+      with self._lock:
+        bucket = self.buckets.setdefault(key, TokenBucket(rate, capacity, clock=self.clock))
+    return bucket.reserve(tokens)
+
+
+class SharedFileBackend(RateLimitBackend):
+  """
+    bucket store in a memory-mapped file shared by every process of the host
+
+    each bucket is a fixed slot (key hash, tokens, updated at) found by open addressing,
+    updates are serialized with flock, so gunicorn workers pointing at the same path share
+    one budget per endpoint. posix only. the async client takes the lock off the event loop,
+    in the loop's default executor.
+
+    >>> limiter = RateLimiter(backend=SharedFileBackend("/dev/shm/tcim-ratelimit"))
+
+    Attributes
+      path: backing file
+      slots: max number of buckets
+    """
+  SLOT = struct.Struct("<Qdd")
+
+  def __init__(self, path: str, slots: int = 256, clock=time.time):
+    """
+        :param path: backing file, created if missing; a tmpfs path avoids disk writes
+        :param slots: max number of buckets, every process must use the same value
+        :param clock: unix time shared by all processes
+        """
+    import fcntl
+    self._fcntl = fcntl
+    self.path = path
+    self.slots = slots
+    self.clock = clock
+    self._lock = threading.Lock()
+    self._pid = None
+    self._fd = None
+    self._map = None
+    self._open()
+
+  def _open(self):
+    # flock is bound to the open file description, which a forked child shares with its
+    # parent, so every process opens the file itself
+    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+    size = self.slots * self.SLOT.size
+    self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+    try:
+      if os.fstat(self._fd).st_size < size:
+        os.ftruncate(self._fd, size)
+    finally:
+      self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+    self._map = mmap.mmap(self._fd, size)
+    self._pid = os.getpid()
+
+  @staticmethod
+  def _hash(key: str) -> int:
+    return struct.unpack("<Q", hashlib.blake2b(key.encode("utf8"), digest_size=8).digest())[0] or 1
+
+  def _slot(self, key_hash: int) -> int:
+    start = key_hash % self.slots
+    for probe in range(self.slots):
+      offset = ((start + probe) % self.slots) * self.SLOT.size
+      slot_hash = self.SLOT.unpack_from(self._map, offset)[0]
+      if slot_hash == key_hash or slot_hash == 0:
+        return offset
+    raise RuntimeError("rate limit file {} has no free slot".format(self.path))
+
+  def reserve(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+    key_hash = self._hash(key)
+    with self._lock:
+      if self._pid != os.getpid():
+        self._open()
+      self._fcntl.flock(self._fd, self._fcntl.LOCK_EX)
+      try:
+        offset = self._slot(key_hash)
+        slot_hash, level, updated_at = self.SLOT.unpack_from(self._map, offset)
+        now = self.clock()
+        if slot_hash == 0:
+          level, updated_at = capacity, now
+        level = min(capacity, level + max(0.0, now - updated_at) * rate) - tokens
+        self.SLOT.pack_into(self._map, offset, key_hash, level, now)
+      finally:
+        self._fcntl.flock(self._fd, self._fcntl.LOCK_UN)
+    return max(0.0, -level / rate)
+
+  def close(self):
+    with self._lock:
+      if self._map is not None:
+        self._map.close()
+        os.close(self._fd)
+        self._map = None
+
+
+_REDIS_RESERVE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local tokens = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local level = tonumber(state[1])
+local ts = tonumber(state[2])
+if level == nil then
+  level = capacity
+  ts = now
+end
+level = math.min(capacity, level + math.max(0, now - ts) * rate) - tokens
+redis.call('HSET', KEYS[1], 'tokens', tostring(level), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - level) / rate) + 60)
+if level >= 0 then
+  return 0
+end
+return math.ceil(-level / rate * 1000000)
+"""
+
+
+class RedisBackend(RateLimitBackend):
+  """
+    bucket store on a redis server shared by every host of the app
+
+    buckets are updated by one lua script using the server clock, so hosts need no clock
+    sync. any client with redis-py's eval(script, numkeys, *keys_and_args) works. the async
+    client awaits async_client (eg: redis.asyncio.Redis) when given, else it runs the
+    blocking client in the loop's default executor.
+
+    >>> limiter = RateLimiter(backend=RedisBackend(redis.Redis(host="10.0.0.1")))
+    """
+
+  def __init__(self, client, prefix: str = "tcim:ratelimit:", async_client=None):
+    """
+        :param client: redis client
+        :param prefix: prefix of the bucket keys, eg: one per sdk app id
+        :param async_client: redis client whose eval() is a coroutine, used by the async client
+        """
+    self.client = client
+    self.prefix = prefix
+    self.async_client = async_client
+
+  def _args(self, key, rate, capacity, tokens):
+    return _REDIS_RESERVE_SCRIPT, 1, self.prefix + key, repr(rate), repr(capacity), repr(tokens)
+
+  def reserve(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+    return int(self.client.eval(*self._args(key, rate, capacity, tokens))) / 1000000.0
+
+  async def reserve_async(self, key: str, rate: float, capacity: float, tokens: float = 1):
+    if self.async_client is None:
+      return await asyncio.get_running_loop().run_in_executor(
+        None, self.reserve, key, rate, capacity, tokens
+      )
+    wait_us = await self.async_client.eval(*self._args(key, rate, capacity, tokens))
+    return int(wait_us) / 1000000.0
+
+
+class RateLimiter(object):
+  """
+    per-endpoint rate limiter
+
+    >>> limiter = RateLimiter({"openim/sendmsg": 200, "group_open_http_svc/*": (50, 100)})
+    >>> client = TCIMClient(sdk_id, sdk_secret, admin_account, rate_limiter=limiter)
+
+    one process: LocalBackend (default). all workers of a host: SharedFileBackend. all hosts
+    of an app: RedisBackend, or any RateLimitBackend. every backend is safe with the async
+    client, see RateLimitBackend for how blocking ones are kept off the event loop.
+
+    Attributes
+      limits: {path pattern: rate or (rate, capacity)}, see DEFAULT_LIMITS
+      backend: bucket store, LocalBackend by default
+      waited: total seconds callers were delayed
+    """
+
+  def __init__(self, limits: dict = None, backend=None):
+    """
+        :param limits: {path pattern: rate or (rate, capacity)}, merged over DEFAULT_LIMITS
+        :param backend: bucket store with reserve(key, rate, capacity, tokens)
+        """
+    self.limits = dict(DEFAULT_LIMITS)
+    if limits:
+      self.limits.update(limits)
+    self.backend = backend if backend is not None else LocalBackend()
+    self.waited = 0.0
+    self._rules = {}
+    self._lock = threading.Lock()
+
+  def rule(self, path: str):
+    """
+        :param path: endpoint path, eg: "openim/sendmsg"
+        :return: (rate, capacity), (0, 0) means unlimited
+        """
+    rule = self._rules.get(path)
+    if rule is None:
+      family = path.split("/", 1)[0]
+      limit = self.limits.get(path, self.limits.get(family + "/*", self.limits.get("*", 0)))
+      if isinstance(limit, (tuple, list)):
+        rule = (float(limit[0]), float(limit[1]))
+      else:
+        rule = (float(limit), max(1.0, float(limit)))
+      self._rules[path] = rule
+    return rule
+
+  def reserve(self, path: str, tokens: float = 1) -> float:
+    """
+        :return: seconds to wait before calling path
+        """
+    rate, capacity = self.rule(path)
+    if rate <= 0:
+      return 0.0
+    return self._waiting(self.backend.reserve(path, rate, capacity, tokens))
+
+  async def reserve_async(self, path: str, tokens: float = 1) -> float:
+    """
+        reserve without blocking the event loop on the backend
+        :return: seconds to wait before calling path
+        """
+    rate, capacity = self.rule(path)
+    if rate <= 0:
+      return 0.0
+    reserve_async = getattr(self.backend, "reserve_async", None)
+    if reserve_async is not None:
+      delay = await reserve_async(path, rate, capacity, tokens)
+    elif getattr(self.backend, "blocking", True):
+      delay = await asyncio.get_running_loop().run_in_executor(
+        None, functools.partial(self.backend.reserve, path, rate, capacity, tokens)
+      )
+    else:
+      delay = self.backend.reserve(path, rate, capacity, tokens)
+    return self._waiting(delay)
+
+  def _waiting(self, delay: float) -> float:
+    if delay > 0:
+      with self._lock:
+        self.waited += delay
+    return delay
+
+  def acquire(self, path: str, tokens: float = 1):
+    """
+        block until path may be called
+        """
+    delay = self.reserve(path, tokens)
+    if delay > 0:
+      time.sleep(delay)
+
+  async def acquire_async(self, path: str, tokens: float = 1):
+    """
+        wait without blocking the event loop until path may be called
+        """
+    delay = await self.reserve_async(path, tokens)
+    if delay > 0:
+      await asyncio.sleep(delay)
+
+
+def rate_limited(client, limiter: RateLimiter = None):
+  """
+    :param client: TCIMClient
+    :param limiter: RateLimiter, default the client's own or RateLimiter()
+    :return: client whose calls wait on limiter, client itself if it already has a
+    rate_limiter and no limiter is given
+    """
+  if limiter is None:
+    if client.rate_limiter is not None:
+      return client
+    limiter = RateLimiter()
+  return client.with_executor(RateLimitedExecutor(client.executor, limiter))
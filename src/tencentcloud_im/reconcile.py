@@ -0,0 +1,453 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+
+from .bulk import (
+  FRIEND_BATCH_LIMIT, GROUP_MEMBER_BATCH_LIMIT, GROUP_MEMBER_DELETE_LIMIT, NO_RESPONSE_ERROR_CODE,
+  chunked, is_ok, merge_result_items, parse_response, run_chunks, stream_chunks
+)
+from .paginate import PageError
+from .requeue import UNSPECIFIED_ERROR_CODE
+from .tcim_client import FriendObj, GroupMemObj, SnsItemObj, UpdateFriendObj
+
+# member fields compared with the desired state, when the desired member sets them
+MEMBER_FIELDS = ("Role", "NameCard")
+
+# friend tags compared with the desired state of a FriendObj
+REMARK_TAG = "Tag_SNS_IM_Remark"
+GROUP_TAG = "Tag_SNS_IM_Group"
+
+
+class MembershipPlan(object):
+  """
+    calls needed to bring a group to its desired members
+
+    Attributes
+      group_id: group
+      to_add: accounts to add
+      to_delete: accounts to delete
+      to_update: {account: {"Role", "NameCard"}} of the fields to change, new members
+      included
+      unchanged: members already as desired
+    """
+
+  def __init__(self, group_id: str):
+    self.group_id = group_id
+    self.to_add = []
+    self.to_delete = []
+    self.to_update = OrderedDict()
+    self.unchanged = 0
+
+  @property
+  def empty(self):
+    return not (self.to_add or self.to_delete or self.to_update)
+
+  def as_dict(self) -> dict:
+    """
+        json serializable plan, eg: for dry-run output
+        """
+    return {
+      "group_id": self.group_id,
+      "add": self.to_add,
+      "delete": self.to_delete,
+      "update": self.to_update,
+      "unchanged": self.unchanged,
+    }
+
+  def __repr__(self):
+    return "MembershipPlan({!r}, add={}, delete={}, update={})".format(
+      self.group_id, len(self.to_add), len(self.to_delete), len(self.to_update)
+    )
+
+
+class MembershipResult(object):
+  """
+    Attributes
+      plan: MembershipPlan applied
+      failed: {account: ErrorCode} of the members whose call failed, a refused add without
+      ErrorCode is reported with requeue.UNSPECIFIED_ERROR_CODE
+      pending: accounts added but waiting for approval (Result 3), not failed; their
+      updates are skipped
+    """
+
+  def __init__(self, plan: MembershipPlan, failed: Dict[str, int], pending: List[str] = ()):
+    self.plan = plan
+    self.failed = failed
+    self.pending = list(pending)
+
+  @property
+  def ok(self):
+    return not self.failed
+
+
+def _desired_fields(member) -> dict:
+  if isinstance(member, str):
+    return {"Role": "Member"}
+  fields = {"Role": getattr(member, "Role", "Member") or "Member"}
+  # modify_group_member_info cannot clear a NameCard, so an empty one is left as is
+  if getattr(member, "NameCard", ""):
+    fields["NameCard"] = member.NameCard
+  return fields
+
+
+def _error_code(result):
+  return NO_RESPONSE_ERROR_CODE if result is None else result.get("ErrorCode")
+
+
+class MembershipReconciler(object):
+  """
+    bring group members to a desired state with the fewest calls
+
+    current members are paged lazily with iter_group_members and matched against a dict of
+    the desired members, so memory grows with the desired set only. members missing from
+    the desired set are deleted (never the Owner), missing members are added in chunks and
+    members whose Role or NameCard differ are updated one call each, max_workers calls at
+    a time.
+
+    >>> reconciler = MembershipReconciler(client)
+    >>> plan = reconciler.plan("@TGS#2J4SZEAEL", ["user0", GroupMemObj("user1", "Admin")])
+    >>> print(plan.as_dict())  # dry run
+    >>> result = reconciler.apply(plan)
+
+    Attributes
+      client: TCIMClient
+    """
+
+  def __init__(
+    self,
+    client,
+    max_workers: int = 4,
+    add_chunk_size: int = GROUP_MEMBER_BATCH_LIMIT,
+    delete_chunk_size: int = GROUP_MEMBER_DELETE_LIMIT,
+    silence: int = 1
+  ):
+    """
+        :param client: TCIMClient
+        :param max_workers: max concurrent calls
+        :param add_chunk_size: members per add_group_member call, at most 300
+        :param delete_chunk_size: members per delete_group_mem call, at most 100
+        :param silence: Silence of the add and delete calls
+        """
+    self.client = client
+    self.max_workers = max_workers
+    self.add_chunk_size = min(add_chunk_size, GROUP_MEMBER_BATCH_LIMIT)
+    self.delete_chunk_size = min(delete_chunk_size, GROUP_MEMBER_DELETE_LIMIT)
+    self.silence = silence
+
+  def plan(self, group_id: str, desired: Iterable) -> MembershipPlan:
+    """
+        :param desired: accounts (plain members) or GroupMemObj, with optional NameCard
+        :return: MembershipPlan, nothing is changed
+        """
+    wanted = OrderedDict()
+    for member in desired:
+      account = member if isinstance(member, str) else member.Member_Account
+      wanted[account] = _desired_fields(member)
+
+    plan = MembershipPlan(group_id)
+    for member in self.client.iter_group_members(group_id, memInfoFilter=list(MEMBER_FIELDS)):
+      account = member["Member_Account"]
+      fields = wanted.pop(account, None)
+      if fields is None:
+        if member.get("Role") != "Owner":
+          plan.to_delete.append(account)
+        continue
+      if member.get("Role") == "Owner":
+        plan.unchanged += 1
+        continue
+      changes = {
+        name: value
+        for name, value in fields.items()
+        if member.get(name, "Member" if name == "Role" else "") != value
+      }
+      if changes:
+        plan.to_update[account] = changes
+      else:
+        plan.unchanged += 1
+
+    for account, fields in wanted.items():
+      plan.to_add.append(account)
+      changes = {name: value for name, value in fields.items() if value not in ("Member", "")}
+      if changes:
+        plan.to_update[account] = changes
+    return plan
+
+  def apply(self, plan: MembershipPlan) -> MembershipResult:
+    """
+        deletes first, then adds, then updates
+        :return: MembershipResult
+        """
+    failed = {}
+    pending = []
+    group_id = plan.group_id
+
+    chunks = list(chunked(plan.to_delete, self.delete_chunk_size))
+    responses = run_chunks(
+      lambda accounts: self.client.delete_group_mem(group_id, accounts, self.silence), chunks,
+      self.max_workers
+    )
+    for accounts, response in zip(chunks, responses):
+      result = parse_response(response)
+      if not is_ok(result):
+        failed.update((account, _error_code(result)) for account in accounts)
+
+    if plan.to_add:
+      merged = self.client.add_group_member_bulk(
+        {group_id: [GroupMemObj(account) for account in plan.to_add]}, self.silence,
+        self.add_chunk_size, self.max_workers
+      )[group_id]
+      for item in merged["MemberList"]:
+        if item.get("Result") == 3:
+          pending.append(item["Member_Account"])
+        elif item.get("Result") not in (1, 2):
+          failed[item["Member_Account"]] = item.get("ErrorCode", UNSPECIFIED_ERROR_CODE)
+
+    skipped = set(failed).union(pending)
+    updates = [
+      (account, changes) for account, changes in plan.to_update.items() if account not in skipped
+    ]
+    responses = run_chunks(
+      lambda update: self.client.update_group_mem_info(
+        group_id, update[0], update[1].get("Role", ""), update[1].get("NameCard", "")
+      ), updates, self.max_workers
+    )
+    for (account, _), response in zip(updates, responses):
+      result = parse_response(response)
+      if not is_ok(result):
+        failed[account] = _error_code(result)
+    return MembershipResult(plan, failed, pending)
+
+  def reconcile(self, group_id: str, desired: Iterable, dry_run: bool = False):
+    """
+        :return: MembershipPlan if dry_run, else MembershipResult
+        """
+    plan = self.plan(group_id, desired)
+    return plan if dry_run else self.apply(plan)
+
+
+class FriendPlan(object):
+  """
+    calls needed to bring the friend list of a user to its desired state
+
+    Attributes
+      from_account: user
+      to_add: FriendObj to add, with their Remark and GroupName
+      to_delete: accounts to delete
+      to_update: {account: {tag: value}} of the Remark / Group tags to change
+      unchanged: friends already as desired
+    """
+
+  def __init__(self, from_account: str):
+    self.from_account = from_account
+    self.to_add = []
+    self.to_delete = []
+    self.to_update = OrderedDict()
+    self.unchanged = 0
+
+  @property
+  def empty(self):
+    return not (self.to_add or self.to_delete or self.to_update)
+
+  def as_dict(self) -> dict:
+    """
+        json serializable plan, eg: for dry-run output
+        """
+    return {
+      "from_account": self.from_account,
+      "add": [friend.To_Account for friend in self.to_add],
+      "delete": self.to_delete,
+      "update": self.to_update,
+      "unchanged": self.unchanged,
+    }
+
+  def __repr__(self):
+    return "FriendPlan({!r}, add={}, delete={}, update={})".format(
+      self.from_account, len(self.to_add), len(self.to_delete), len(self.to_update)
+    )
+
+
+class FriendResult(object):
+  """
+    Attributes
+      plan: FriendPlan applied
+      failed: {account: ResultCode} of the friends whose add, delete or update failed
+    """
+
+  def __init__(self, plan: FriendPlan, failed: Dict[str, int]):
+    self.plan = plan
+    self.failed = failed
+
+  @property
+  def ok(self):
+    return not self.failed
+
+
+def _friend_tags(friend: FriendObj) -> dict:
+  return {REMARK_TAG: friend.Remark, GROUP_TAG: [friend.GroupName] if friend.GroupName else []}
+
+
+def _failed_items(chunks: list, responses: list) -> Dict[str, int]:
+  merged = merge_result_items(chunks, responses, account_field="To_Account")
+  return {
+    item["To_Account"]: item.get("ResultCode")
+    for item in merged["ResultItem"]
+    if item.get("ResultCode") != 0
+  }
+
+
+class FriendReconciler(object):
+  """
+    bring friend lists to a desired state with the fewest calls
+
+    the current friends of a user are streamed with iter_friends and matched against a
+    dict of the desired friends. friends given as plain accounts only need to exist, a
+    FriendObj also pins the Remark and the Group tags (its GroupName, or no group). writes
+    are chunked add_friend / delete_friends / update_friend calls.
+
+    many users are reconciled by reconcile_many, max_workers users at a time with the calls
+    of one user made one after the other.
+
+    >>> reconciler = FriendReconciler(client, max_workers=8)
+    >>> for user, outcome in reconciler.reconcile_many({"user0": ["user1", "user2"]}):
+    >>>     print(user, outcome.failed)
+
+    Attributes
+      client: TCIMClient
+    """
+
+  def __init__(
+    self,
+    client,
+    max_workers: int = 4,
+    chunk_size: int = FRIEND_BATCH_LIMIT,
+    add_source: str = "Server",
+    delete_type: str = "Delete_Type_Both"
+  ):
+    """
+        :param client: TCIMClient
+        :param max_workers: max users reconciled at a time
+        :param chunk_size: friends per add / delete / update call, at most 100
+        :param add_source: AddSource of friends given as plain accounts
+        :param delete_type: Delete_Type_Both or Delete_Type_Single, friends are always
+        added both ways by add_friend
+        """
+    self.client = client
+    self.max_workers = max_workers
+    self.chunk_size = min(chunk_size, FRIEND_BATCH_LIMIT)
+    self.add_source = add_source
+    self.delete_type = delete_type
+
+  def plan(self, from_account: str, desired: Iterable) -> FriendPlan:
+    """
+        :param desired: accounts or FriendObj
+        :return: FriendPlan, nothing is changed, raises paginate.PageError if a page fails
+        """
+    wanted = OrderedDict()
+    for friend in desired:
+      if isinstance(friend, str):
+        friend = FriendObj(friend, self.add_source), None
+      else:
+        friend = friend, _friend_tags(friend)
+      wanted[friend[0].To_Account] = friend
+
+    plan = FriendPlan(from_account)
+    for item in self.client.iter_friends(from_account):
+      account = item["To_Account"]
+      friend = wanted.pop(account, None)
+      if friend is None:
+        plan.to_delete.append(account)
+        continue
+      _, tags = friend
+      current = {tag["Tag"]: tag["Value"] for tag in item.get("ValueItem", [])}
+      changes = {}
+      if tags is not None:
+        if current.get(REMARK_TAG, "") != tags[REMARK_TAG]:
+          changes[REMARK_TAG] = tags[REMARK_TAG]
+        if sorted(current.get(GROUP_TAG, [])) != tags[GROUP_TAG]:
+          changes[GROUP_TAG] = tags[GROUP_TAG]
+      if changes:
+        plan.to_update[account] = changes
+      else:
+        plan.unchanged += 1
+
+    plan.to_add = [friend for friend, _ in wanted.values()]
+    return plan
+
+  def apply(self, plan: FriendPlan) -> FriendResult:
+    """
+        deletes first, then adds, then updates
+        :return: FriendResult
+        """
+    failed = {}
+    from_account = plan.from_account
+
+    chunks = list(chunked(plan.to_delete, self.chunk_size))
+    responses = [
+      self.client.delete_friends(from_account, accounts, self.delete_type) for accounts in chunks
+    ]
+    failed.update(_failed_items(chunks, responses))
+
+    chunks = list(chunked(plan.to_add, self.chunk_size))
+    responses = [self.client.add_friend(from_account, friends) for friends in chunks]
+    failed.update(
+      _failed_items([[friend.To_Account for friend in friends] for friends in chunks], responses)
+    )
+
+    chunks = list(chunked(plan.to_update.items(), self.chunk_size))
+    responses = [
+      self.client.update_friend(
+        from_account, [
+          UpdateFriendObj(account, [SnsItemObj(tag, value)
+                                    for tag, value in changes.items()])
+          for account, changes in updates
+        ]
+      )
+      for updates in chunks
+    ]
+    failed.update(
+      _failed_items([[account for account, _ in updates] for updates in chunks], responses)
+    )
+    return FriendResult(plan, failed)
+
+  def reconcile(self, from_account: str, desired: Iterable, dry_run: bool = False):
+    """
+        :return: FriendPlan if dry_run, else FriendResult
+        """
+    plan = self.plan(from_account, desired)
+    return plan if dry_run else self.apply(plan)
+
+  def reconcile_many(self, desired_by_user, dry_run: bool = False, rate: float = 0):
+    """
+        reconcile many users in parallel, users are pulled lazily from desired_by_user
+
+        :param desired_by_user: {from_account: desired} or iterable of (from_account, desired)
+        :param rate: max users started per second, 0 means no limit
+        :return: generator of (from_account, FriendPlan / FriendResult) in completion order,
+        a user whose friend list could not be paged comes with its paginate.PageError
+        """
+    if isinstance(desired_by_user, dict):
+      desired_by_user = desired_by_user.items()
+
+    def run(job):
+      from_account, desired = job
+      try:
+        return self.reconcile(from_account, desired, dry_run)
+      except PageError as e:
+        return e
+
+    for _, job, outcome in stream_chunks(run, desired_by_user, self.max_workers, rate):
+      yield job[0], outcome
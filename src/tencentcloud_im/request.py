@@ -0,0 +1,66 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from collections import namedtuple
+
+
+class TCIMRequest(namedtuple("TCIMRequest", ["path", "url", "query", "body"])):
+  """
+    immutable description of one rest call, built without doing any io
+
+    Attributes
+      path: endpoint path, eg: "openim/sendmsg"
+      url: full rest url
+      query: tuple of (key, value) pairs of the signed query string
+      body: json request body (bytes)
+    """
+  __slots__ = ()
+
+  @classmethod
+  def create(cls, base_url: str, path: str, query: dict, data):
+    """
+        :param base_url: tencent rest url
+        :param path: endpoint path
+        :param query: signed query string
+        :param data: json serializable request body
+        :return: TCIMRequest
+        """
+    return cls(
+      path,
+      "{}/{}".format(base_url, path),
+      tuple(query.items()),
+      json.dumps(data).encode("utf8"),
+    )
+
+  @property
+  def params(self):
+    """
+        query string as a new dict
+        """
+    return dict(self.query)
+
+  @property
+  def family(self):
+    """
+        endpoint family, eg: "group_open_http_svc"
+        """
+    return self.path.split("/", 1)[0]
+
+  def json(self):
+    """
+        decoded request body
+        """
+    return json.loads(self.body)
@@ -0,0 +1,294 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from .bulk import (
+  ACCOUNT_BATCH_LIMIT, BATCH_SEND_LIMIT, FRIEND_BATCH_LIMIT, GROUP_MEMBER_BATCH_LIMIT,
+  NO_RESPONSE_ERROR_CODE, chunked, is_ok, parse_response, run_chunks, run_chunks_async
+)
+from .retry import REJECTED, TRANSIENT, RetryPolicy
+from .tcim_client import BatchMessageObj, FriendObj, GroupMemObj
+
+# the item failed but the response gives no ErrorCode for it (FailAccounts, Result 0)
+UNSPECIFIED_ERROR_CODE = -2
+
+# add_group_member Result 3: the member waits for approval, final, never resubmitted and
+# not a failure
+AWAITING_APPROVAL_CODE = -3
+
+_MEMBER_RESULT_CODES = {1: 0, 2: 0, 3: AWAITING_APPROVAL_CODE}
+
+
+class ItemResult(object):
+  """
+    final outcome of one item of a batch call
+
+    Attributes
+      key: account of the item
+      code: ResultCode / ErrorCode of the last attempt, 0 means success,
+      AWAITING_APPROVAL_CODE that the server accepted it pending approval
+      info: ResultInfo / ErrorInfo of the last attempt
+      attempts: rounds the item was submitted in
+    """
+
+  def __init__(self, key: str, code: int, info: str, attempts: int):
+    self.key = key
+    self.code = code
+    self.info = info
+    self.attempts = attempts
+
+  @property
+  def ok(self):
+    return self.code in (0, AWAITING_APPROVAL_CODE)
+
+  @property
+  def pending(self):
+    return self.code == AWAITING_APPROVAL_CODE
+
+  def __repr__(self):
+    return "ItemResult({!r}, code={}, attempts={})".format(self.key, self.code, self.attempts)
+
+
+class RequeueReport(object):
+  """
+    Attributes
+      outcomes: {key: ItemResult} of every submitted item
+      rounds: rounds run
+    """
+
+  def __init__(self, outcomes: Dict[str, ItemResult], rounds: int):
+    self.outcomes = outcomes
+    self.rounds = rounds
+
+  @property
+  def failed(self) -> List[str]:
+    return [key for key, outcome in self.outcomes.items() if not outcome.ok]
+
+  @property
+  def pending(self) -> List[str]:
+    """
+        members waiting for approval, they count as ok
+        """
+    return [key for key, outcome in self.outcomes.items() if outcome.pending]
+
+  @property
+  def ok(self):
+    return not self.failed
+
+
+def _fail_accounts(result, keys):
+  failed = set(result.get("FailAccounts", []))
+  return {key: (UNSPECIFIED_ERROR_CODE, "") for key in keys if key in failed}
+
+
+def _result_items(account_field):
+
+  def parse(result, keys):
+    return {
+      item[account_field]: (item.get("ResultCode", 0), item.get("ResultInfo", ""))
+      for item in result.get("ResultItem", [])
+    }
+
+  return parse
+
+
+def _member_results(result, keys):
+  codes = _MEMBER_RESULT_CODES
+  return {
+    item["Member_Account"]: (codes.get(item.get("Result"), UNSPECIFIED_ERROR_CODE), "")
+    for item in result.get("MemberList", [])
+  }
+
+
+def _error_list(result, keys):
+  return {
+    item["To_Account"]: (item.get("ErrorCode", UNSPECIFIED_ERROR_CODE), "")
+    for item in result.get("ErrorList", [])
+  }
+
+
+class BatchRequeue(object):
+  """
+    submit a batch call, then resubmit only the items that failed with a retryable code,
+    for up to max_rounds rounds
+
+    >>> report = BatchRequeue(client).batch_add_users(user_ids)
+    >>> report.failed, report.outcomes["user0"].code
+
+    an item reported failed by the server is retried when its code is rejected or
+    transient for the RetryPolicy. when a whole call got no response or a transient error
+    the items may have been applied, so they are only retried on idempotent endpoints.
+    items with no code (FailAccounts, add_group_member Result 0) are retried if
+    retry_unspecified. members waiting for approval (Result 3) are final, ok and listed in
+    RequeueReport.pending with AWAITING_APPROVAL_CODE.
+    with an AsyncTCIMClient every method returns a coroutine.
+
+    Attributes
+      client: TCIMClient or AsyncTCIMClient
+      policy: RetryPolicy used to classify codes and to wait between rounds
+      max_rounds: submissions per item, first one included
+      max_workers: concurrent chunks per round
+      retry_unspecified: retry failed items without a code
+    """
+
+  def __init__(
+    self,
+    client,
+    policy: RetryPolicy = None,
+    max_rounds: int = 3,
+    max_workers: int = 4,
+    retry_unspecified: bool = True
+  ):
+    self.client = client
+    self.policy = policy if policy is not None else RetryPolicy()
+    self.max_rounds = max_rounds
+    self.max_workers = max_workers
+    self.retry_unspecified = retry_unspecified
+
+  def batch_add_users(self, user_ids: List[str], chunk_size: int = ACCOUNT_BATCH_LIMIT):
+    """
+        :return: RequeueReport keyed by user id
+        """
+    items = OrderedDict((user_id, user_id) for user_id in user_ids)
+    return self._run(
+      "im_open_login_svc/multiaccount_import", items, self.client.batch_add_users, _fail_accounts,
+      chunk_size
+    )
+
+  def del_user(self, user_ids: List[str], chunk_size: int = ACCOUNT_BATCH_LIMIT):
+    """
+        :return: RequeueReport keyed by user id
+        """
+    items = OrderedDict((user_id, user_id) for user_id in user_ids)
+    return self._run(
+      "im_open_login_svc/account_delete", items, self.client.del_user, _result_items("UserID"),
+      chunk_size
+    )
+
+  def add_friend(
+    self, from_account: str, friends: List[FriendObj], chunk_size: int = FRIEND_BATCH_LIMIT
+  ):
+    """
+        :return: RequeueReport keyed by friend account
+        """
+    items = OrderedDict((friend.To_Account, friend) for friend in friends)
+    return self._run(
+      "sns/friend_add", items, lambda chunk: self.client.add_friend(from_account, chunk),
+      _result_items("To_Account"), chunk_size
+    )
+
+  def add_group_member(
+    self,
+    group_id: str,
+    mem_list: List[GroupMemObj],
+    silence: int = 1,
+    chunk_size: int = GROUP_MEMBER_BATCH_LIMIT
+  ):
+    """
+        :return: RequeueReport keyed by member account
+        """
+    items = OrderedDict((member.Member_Account, member) for member in mem_list)
+    return self._run(
+      "group_open_http_svc/add_group_member", items,
+      lambda chunk: self.client.add_group_member(group_id, chunk, silence), _member_results,
+      chunk_size
+    )
+
+  def batch_send_message(self, message: BatchMessageObj, chunk_size: int = BATCH_SEND_LIMIT):
+    """
+        :return: RequeueReport keyed by recipient
+        """
+    items = OrderedDict((account, account) for account in message.To_Account)
+    return self._run(
+      "openim/batchsendmsg", items,
+      lambda chunk: self.client.batch_send_message(self.client._batch_message_for(message, chunk)),
+      _error_list, chunk_size
+    )
+
+  def _classify(self, path: str, keys: List[str], response, parse):
+    """
+        :return: {key: (code, info, retry)}
+        """
+    result = parse_response(response)
+    if result is None:
+      retry = path not in self.policy.non_idempotent_paths
+      return {key: (NO_RESPONSE_ERROR_CODE, "no response", retry) for key in keys}
+
+    if not is_ok(result):
+      code = result.get("ErrorCode")
+      kind = self.policy.classify_code(code)
+      # a transient failure of the whole call may still have been applied
+      retry = kind == REJECTED or (
+        kind == TRANSIENT and path not in self.policy.non_idempotent_paths
+      )
+      return {key: (code, result.get("ErrorInfo", ""), retry) for key in keys}
+
+    failed = parse(result, keys)
+    outcomes = {}
+    for key in keys:
+      code, info = failed.get(key, (0, ""))
+      if code in (0, AWAITING_APPROVAL_CODE):
+        retry = False
+      elif code == UNSPECIFIED_ERROR_CODE:
+        retry = self.retry_unspecified
+      else:
+        retry = self.policy.classify_code(code) in (REJECTED, TRANSIENT)
+      outcomes[key] = (code, info, retry)
+    return outcomes
+
+  def _collect(self, path, parse, chunks, responses, outcomes, round_index):
+    pending = []
+    for keys, response in zip(chunks, responses):
+      for key, (code, info, retry) in self._classify(path, keys, response, parse).items():
+        outcomes[key] = ItemResult(key, code, info, round_index)
+        if retry:
+          pending.append(key)
+    return pending
+
+  def _run(self, path, items, submit, parse, chunk_size):
+    if getattr(self.client.executor, "is_async", False):
+      return self._run_async(path, items, submit, parse, chunk_size)
+    outcomes = OrderedDict((key, None) for key in items)
+    pending = list(items)
+    round_index = 0
+    while pending and round_index < self.max_rounds:
+      if round_index > 0:
+        time.sleep(self.policy.delay(round_index))
+      round_index += 1
+      chunks = list(chunked(pending, chunk_size))
+      responses = run_chunks(
+        lambda keys: submit([items[key] for key in keys]), chunks, self.max_workers
+      )
+      pending = self._collect(path, parse, chunks, responses, outcomes, round_index)
+    return RequeueReport(outcomes, round_index)
+
+  async def _run_async(self, path, items, submit, parse, chunk_size):
+    outcomes = OrderedDict((key, None) for key in items)
+    pending = list(items)
+    round_index = 0
+    while pending and round_index < self.max_rounds:
+      if round_index > 0:
+        await asyncio.sleep(self.policy.delay(round_index))
+      round_index += 1
+      chunks = list(chunked(pending, chunk_size))
+      responses = await run_chunks_async(
+        lambda keys: submit([items[key] for key in keys]), chunks, self.max_workers
+      )
+      pending = self._collect(path, parse, chunks, responses, outcomes, round_index)
+    return RequeueReport(outcomes, round_index)
@@ -0,0 +1,275 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from .bulk import parse_response
+from .request import TCIMRequest
+
+logger = logging.getLogger(__name__)
+
+# the server refused the call before doing anything (frequency / concurrency limits):
+# safe to retry any call
+# https://cloud.tencent.com/document/product/269/1671
+REJECTED_ERROR_CODES = frozenset(
+  [
+    20001,  # frequency limit of the api
+    60006,  # concurrency of the SDKAppID over the limit
+    90035,  # frequency limit of the api
+  ]
+)
+
+# internal errors and timeouts: the call may or may not have been applied, only
+# idempotent calls are retried
+TRANSIENT_ERROR_CODES = frozenset(
+  [
+    10002,  # group: internal error, retry
+    20004,  # c2c: network error, retry
+    20005,  # c2c: internal error, retry
+    60008,  # request timeout, retry
+    70169,  # internal timeout, retry
+    70202,  # internal timeout, retry
+    70500,  # internal error, retry
+    90992,  # internal error, retry
+    90994,  # internal error, retry
+    91000,  # internal error, retry
+  ]
+)
+
+RETRYABLE_HTTP_STATUS = frozenset([429, 500, 502, 503, 504])
+
+# endpoints that create something new on every call, retried only when rejected
+NON_IDEMPOTENT_PATHS = frozenset(
+  [
+    "openim/sendmsg",
+    "openim/batchsendmsg",
+    "group_open_http_svc/create_group",
+    "group_open_http_svc/send_group_msg",
+    "group_open_http_svc/send_group_system_notification",
+  ]
+)
+
+REJECTED = "rejected"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+
+class RetryStats(object):
+  """
+    retry metrics of a RetryPolicy
+
+    Attributes
+      calls: calls executed
+      retries: extra attempts made
+      gave_up: calls that still failed when retries or the deadline ran out
+      reasons: Counter of retry reasons, eg: "ErrorCode:70169", "http:502", "ReadTimeout"
+    """
+
+  def __init__(self):
+    self.calls = 0
+    self.retries = 0
+    self.gave_up = 0
+    self.reasons = Counter()
+    self._lock = threading.Lock()
+
+  def record_call(self):
+    with self._lock:
+      self.calls += 1
+
+  def record_retry(self, reason: str):
+    with self._lock:
+      self.retries += 1
+      self.reasons[reason] += 1
+
+  def record_gave_up(self):
+    with self._lock:
+      self.gave_up += 1
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      return {
+        "calls": self.calls,
+        "retries": self.retries,
+        "gave_up": self.gave_up,
+        "reasons": dict(self.reasons)
+      }
+
+
+class RetryPolicy(object):
+  """
+    when and how long to wait before retrying a call
+
+    delays grow exponentially from base_delay up to max_delay with full jitter, and no retry
+    is started past the deadline of the call.
+
+    Attributes
+      max_attempts: attempts per call, first one included
+      base_delay: delay before the first retry(seconds)
+      max_delay: cap of a single delay(seconds)
+      deadline: max seconds from the first attempt to the start of the last one
+      rejected_codes: ErrorCodes retried for every call
+      transient_codes: ErrorCodes retried for idempotent calls only
+      non_idempotent_paths: paths never retried after a transient failure
+      on_retry: optional callback(request, attempt, reason, delay)
+      stats: RetryStats
+    """
+
+  def __init__(
+    self,
+    max_attempts: int = 4,
+    base_delay: float = 0.2,
+    max_delay: float = 5.0,
+    deadline: float = 30.0,
+    rejected_codes=REJECTED_ERROR_CODES,
+    transient_codes=TRANSIENT_ERROR_CODES,
+    non_idempotent_paths=NON_IDEMPOTENT_PATHS,
+    on_retry=None
+  ):
+    self.max_attempts = max_attempts
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.deadline = deadline
+    self.rejected_codes = frozenset(rejected_codes)
+    self.transient_codes = frozenset(transient_codes)
+    self.non_idempotent_paths = frozenset(non_idempotent_paths)
+    self.on_retry = on_retry
+    self.stats = RetryStats()
+
+  def classify_code(self, error_code) -> str:
+    """
+        :return: REJECTED, TRANSIENT or FATAL
+        """
+    if error_code in self.rejected_codes:
+      return REJECTED
+    if error_code in self.transient_codes:
+      return TRANSIENT
+    return FATAL
+
+  def classify(self, response=None, error: Exception = None):
+    """
+        :param response: response of the attempt
+        :param error: exception raised by the attempt
+        :return: (REJECTED/TRANSIENT/FATAL, reason), (None, None) on success
+        """
+    if error is not None:
+      name = type(error).__name__
+      if getattr(error, "retryable", True) is False:
+        return FATAL, name
+      # nothing was sent if the connection could not even be opened
+      return (REJECTED if "ConnectTimeout" in name else TRANSIENT), name
+    status = getattr(response, "status_code", 200)
+    if status in RETRYABLE_HTTP_STATUS:
+      return (REJECTED if status == 429 else TRANSIENT), "http:{}".format(status)
+    result = parse_response(response)
+    if result is None or result.get("ActionStatus") == "OK":
+      return None, None
+    error_code = result.get("ErrorCode")
+    return self.classify_code(error_code), "ErrorCode:{}".format(error_code)
+
+  def should_retry(self, request: TCIMRequest, kind: str) -> bool:
+    if kind == REJECTED:
+      return True
+    return kind == TRANSIENT and request.path not in self.non_idempotent_paths
+
+  def delay(self, attempt: int) -> float:
+    """
+        :param attempt: number of attempts made so far
+        :return: full jitter delay before the next attempt
+        """
+    return random.uniform(0, min(self.max_delay, self.base_delay * (2**(attempt - 1))))
+
+  def next_delay(self, request: TCIMRequest, attempt: int, started_at: float, response, error):
+    """
+        :return: seconds to wait before retrying, None to stop
+        """
+    kind, reason = self.classify(response, error)
+    if kind is None:
+      return None
+    if attempt >= self.max_attempts or not self.should_retry(request, kind):
+      if kind != FATAL:
+        self.stats.record_gave_up()
+      return None
+    delay = self.delay(attempt)
+    if time.monotonic() + delay - started_at > self.deadline:
+      self.stats.record_gave_up()
+      return None
+    self.stats.record_retry(reason)
+    logger.warning(
+      "retry {} attempt {} in {:.3f}s: {}".format(request.path, attempt + 1, delay, reason)
+    )
+    if self.on_retry is not None:
+      self.on_retry(request, attempt, reason, delay)
+    return delay
+
+
+class RetryingExecutor(object):
+  """
+    retry the inner executor following a RetryPolicy
+
+    when the policy gives up, the last response is returned or the last exception raised
+    """
+
+  def __init__(self, executor, policy: RetryPolicy = None):
+    self.executor = executor
+    self.policy = policy if policy is not None else RetryPolicy()
+    self.is_async = executor.is_async
+
+  def execute(self, request: TCIMRequest):
+    if self.is_async:
+      return self._execute_async(request)
+    self.policy.stats.record_call()
+    started_at = time.monotonic()
+    attempt = 0
+    while True:
+      attempt += 1
+      response, error = None, None
+      try:
+        response = self.executor.execute(request)
+      except Exception as e:
+        error = e
+      delay = self.policy.next_delay(request, attempt, started_at, response, error)
+      if delay is None:
+        if error is not None:
+          raise error
+        return response
+      time.sleep(delay)
+
+  async def _execute_async(self, request: TCIMRequest):
+    self.policy.stats.record_call()
+    started_at = time.monotonic()
+    attempt = 0
+    while True:
+      attempt += 1
+      response, error = None, None
+      try:
+        response = await self.executor.execute(request)
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        error = e
+      delay = self.policy.next_delay(request, attempt, started_at, response, error)
+      if delay is None:
+        if error is not None:
+          raise error
+        return response
+      await asyncio.sleep(delay)
+
+  def close(self):
+    return self.executor.close()
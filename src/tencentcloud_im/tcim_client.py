@@ -13,15 +13,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
+import copy
+import functools
 import logging
 import random
-from datetime import datetime
-from typing import List
+from typing import Dict, Iterable, List
 
-import requests
 from TLSSigAPIv2 import TLSSigAPIv2
 
+from .breaker import GuardedExecutor
+from .bulk import (
+  ACCOUNT_BATCH_LIMIT, BATCH_SEND_LIMIT, GROUP_MEMBER_BATCH_LIMIT, ProgressCounter,
+  batch_send_report, chunked, group_member_jobs, merge_fail_accounts, merge_member_results,
+  merge_result_items, run_chunks, stream_chunks
+)
+from .cache import CachingExecutor
+from .executor import RateLimitedExecutor, SyncExecutor
+from .paginate import (app_groups_page, friends_page, group_members_page, offset_page, paginate)
+from .retry import RetryingExecutor
+from .request import TCIMRequest
+from .transport import PooledTransport
+from .usersig import AdminSigManager, UserSigGenerator
+
 TCIM_API_BASE = "https://console.tim.qq.com/v4"
 
 
@@ -290,6 +303,22 @@ class GroupObj(object):
       self.GroupId = group_id
 
 
+def _logs_errors(func):
+  """
+    a method whose payload cannot be built (eg: a dict passed instead of a FriendObj) logs
+    the error and returns None, like a failed call
+    """
+
+  @functools.wraps(func)
+  def wrapper(self, *args, **kwargs):
+    try:
+      return func(self, *args, **kwargs)
+    except Exception as e:
+      return self._reject("{} failed:{}".format(func.__name__, e))
+
+  return wrapper
+
+
 class TCIMClient(object):
   """
     Tecent Im Rest API Client
@@ -300,25 +329,99 @@ class TCIMClient(object):
       admin: im sdk admin user id
       tencent_url: tencent im rest url
       expire_time: user sig expire time(seconds)
+      sig_manager: cached admin user sig, refreshed ahead of expiry
+      sig_generator: bulk end-user sig generation with LRU cache
+      transport: pooled keep-alive http transport shared by all calls
+      executor: runs the TCIMRequest built by every method, SyncExecutor(transport) by default
+      rate_limiter: optional per-endpoint ratelimit.RateLimiter
+      retry_policy: optional retry.RetryPolicy, its stats hold the retry metrics
+      endpoint_guard: optional breaker.EndpointGuard, snapshot() exposes its state
+      cache: optional cache.ResponseCache of read-only endpoints, its stats hold hits/misses
 
 
     """
 
-  def __init__(self, sdk_id, key, admin, tencent_url=TCIM_API_BASE, expire_time=60 * 5):
+  def __init__(
+    self,
+    sdk_id,
+    key,
+    admin,
+    tencent_url=TCIM_API_BASE,
+    expire_time=60 * 5,
+    transport: PooledTransport = None,
+    executor=None,
+    rate_limiter=None,
+    retry_policy=None,
+    endpoint_guard=None,
+    cache=None
+  ):
     """
         :param sdk_id: IM SDK ID
         :param key:    IM SDK SECRET KEY
         :param admin:  ADMIN
         :param tencent_url: tencent rest url
         :param expire_time:   expire time
+        :param transport: http transport, eg: PooledTransport(pool_maxsize=50, session=my_session);
+        a default PooledTransport is created when omitted
+        :param executor: SyncExecutor, FanoutExecutor, RecordingExecutor ...
+        :param rate_limiter: ratelimit.RateLimiter applied to every call of the executor
+        :param retry_policy: retry.RetryPolicy, retried attempts also wait on the rate_limiter
+        :param endpoint_guard: breaker.EndpointGuard, circuit breaker and adaptive concurrency
+        per endpoint family
+        :param cache: cache.ResponseCache, hits skip the rate_limiter and the retries
         """
     self.sdk_id = sdk_id
     self.key = key
     self.admin = admin
     self.tecent_url = tencent_url
     self.expire_time = expire_time
-    self.next_time = datetime.now()
-    self.user_sig = None
+    signer = TLSSigAPIv2(sdk_id, key)
+    self.sig_manager = AdminSigManager(sdk_id, key, admin, expire_time=expire_time, signer=signer)
+    self.sig_generator = UserSigGenerator(sdk_id, key, signer=signer)
+    self.transport = transport if transport is not None else PooledTransport()
+    self.rate_limiter = rate_limiter
+    self.executor = executor if executor is not None else SyncExecutor(self.transport)
+    self.endpoint_guard = endpoint_guard
+    if endpoint_guard is not None:
+      self.executor = GuardedExecutor(self.executor, endpoint_guard)
+    if rate_limiter is not None:
+      self.executor = RateLimitedExecutor(self.executor, rate_limiter)
+    self.retry_policy = retry_policy
+    if retry_policy is not None:
+      self.executor = RetryingExecutor(self.executor, retry_policy)
+    self.cache = cache
+    if cache is not None:
+      self.executor = CachingExecutor(self.executor, cache)
+
+  def with_executor(self, executor):
+    """
+        shallow copy of this client sharing credentials and transport, calls go to executor
+        :param executor: eg: RecordingExecutor() to build requests without sending them
+        :return: client
+        """
+    client = copy.copy(self)
+    client.executor = executor
+    return client
+
+  def close(self):
+    """
+        close pooled connections of the transport
+        """
+    self.transport.close()
+    self.sig_generator.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  @property
+  def user_sig(self):
+    """
+        cached admin user sig, see sig_manager
+        """
+    return self.sig_manager.get()
 
   def get_user_sig(self, user_id: str, expire_time: int = 180 * 86400):
     """
@@ -328,29 +431,60 @@ class TCIMClient(object):
         :return: user_sig
         """
 
-    api = TLSSigAPIv2(self.sdk_id, self.key)
-    sig = api.gen_sig(user_id, expire_time)
-    return sig
+    return self.sig_generator.signer.gen_sig(user_id, expire_time)
+
+  def gen_user_sigs(self, user_ids: List[str], expire_time: int = 180 * 86400):
+    """
+        generate user sigs in bulk, cached sigs are reused, see sig_generator
+        :param user_ids: list of user_ids eg: ["user0","user1"]
+        :param expire_time: expire time
+        :return: {user_id: user_sig}
+        """
+    return self.sig_generator.gen_many(user_ids, expire_time)
 
   def _gen_query(self):
     """
     generate rest url
     """
-    current_time = datetime.now()
-
-    # 计算时间：如果大于登陆5分钟，则重新生成user_sig
-    if self.user_sig == None or (current_time - self.next_time).seconds >= self.expire_time:
-      self.user_sig = self.get_user_sig(self.admin, self.expire_time)
-      self.next_time = current_time
-
     querys = {}
     querys["sdkappid"] = self.sdk_id
     querys["identifier"] = self.admin
-    querys["usersig"] = self.user_sig
+    querys["usersig"] = self.sig_manager.get()
     querys["random"] = random.randint(0, 4294967295)
     querys["contenttype"] = "json"
     return querys
 
+  def build_request(self, path: str, data) -> TCIMRequest:
+    """
+    sign a rest call without sending it
+    :param path: endpoint path, eg: "openim/sendmsg"
+    :param data: json serializable request body
+    :return: TCIMRequest
+    """
+    return TCIMRequest.create(self.tecent_url, path, self._gen_query(), data)
+
+  def _call(self, path: str, data, error_message: str):
+    """
+    build one rest call and hand it to the executor
+    :param path: endpoint path
+    :param data: json serializable request body
+    :param error_message: logged with the exception if the call fails
+    :return: whatever the executor returns (response by default), None if failed
+    """
+    try:
+      return self.executor.execute(self.build_request(path, data))
+    except Exception as e:
+      logger.error("{}:{}".format(error_message, e))
+      return None
+
+  def _reject(self, error_message: str):
+    """
+    refuse a call without sending it
+    """
+    logger.error(error_message)
+    return None
+
+  @_logs_errors
   def add_single_user(self, user_id: str, nick_name: str, face_url: str):
     """
         add user to im server
@@ -366,19 +500,15 @@ class TCIMClient(object):
             "ErrorCode":0
         }
         """
-    rest_url = "{}/im_open_login_svc/account_import".format(self.tecent_url)
+    path = "im_open_login_svc/account_import"
 
     data = {}
-    try:
-      data["UserID"] = user_id
-      data["Nick"] = nick_name
-      data["FaceUrl"] = face_url
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("add user failed:{}".format(e))
-      return None
+    data["UserID"] = user_id
+    data["Nick"] = nick_name
+    data["FaceUrl"] = face_url
+    return self._call(path, data, "add user failed")
 
+  @_logs_errors
   def batch_add_users(self, user_ids: List[str]):
     """
         batch add users to im server
@@ -396,16 +526,12 @@ class TCIMClient(object):
             ]
         }
         """
-    try:
-      rest_url = "{}/im_open_login_svc/multiaccount_import".format(self.tecent_url)
-      data = {}
-      data["Accounts"] = user_ids
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("batch add user failed:{}".format(e))
-      return None
+    path = "im_open_login_svc/multiaccount_import"
+    data = {}
+    data["Accounts"] = user_ids
+    return self._call(path, data, "batch add user failed")
 
+  @_logs_errors
   def del_user(self, user_ids: List[str]):
     """
           delete user in im server
@@ -431,23 +557,18 @@ class TCIMClient(object):
               ]
           }
         """
-    rest_url = "{}/im_open_login_svc/account_delete".format(self.tecent_url)
+    path = "im_open_login_svc/account_delete"
     data = {}
     DeleteItem = []
-    try:
-      for user_id in user_ids:
-        tmp_map = {}
-        tmp_map["UserID"] = user_id
-        DeleteItem.append(tmp_map)
-
-      data["DeleteItem"] = DeleteItem
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
+    for user_id in user_ids:
+      tmp_map = {}
+      tmp_map["UserID"] = user_id
+      DeleteItem.append(tmp_map)
 
-      logger.error("delete user failed:{}".format(e))
-      return None
+    data["DeleteItem"] = DeleteItem
+    return self._call(path, data, "delete user failed")
 
+  @_logs_errors
   def search_user(self, user_ids: List[str]):
     """
           search user
@@ -475,23 +596,109 @@ class TCIMClient(object):
               ]
           }
         """
-    rest_url = "{}/im_open_login_svc/account_check".format(self.tecent_url)
+    path = "im_open_login_svc/account_check"
     data = {}
     CheckItem = []
-    try:
-      for user_id in user_ids:
-        tmp_map = {}
-        tmp_map["UserID"] = user_id
-        CheckItem.append(tmp_map)
+    for user_id in user_ids:
+      tmp_map = {}
+      tmp_map["UserID"] = user_id
+      CheckItem.append(tmp_map)
 
-      data["CheckItem"] = CheckItem
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
+    data["CheckItem"] = CheckItem
+    return self._call(path, data, "search user failed")
 
-    except Exception as e:
-      logger.error("search user failed:{}".format(e))
-      return None
+  def batch_add_users_bulk(
+    self, user_ids: List[str], chunk_size: int = ACCOUNT_BATCH_LIMIT, max_workers: int = 4
+  ):
+    """
+        batch add any number of users, sent as concurrent chunks of chunk_size
+        https://cloud.tencent.com/document/product/269/4919
+        :param user_ids: list of user_ids eg: ["user0","user1"]
+        :param chunk_size: accounts per call, the server accepts at most 100
+        :param max_workers: max concurrent calls
+        :return: merged response.content, accounts of failed chunks are in FailAccounts
+        {
+            "ActionStatus": "OK",
+            "ErrorCode": 0,
+            "ErrorInfo": "",
+            "FailAccounts": [
+                "test3",
+                "test4"
+            ]
+        }
+        """
+    return self._run_bulk(
+      self.batch_add_users, list(chunked(user_ids, chunk_size)), merge_fail_accounts, max_workers
+    )
+
+  def del_user_bulk(
+    self, user_ids: List[str], chunk_size: int = ACCOUNT_BATCH_LIMIT, max_workers: int = 4
+  ):
+    """
+        delete any number of users, sent as concurrent chunks of chunk_size
+        https://cloud.tencent.com/document/product/269/36443
+        :param user_ids: list of user_ids eg: ["user0","user1"]
+        :param chunk_size: accounts per call, the server accepts at most 100
+        :param max_workers: max concurrent calls
+        :return: merged response.content, accounts of failed chunks get the chunk's ErrorCode
+        {
+            "ActionStatus": "OK",
+            "ErrorCode": 0,
+            "ErrorInfo": "",
+            "ResultItem": [
+                {
+                    "ResultCode": 0,
+                    "ResultInfo": "",
+                    "UserID": "UserID_1"
+                }
+            ]
+        }
+        """
+    return self._run_bulk(
+      self.del_user, list(chunked(user_ids, chunk_size)), merge_result_items, max_workers
+    )
+
+  def search_user_bulk(
+    self, user_ids: List[str], chunk_size: int = ACCOUNT_BATCH_LIMIT, max_workers: int = 4
+  ):
+    """
+        search any number of users, sent as concurrent chunks of chunk_size
+        https://cloud.tencent.com/document/product/269/38417
+        :param user_ids: list of user_ids eg: ["user0","user1"]
+        :param chunk_size: accounts per call, the server accepts at most 100
+        :param max_workers: max concurrent calls
+        :return: merged response.content, accounts of failed chunks get the chunk's ErrorCode
+        {
+            "ActionStatus": "OK",
+            "ErrorCode": 0,
+            "ErrorInfo": "",
+            "ResultItem": [
+                {
+                    "UserID": "UserID_1",
+                    "ResultCode": 0,
+                    "ResultInfo": "",
+                    "AccountStatus": "Imported"
+                }
+            ]
+        }
+        """
+    return self._run_bulk(
+      self.search_user, list(chunked(user_ids, chunk_size)), merge_result_items, max_workers
+    )
+
+  def _run_bulk(self, func, chunks: List[list], merge, max_workers: int):
+    """
+    call func for every chunk concurrently and merge the responses
+    """
+    return merge(chunks, run_chunks(func, chunks, max_workers))
 
+  def _paginate(self, fetch, cursor, advance, prefetch: bool):
+    """
+    yield the items of every page, see paginate.paginate
+    """
+    return paginate(fetch, cursor, advance, prefetch)
+
+  @_logs_errors
   def abolition_user_sig(self, user_id):
     """
         login status of invalid account
@@ -506,16 +713,12 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/im_open_login_svc/kick".format(self.tecent_url)
+    path = "im_open_login_svc/kick"
     data = {}
     data["UserID"] = user_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("abolish user sig failed:{} ".format(e))
-      return None
+    return self._call(path, data, "abolish user sig failed")
 
+  @_logs_errors
   def check_user_online(self, user_ids: List[str]):
     """
         check user status
@@ -556,17 +759,13 @@ class TCIMClient(object):
             }
 
         """
-    rest_url = "{}/openim/query_online_status".format(self.tecent_url)
+    path = "openim/query_online_status"
     data = {}
-    try:
-      data["IsNeedDetail"] = 1
-      data["To_Account"] = user_ids
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("check user status failed:{}".format(e))
-      return None
+    data["IsNeedDetail"] = 1
+    data["To_Account"] = user_ids
+    return self._call(path, data, "check user status failed")
 
+  @_logs_errors
   def add_friend(self, from_account: str, friends: List[FriendObj]):
     """
         add friend
@@ -602,22 +801,18 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/sns/friend_add".format(self.tecent_url)
+    path = "sns/friend_add"
     data = {}
     data["From_Account"] = from_account
     AddFriendItem = []
-    try:
-      for friend in friends:
-        AddFriendItem.append(friend.__dict__)
-      data["AddFriendItem"] = AddFriendItem
-      data["AddType"] = "Add_Type_Both"
-      data["ForceAddFlags"] = 1
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("add friend failed:{}".format(e))
-      return None
-
+    for friend in friends:
+      AddFriendItem.append(friend.__dict__)
+    data["AddFriendItem"] = AddFriendItem
+    data["AddType"] = "Add_Type_Both"
+    data["ForceAddFlags"] = 1
+    return self._call(path, data, "add friend failed")
+
+  @_logs_errors
   def delete_friends(
     self, from_account: str, to_accounts: List[str], delete_type="Delete_Type_Both"
   ):
@@ -655,18 +850,14 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/sns/friend_delete".format(self.tecent_url)
+    path = "sns/friend_delete"
     data = {}
-    try:
-      data["From_Account"] = from_account
-      data["To_Account"] = to_accounts
-      data["DeleteType"] = delete_type
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("delete user failed:{}".format(e))
-      return None
+    data["From_Account"] = from_account
+    data["To_Account"] = to_accounts
+    data["DeleteType"] = delete_type
+    return self._call(path, data, "delete user failed")
 
+  @_logs_errors
   def update_friend(self, from_account: str, update_objs: List[UpdateFriendObj]):
     """
         update friend  relational link data
@@ -702,20 +893,16 @@ class TCIMClient(object):
         }
         """
 
-    rest_url = "{}/sns/friend_update".format(self.tecent_url)
+    path = "sns/friend_update"
     data = {}
-    try:
-      updateItems = []
-      for update_obj in update_objs:
-        updateItems.append(update_obj.__dict__)
-      data["From_Account"] = from_account
-      data["UpdateItem"] = updateItems
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update freind failed:{}".format(e))
-      return None
+    updateItems = []
+    for update_obj in update_objs:
+      updateItems.append(update_obj.__dict__)
+    data["From_Account"] = from_account
+    data["UpdateItem"] = updateItems
+    return self._call(path, data, "update freind failed")
 
+  @_logs_errors
   def get_target_friends(self, from_account: str, to_accounts: List[str], tags: List[str]):
     """
         get target friends
@@ -761,18 +948,14 @@ class TCIMClient(object):
             "ErrorDisplay": ""
         }
         """
-    rest_url = "{}/sns/friend_get_list".format(self.tecent_url)
+    path = "sns/friend_get_list"
     data = {}
-    try:
-      data["From_Account"] = from_account
-      data["To_Account"] = to_accounts
-      data["TagList"] = tags
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get target friends failed:{}".format(e))
-      return None
+    data["From_Account"] = from_account
+    data["To_Account"] = to_accounts
+    data["TagList"] = tags
+    return self._call(path, data, "get target friends failed")
 
+  @_logs_errors
   def get_friends(self, from_account: str, start_index: int = 0):
     """
         get friends
@@ -838,17 +1021,27 @@ class TCIMClient(object):
         }
         """
 
-    rest_url = "{}/sns/friend_get".format(self.tecent_url)
+    path = "sns/friend_get"
     data = {}
-    try:
-      data["From_Account"] = from_account
-      data["StartIndex"] = start_index
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get user failed:{}".format(e))
-      return None
+    data["From_Account"] = from_account
+    data["StartIndex"] = start_index
+    return self._call(path, data, "get user failed")
+
+  def iter_friends(self, from_account: str, prefetch: bool = False):
+    """
+        lazily walk every friend of from_account, page by page with StartIndex
+
+        >>> for friend in client.iter_friends("user0"):
+        >>>     print(friend["To_Account"])
 
+        :param prefetch: fetch the next page while the current one is consumed
+        :return: generator of UserDataItem items, raises paginate.PageError if a page fails
+        """
+    return self._paginate(
+      lambda start_index: self.get_friends(from_account, start_index), 0, friends_page, prefetch
+    )
+
+  @_logs_errors
   def add_sns_group(self, from_account: str, groups: List[str], to_accounts: List[str]):
     """
         add group
@@ -888,18 +1081,14 @@ class TCIMClient(object):
 
         """
 
-    rest_url = "{}/sns/group_add".format(self.tecent_url)
+    path = "sns/group_add"
     data = {}
-    try:
-      data["From_Account"] = from_account
-      data["GroupName"] = groups
-      data["To_Account"] = to_accounts
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("add group failed:{}".format(e))
-      return None
+    data["From_Account"] = from_account
+    data["GroupName"] = groups
+    data["To_Account"] = to_accounts
+    return self._call(path, data, "add group failed")
 
+  @_logs_errors
   def delete_sns_group(self, from_account: str, groups: List[str]):
     """
         delete group
@@ -916,18 +1105,13 @@ class TCIMClient(object):
             "ErrorDisplay":""
         }
         """
-    try:
-      rest_url = "{}/sns/group_delete".format(self.tecent_url)
-      data = {}
-      data["From_Account"] = from_account
-      data["GroupName"] = groups
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-
-    except Exception as e:
-      logger.error("delete group failed:{}".format(e))
-      return None
+    path = "sns/group_delete"
+    data = {}
+    data["From_Account"] = from_account
+    data["GroupName"] = groups
+    return self._call(path, data, "delete group failed")
 
+  @_logs_errors
   def get_sns_group(
     self,
     from_account: str,
@@ -958,19 +1142,15 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/sns/group_get".format(self.tecent_url)
+    path = "sns/group_get"
     data = {}
-    try:
-      data["From_Account"] = from_account
-      if len(groups) > 0:
-        data["GroupName"] = groups
-      data["NeedFriend"] = need_friend_flag
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get group failed:{}".format(e))
-      return None
+    data["From_Account"] = from_account
+    if len(groups) > 0:
+      data["GroupName"] = groups
+    data["NeedFriend"] = need_friend_flag
+    return self._call(path, data, "get group failed")
 
+  @_logs_errors
   def send_message(self, messgeObj: MessageObj):
     """
         send message
@@ -985,14 +1165,10 @@ class TCIMClient(object):
           "MsgKey": "89541_2574206_1572870301"
         }
         """
-    rest_url = "{}/openim/sendmsg".format(self.tecent_url)
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(messgeObj.__dict__))
-    except Exception as e:
-      logger.error("send message faield:{}".format(e))
-      return None
+    path = "openim/sendmsg"
+    return self._call(path, messgeObj.__dict__, "send message faield")
 
+  @_logs_errors
   def batch_send_message(self, batchMessageObj: BatchMessageObj):
     """
       batch send message
@@ -1007,14 +1183,51 @@ class TCIMClient(object):
           "MsgKey": "89541_2574206_1572870301"
         }
       """
-    rest_url = "{}/openim/batchsendmsg".format(self.tecent_url)
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(batchMessageObj.__dict__))
-    except Exception as e:
-      logger.error("batch send message faield:{}".format(e))
-      return None
+    path = "openim/batchsendmsg"
+    return self._call(path, batchMessageObj.__dict__, "batch send message faield")
 
+  def broadcast_message(
+    self,
+    message: BatchMessageObj,
+    recipients: Iterable[str],
+    batch_size: int = BATCH_SEND_LIMIT,
+    max_workers: int = 4,
+    rate: float = 0
+  ):
+    """
+      send one message to any number of recipients through batch_send_message
+
+      recipients are read lazily (a generator works) and sent in batches of batch_size,
+      at most max_workers batches in flight and at most rate batches per second.
+      message.To_Account is ignored.
+
+      >>> for report in client.broadcast_message(message, recipients, rate=100):
+      >>>     print(report.done, report.failed_total, report.failed)
+
+      :param message: BatchMessageObj providing From_Account, MsgBody and SyncOtherMachine
+      :param recipients: iterable of user ids
+      :param batch_size: recipients per call, the server accepts at most 500
+      :param max_workers: max concurrent calls
+      :param rate: max calls per second, 0 means no limit
+      :return: generator of bulk.BatchReport in completion order, failed maps each failed
+      recipient to its ErrorCode
+      """
+    progress = ProgressCounter()
+    for index, accounts, response in stream_chunks(
+      lambda accounts: self.batch_send_message(self._batch_message_for(message, accounts)),
+      chunked(recipients, batch_size),
+      max_workers=max_workers,
+      rate=rate
+    ):
+      yield progress.update(batch_send_report(index, accounts, response))
+
+  def _batch_message_for(self, message: BatchMessageObj, accounts: List[str]):
+    batch = copy.copy(message)
+    batch.To_Account = accounts
+    batch.MsgRandom = random.randint(0, 4294967295)
+    return batch
+
+  @_logs_errors
   def import_message_to_im(self, messgeObj: MessageObj, timestamp: int, sync_from_old: int = 1):
     """
         import history message to im server
@@ -1028,18 +1241,14 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/openim/importmsg".format(self.tecent_url)
+    path = "openim/importmsg"
     data = messgeObj.__dict__
     data["MsgTimeStamp"] = timestamp
     data["SyncFromOldSystem"] = sync_from_old
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("import message failed:{}".format(e))
-      return None
+    return self._call(path, data, "import message failed")
 
+  @_logs_errors
   def get_message_list(
     self,
     from_account: str,
@@ -1090,7 +1299,7 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/openim/admin_getroammsg".format(self.tecent_url)
+    path = "openim/admin_getroammsg"
     data = {}
     data["From_Account"] = from_account
     data["To_Account"] = to_account
@@ -1099,13 +1308,9 @@ class TCIMClient(object):
     data["MaxTime"] = to_timestamp
     if last_message_key != "":
       data["LastMsgKey"] = last_message_key
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get message failed:{}".format(e))
-      return None
+    return self._call(path, data, "get message failed")
 
+  @_logs_errors
   def draw_message(self, from_account: str, to_account: str, msg_key: str):
     """
         draw message
@@ -1122,18 +1327,14 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/openim/admin_msgwithdraw".format(self.tecent_url)
+    path = "openim/admin_msgwithdraw"
     data = {}
     data["From_Account"] = from_account
     data["To_Account"] = to_account
     data["MsgKey"] = msg_key
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("draw message failed:{}".format(e))
-      return None
+    return self._call(path, data, "draw message failed")
 
+  @_logs_errors
   def set_user_message_read(self, from_account: str, to_account: str, read_timestamp: int = 0):
     """
         set user message read
@@ -1149,19 +1350,15 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/openim/admin_set_msg_read".format(self.tecent_url)
+    path = "openim/admin_set_msg_read"
     data = {}
     data["Report_Account"] = from_account
     data["Peer_Account"] = to_account
     if read_timestamp != 0:
       data["MsgReadTime"] = read_timestamp
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("set  message read failed:{}".format(e))
-      return None
+    return self._call(path, data, "set  message read failed")
 
+  @_logs_errors
   def get_unread_num(self, from_account: str, to_accounts: List[str] = []):
     """
         get unread message num
@@ -1186,18 +1383,14 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/openim/get_c2c_unread_msg_num".format(self.tecent_url)
+    path = "openim/get_c2c_unread_msg_num"
     data = {}
     data["To_Account"] = from_account
     if len(to_accounts) > 0:
       data["Peer_Account"] = to_accounts
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("set  message read failed:{}".format(e))
-      return None
+    return self._call(path, data, "set  message read failed")
 
+  @_logs_errors
   def get_group(self, limit_nm: int = 1000, next_num: int = 0, group_type: str = ""):
     """
         get group
@@ -1224,19 +1417,28 @@ class TCIMClient(object):
             "Next": 4454685361
         }
         """
-    rest_url = "{}/group_open_http_svc/get_appid_group_list".format(self.tecent_url)
+    path = "group_open_http_svc/get_appid_group_list"
 
     data = {}
     data["Limit"] = limit_nm
     data["Next"] = next_num
     data["GroupType"] = group_type
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("set  message read failed:{}".format(e))
-      return None
+    return self._call(path, data, "set  message read failed")
+
+  def iter_app_groups(self, group_type: str = "", page_size: int = 1000, prefetch: bool = False):
+    """
+        lazily walk every group of the app, page by page with Next
+
+        :param group_type: see get_group
+        :param page_size: groups per get_group call
+        :param prefetch: fetch the next page while the current one is consumed
+        :return: generator of GroupIdList items, raises paginate.PageError if a page fails
+        """
+    return self._paginate(
+      lambda next_num: self.get_group(page_size, next_num, group_type), 0, app_groups_page, prefetch
+    )
 
+  @_logs_errors
   def create_group(self, groupObj: GroupObj):
     """
         create group
@@ -1250,19 +1452,14 @@ class TCIMClient(object):
             "GroupId": "@TGS#2J4SZEAEL"
         }
         """
-    rest_url = "{}/group_open_http_svc/create_group".format(self.tecent_url)
+    path = "group_open_http_svc/create_group"
     data = groupObj.__dict__
     group_type = data.get("Type")
     if group_type not in ["Public", "Private", "ChatRoom", "AVChatRoom", "Community"]:
-      logger.error("group type only choice Public,Private,ChatRoom,AVChatRoom,Community")
-      return None
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("group create failed:{}".format(e))
-      return None
+      return self._reject("group type only choice Public,Private,ChatRoom,AVChatRoom,Community")
+    return self._call(path, data, "group create failed")
 
+  @_logs_errors
   def get_group_detail(
     self,
     group_id_list: List[str],
@@ -1354,7 +1551,7 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/get_group_info".format(self.tecent_url)
+    path = "group_open_http_svc/get_group_info"
 
     data = {}
     data["GroupIdList"] = group_id_list
@@ -1374,13 +1571,9 @@ class TCIMClient(object):
     if len(responseFilter) > 0:
       data["ResponseFilter"] = responseFilter
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "get group info failed")
 
+  @_logs_errors
   def get_group_mem_info_detail(
     self,
     group_id: str,
@@ -1446,7 +1639,7 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/get_group_member_info".format(self.tecent_url)
+    path = "group_open_http_svc/get_group_member_info"
 
     data = {}
     data["GroupId"] = group_id
@@ -1464,13 +1657,32 @@ class TCIMClient(object):
     if next != "":
       data["Next"] = next
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get group member info failed:{}".format(e))
-      return None
+    return self._call(path, data, "get group member info failed")
+
+  def iter_group_members(
+    self,
+    group_id: str,
+    memInfoFilter: List[str] = [],
+    memRoleFilter: List[str] = [],
+    appDefineDataFilterMem: List[str] = [],
+    page_size: int = 100,
+    prefetch: bool = False
+  ):
+    """
+        lazily walk every member of group_id, with Next for communities and Offset otherwise
 
+        :param page_size: members per get_group_mem_info_detail call
+        :param prefetch: fetch the next page while the current one is consumed
+        :return: generator of MemberList items, raises paginate.PageError if a page fails
+        """
+    return self._paginate(
+      lambda cursor: self.get_group_mem_info_detail(
+        group_id, page_size, cursor[0], memInfoFilter, memRoleFilter, cursor[1],
+        appDefineDataFilterMem
+      ), (0, ""), group_members_page(page_size), prefetch
+    )
+
+  @_logs_errors
   def update_group_baseinfo(
     self,
     group_id: str,
@@ -1501,7 +1713,7 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/modify_group_base_info".format(self.tecent_url)
+    path = "group_open_http_svc/modify_group_base_info"
     data = {}
     data["GroupId"] = group_id
     if group_name != "":
@@ -1522,13 +1734,9 @@ class TCIMClient(object):
     if len(appDefineData) > 0:
       data["AppDefinedData"] = [i.__dict__ for i in appDefineData]
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "update group info failed")
 
+  @_logs_errors
   def add_group_member(self, group_id: str, mem_list: List[GroupMemObj], silence: int = 1):
     """
         https://cloud.tencent.com/document/product/269/1621
@@ -1537,18 +1745,55 @@ class TCIMClient(object):
         :param silence:
         :return:
         """
-    rest_url = "{}/group_open_http_svc/add_group_member".format(self.tecent_url)
+    path = "group_open_http_svc/add_group_member"
     data = {}
     data["GroupId"] = group_id
     data["Silence"] = silence
     data["MemberList"] = [i.__dict__ for i in mem_list]
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("add mem to group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "add mem to group info failed")
+
+  def add_group_member_bulk(
+    self,
+    groups: Dict[str, List[GroupMemObj]],
+    silence: int = 1,
+    chunk_size: int = GROUP_MEMBER_BATCH_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        add any number of members to any number of groups, sent as concurrent chunks of
+        chunk_size; the chunks of all groups share max_workers
+        https://cloud.tencent.com/document/product/269/1621
+        :param groups: {group_id: [GroupMemObj]}
+        :param silence:
+        :param chunk_size: members per call, the server accepts at most 300
+        :param max_workers: max concurrent calls
+        :return: {group_id: merged response.content}, members of failed chunks get Result 0
+        and the ErrorCode of their chunk
+        {
+            "@TGS#2J4SZEAEL": {
+                "ActionStatus": "OK",
+                "ErrorCode": 0,
+                "ErrorInfo": "",
+                "MemberList": [
+                    {
+                        "Member_Account": "tommy",
+                        "Result": 1 // 0 failed, 1 added, 2 already a member, 3 waiting approval
+                    },
+                    {
+                        "Member_Account": "jared",
+                        "Result": 0,
+                        "ErrorCode": 10002
+                    }
+                ]
+            }
+        }
+        """
+    return self._run_bulk(
+      lambda job: self.add_group_member(job[0], job[1], silence),
+      group_member_jobs(groups, chunk_size), merge_member_results, max_workers
+    )
 
+  @_logs_errors
   def delete_group_mem(self, group_id: str, mem_list: List[str], silence: int = 1):
     """
         https://cloud.tencent.com/document/product/269/1622
@@ -1563,18 +1808,14 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/delete_group_member".format(self.tecent_url)
+    path = "group_open_http_svc/delete_group_member"
     data = {}
     data["GroupId"] = group_id
     data["Silence"] = silence
     data["MemberToDel_Account"] = mem_list
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("add mem to group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "add mem to group info failed")
 
+  @_logs_errors
   def update_group_mem_info(
     self,
     group_id: str,
@@ -1594,7 +1835,7 @@ class TCIMClient(object):
         :param shutUpTime:
         :return:
         """
-    rest_url = "{}/group_open_http_svc/modify_group_member_info".format(self.tecent_url)
+    path = "group_open_http_svc/modify_group_member_info"
     data = {}
     data["GroupId"] = group_id
     data["Member_Account"] = mem_id
@@ -1608,29 +1849,21 @@ class TCIMClient(object):
     if len(appMemDefineData) > 0:
       data["AppMemberDefinedData"] = [i.__dict__ for i in appMemDefineData]
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update mem to group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "update mem to group info failed")
 
+  @_logs_errors
   def delete_group(self, group_id: str):
     """
         https://cloud.tencent.com/document/product/269/1624
         :param group_id:
         :return:
         """
-    rest_url = "{}/group_open_http_svc/destroy_group".format(self.tecent_url)
+    path = "group_open_http_svc/destroy_group"
     data = {}
     data["GroupId"] = group_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update mem to group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "update mem to group info failed")
 
+  @_logs_errors
   def get_joined_groups(
     self,
     user_id: str,
@@ -1682,7 +1915,7 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/get_joined_group_list".format(self.tecent_url)
+    path = "group_open_http_svc/get_joined_group_list"
     data = {}
     data["Member_Account"] = user_id
     if limit_count > 0:
@@ -1702,13 +1935,34 @@ class TCIMClient(object):
 
     if len(responseFilter) > 0:
       data["ResponseFilter"] = responseFilter
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update mem to group info failed:{}".format(e))
-      return None
+    return self._call(path, data, "update mem to group info failed")
+
+  def iter_joined_groups(
+    self,
+    user_id: str,
+    group_type: str = "",
+    baseInfoFilter: List[str] = [],
+    selfInfoFilter: List[str] = [],
+    page_size: int = 100,
+    prefetch: bool = False
+  ):
+    """
+        lazily walk every group user_id joined, page by page with Offset
 
+        >>> for group in client.iter_joined_groups("user0", prefetch=True):
+        >>>     print(group["GroupId"])
+
+        :param page_size: groups per get_joined_groups call
+        :param prefetch: fetch the next page while the current one is consumed
+        :return: generator of GroupIdList items, raises paginate.PageError if a page fails
+        """
+    return self._paginate(
+      lambda offset: self.
+      get_joined_groups(user_id, page_size, offset, group_type, baseInfoFilter, selfInfoFilter), 0,
+      offset_page("GroupIdList", "TotalCount", page_size), prefetch
+    )
+
+  @_logs_errors
   def get_mem_role_in_group(self, group_id: str, user_ids: List[str]):
     """
         https://cloud.tencent.com/document/product/269/1626
@@ -1736,17 +1990,13 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/get_role_in_group".format(self.tecent_url)
+    path = "group_open_http_svc/get_role_in_group"
     data = {}
     data["GroupId"] = group_id
     data["User_Account"] = user_ids
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get mem role in group failed:{}".format(e))
-      return None
+    return self._call(path, data, "get mem role in group failed")
 
+  @_logs_errors
   def forbid_send_msg(self, group_id: str, user_ids: List[str], shutUpTime: int):
     """
         https://cloud.tencent.com/document/product/269/1627
@@ -1761,18 +2011,14 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/forbid_send_msg".format(self.tecent_url)
+    path = "group_open_http_svc/forbid_send_msg"
     data = {}
     data["GroupId"] = group_id
     data["Members_Account"] = user_ids
     data["ShutUpTime"] = shutUpTime
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get mem role in group failed:{}".format(e))
-      return None
+    return self._call(path, data, "get mem role in group failed")
 
+  @_logs_errors
   def get_group_shutup_list(self, group_id: str):
     """
         https://cloud.tencent.com/document/product/269/2925
@@ -1795,16 +2041,12 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/get_group_shutted_uin".format(self.tecent_url)
+    path = "group_open_http_svc/get_group_shutted_uin"
     data = {}
     data["GroupId"] = group_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get mem role in group failed:{}".format(e))
-      return None
+    return self._call(path, data, "get mem role in group failed")
 
+  @_logs_errors
   def send_group_message(
     self,
     group_id: str,
@@ -1832,7 +2074,7 @@ class TCIMClient(object):
             "MsgSeq": 1
         }
         """
-    rest_url = "{}/group_open_http_svc/send_group_msg".format(self.tecent_url)
+    path = "group_open_http_svc/send_group_msg"
     data = {}
     data["GroupId"] = group_id
     data["Random"] = random.randint(0, 4294967295)
@@ -1855,13 +2097,9 @@ class TCIMClient(object):
     if len(messageBody) > 0:
       data["MsgBody"] = messageBody
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("send message in group failed:{}".format(e))
-      return None
+    return self._call(path, data, "send message in group failed")
 
+  @_logs_errors
   def send_system_message_in_group(self, group_id: str, content: str, to_accounts: List[str] = []):
     """
         https://cloud.tencent.com/document/product/269/1630
@@ -1877,7 +2115,7 @@ class TCIMClient(object):
         }
         """
 
-    rest_url = "{}/group_open_http_svc/send_group_system_notification".format(self.tecent_url)
+    path = "group_open_http_svc/send_group_system_notification"
     data = {}
     data["GroupId"] = group_id
     data["Content"] = content
@@ -1885,13 +2123,9 @@ class TCIMClient(object):
     if len(to_accounts) > 0:
       data["ToMembers_Account"] = to_accounts
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("send message in group failed:{}".format(e))
-      return None
+    return self._call(path, data, "send message in group failed")
 
+  @_logs_errors
   def change_group_owner(self, group_id: str, new_owner_id: str):
     """
         https://cloud.tencent.com/document/product/269/1633
@@ -1905,18 +2139,14 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/change_group_owner".format(self.tecent_url)
+    path = "group_open_http_svc/change_group_owner"
     data = {}
     data["GroupId"] = group_id
     data["NewOwner_Account"] = new_owner_id
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("change group owner failed:{}".format(e))
-      return None
+    return self._call(path, data, "change group owner failed")
 
+  @_logs_errors
   def recall_group_message(self, group_id: str, msg_ids: List[str]):
     """
         https://cloud.tencent.com/document/product/269/12341
@@ -1940,7 +2170,7 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/group_msg_recall".format(self.tecent_url)
+    path = "group_open_http_svc/group_msg_recall"
     data = {}
     data["GroupId"] = group_id
     msgs = []
@@ -1951,13 +2181,9 @@ class TCIMClient(object):
 
     data["MsgSeqList"] = msgs
 
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("recall group message failed:{}".format(e))
-      return None
+    return self._call(path, data, "recall group message failed")
 
+  @_logs_errors
   def import_message_to_group(
     self, group_id: str, recent_contract_flag: int = 1, messages: List[GroupMessageObj] = []
   ):
@@ -1986,19 +2212,15 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_http_svc/import_group_msg".format(self.tecent_url)
+    path = "group_open_http_svc/import_group_msg"
     data = {}
     data["GroupId"] = group_id
     data["RecentContactFlag"] = recent_contract_flag
     if len(messages) > 0:
       data["MsgList"] = [i.__dict__ for i in messages]
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("import group message failed:{}".format(e))
-      return None
+    return self._call(path, data, "import group message failed")
 
+  @_logs_errors
   def import_group_members(self, group_id: str, mem_list: List[GroupMemObj] = []):
     """
         https://cloud.tencent.com/document/product/269/1636
@@ -2021,18 +2243,34 @@ class TCIMClient(object):
             }]
         }
         """
-    rest_url = "{}/group_open_http_svc/import_group_member".format(self.tecent_url)
+    path = "group_open_http_svc/import_group_member"
     data = {}
     data["GroupId"] = group_id
     if len(mem_list) > 0:
       data["MemberList"] = [i.__dict__ for i in mem_list]
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("import group message failed:{}".format(e))
-      return None
+    return self._call(path, data, "import group message failed")
 
+  def import_group_members_bulk(
+    self,
+    groups: Dict[str, List[GroupMemObj]],
+    chunk_size: int = GROUP_MEMBER_BATCH_LIMIT,
+    max_workers: int = 4
+  ):
+    """
+        import any number of members to any number of groups, sent as concurrent chunks of
+        chunk_size; the chunks of all groups share max_workers
+        https://cloud.tencent.com/document/product/269/1636
+        :param groups: {group_id: [GroupMemObj]}
+        :param chunk_size: members per call
+        :param max_workers: max concurrent calls
+        :return: {group_id: merged response.content}, see add_group_member_bulk
+        """
+    return self._run_bulk(
+      lambda job: self.import_group_members(job[0], job[1]), group_member_jobs(groups, chunk_size),
+      merge_member_results, max_workers
+    )
+
+  @_logs_errors
   def set_group_unread_msg_num(self, group_id: str, mem_id: str, unread_num: int):
     """
         https://cloud.tencent.com/document/product/269/1637
@@ -2047,18 +2285,14 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/set_unread_msg_num".format(self.tecent_url)
+    path = "group_open_http_svc/set_unread_msg_num"
     data = {}
     data["GroupId"] = group_id
     data["Member_Account"] = mem_id
     data["UnreadMsgNum"] = unread_num
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("import group message failed:{}".format(e))
-      return None
+    return self._call(path, data, "import group message failed")
 
+  @_logs_errors
   def delete_group_msg_by_sender(self, group_id: str, send_account: str):
     """
         https://cloud.tencent.com/document/product/269/2359
@@ -2066,17 +2300,13 @@ class TCIMClient(object):
         :param send_account:
         :return:
         """
-    rest_url = "{}/group_open_http_svc/delete_group_msg_by_sender".format(self.tecent_url)
+    path = "group_open_http_svc/delete_group_msg_by_sender"
     data = {}
     data["GroupId"] = group_id
     data["Sender_Account"] = send_account
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("delete mesg in group  failed:{}".format(e))
-      return None
+    return self._call(path, data, "delete mesg in group  failed")
 
+  @_logs_errors
   def get_msg_in_group(
     self, group_id: str, msg_num: int, with_recalled_msg: int = 1, msg_seq: int = 0
   ):
@@ -2148,20 +2378,16 @@ class TCIMClient(object):
         }
 
         """
-    rest_url = "{}/group_open_http_svc/group_msg_get_simple".format(self.tecent_url)
+    path = "group_open_http_svc/group_msg_get_simple"
     data = {}
     data["GroupId"] = group_id
     data["ReqMsgNumber"] = msg_num
     data["WithRecalledMsg"] = with_recalled_msg
     if msg_seq > 0:
       data["ReqMsgSeq"] = msg_seq
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get msg in group  failed:{}".format(e))
-      return None
+    return self._call(path, data, "get msg in group  failed")
 
+  @_logs_errors
   def get_online_member_num(self, group_id: str):
     """
         https://cloud.tencent.com/document/product/269/49180
@@ -2175,16 +2401,12 @@ class TCIMClient(object):
             "OnlineMemberNum":1000 //在线人数
         }
         """
-    rest_url = "{}/group_open_http_svc/get_online_member_num".format(self.tecent_url)
+    path = "group_open_http_svc/get_online_member_num"
     data = {}
     data["GroupId"] = group_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get mem number in online group failed:{}".format(e))
-      return None
+    return self._call(path, data, "get mem number in online group failed")
 
+  @_logs_errors
   def get_group_attr(self, group_id: str):
     """
         https://cloud.tencent.com/document/product/269/67012
@@ -2207,16 +2429,12 @@ class TCIMClient(object):
             ]
         }
         """
-    rest_url = "{}/group_open_attr_http_svc/get_group_attr".format(self.tecent_url)
+    path = "group_open_attr_http_svc/get_group_attr"
     data = {}
     data["GroupId"] = group_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("get group attr failed:{}".format(e))
-      return None
+    return self._call(path, data, "get group attr failed")
 
+  @_logs_errors
   def update_group_attr(self, group_id: str, attr_list: List[GroupAttr]):
     """
         https://cloud.tencent.com/document/product/269/67010
@@ -2230,17 +2448,13 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/modify_group_attr".format(self.tecent_url)
+    path = "group_open_http_svc/modify_group_attr"
     data = {}
     data["GroupId"] = group_id
     data["GroupAttr"] = [i.__dict__ for i in attr_list]
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update group attrfailed:{}".format(e))
-      return None
+    return self._call(path, data, "update group attrfailed")
 
+  @_logs_errors
   def clean_group_attr(self, group_id: str):
     """
         https://cloud.tencent.com/document/product/269/67009
@@ -2253,15 +2467,10 @@ class TCIMClient(object):
             "ErrorCode": 0
         }
         """
-    rest_url = "{}/group_open_http_svc/clear_group_attr".format(self.tecent_url)
+    path = "group_open_http_svc/clear_group_attr"
     data = {}
     data["GroupId"] = group_id
-    try:
-      query = self._gen_query()
-      return requests.post(rest_url, params=query, data=json.dumps(data))
-    except Exception as e:
-      logger.error("update group attrfailed:{}".format(e))
-      return None
+    return self._call(path, data, "update group attrfailed")
 
 
 if __name__ == "__main__":
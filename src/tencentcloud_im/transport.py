@@ -0,0 +1,191 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect timeout, read timeout) in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class PooledTransport(object):
+  """
+    keep-alive http transport shared by every rest call of a client
+
+    requests.Session keeps one urllib3 connection pool per host, so steady-state calls
+    reuse warm TCP+TLS connections. the pools are thread-safe and one transport can be
+    shared between threads and between clients.
+
+    Attributes
+      session: requests.Session holding the connection pools
+      timeout: (connect timeout, read timeout) in seconds
+      headers: extra headers of every call, eg: Connection: close without keep-alive
+    """
+
+  def __init__(
+    self,
+    pool_connections: int = 10,
+    pool_maxsize: int = 10,
+    pool_block: bool = False,
+    keep_alive: bool = True,
+    timeout=DEFAULT_TIMEOUT,
+    session: requests.Session = None
+  ):
+    """
+        :param pool_connections: number of per-host pools to cache
+        :param pool_maxsize: max connections kept alive per host
+        :param pool_block: block when all connections of a host are busy instead of opening
+        a throwaway one
+        :param keep_alive: if False, ask the server to close the connection after each call
+        :param timeout: (connect timeout, read timeout) in seconds, or a single number
+        :param session: custom requests.Session to use; its adapters are left untouched
+        """
+    if session is None:
+      session = requests.Session()
+      adapter = HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block
+      )
+      session.mount("https://", adapter)
+      session.mount("http://", adapter)
+
+    self.session = session
+    self.timeout = timeout
+    # sent with each call, the session's own headers are left untouched
+    self.headers = None if keep_alive else {"Connection": "close"}
+
+  def post(self, url: str, params: dict = None, data=None):
+    """
+        :param url: rest url
+        :param params: query string
+        :param data: request body
+        :return: requests.Response
+        """
+    return self.session.post(
+      url, params=params, data=data, headers=self.headers, timeout=self.timeout
+    )
+
+  def close(self):
+    """
+        close all pooled connections
+        """
+    self.session.close()
+
+
+class BufferedResponse(object):
+  """
+    fully read http response returned by AsyncTransport
+
+    mirrors the parts of requests.Response used by callers: status_code, headers, content,
+    text and json()
+    """
+
+  def __init__(self, status_code: int, content: bytes, headers=None, url: str = ""):
+    self.status_code = status_code
+    self.content = content
+    self.headers = headers if headers is not None else {}
+    self.url = url
+
+  @property
+  def ok(self):
+    return self.status_code < 400
+
+  @property
+  def text(self):
+    return self.content.decode("utf8")
+
+  def json(self):
+    return json.loads(self.content)
+
+
+class AsyncTransport(object):
+  """
+    non-blocking keep-alive http transport backed by aiohttp
+
+    the aiohttp.ClientSession is created lazily inside the running event loop, all
+    in-flight calls of the loop share its connection pool.
+
+    Attributes
+      timeout: (connect timeout, read timeout) in seconds
+    """
+
+  def __init__(
+    self,
+    limit: int = 100,
+    limit_per_host: int = 0,
+    keepalive_timeout: float = 15,
+    timeout=DEFAULT_TIMEOUT,
+    session=None
+  ):
+    """
+        :param limit: max connections in the pool, 0 means no limit
+        :param limit_per_host: max connections per host, 0 means no limit
+        :param keepalive_timeout: seconds an idle connection is kept alive
+        :param timeout: (connect timeout, read timeout) in seconds, or a single number
+        :param session: custom aiohttp.ClientSession to use
+        """
+    self.limit = limit
+    self.limit_per_host = limit_per_host
+    self.keepalive_timeout = keepalive_timeout
+    self.timeout = timeout
+    self.session = session
+
+  def _get_session(self):
+    if self.session is None:
+      try:
+        import aiohttp
+      except ImportError:
+        raise ImportError(
+          "AsyncTransport requires aiohttp: pip install tencentcloud-sdk-python-im[async]"
+        )
+      if isinstance(self.timeout, tuple):
+        connect_timeout, read_timeout = self.timeout
+      else:
+        connect_timeout = read_timeout = self.timeout
+      connector = aiohttp.TCPConnector(
+        limit=self.limit,
+        limit_per_host=self.limit_per_host,
+        keepalive_timeout=self.keepalive_timeout
+      )
+      self.session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(connect=connect_timeout, sock_read=read_timeout)
+      )
+    return self.session
+
+  async def post(self, url: str, params: dict = None, data=None):
+    """
+        :param url: rest url
+        :param params: query string
+        :param data: request body
+        :return: BufferedResponse
+        """
+    session = self._get_session()
+    if params is not None:
+      params = {k: str(v) for k, v in params.items()}
+    async with session.post(url, params=params, data=data) as response:
+      content = await response.read()
+      return BufferedResponse(
+        response.status, content, headers=dict(response.headers), url=str(response.url)
+      )
+
+  async def close(self):
+    """
+        close all pooled connections
+        """
+    if self.session is not None:
+      await self.session.close()
+      self.session = None
@@ -0,0 +1,287 @@
+# -*- coding: utf8 -*-
+# Copyright (c) 2021-2021 Pinclr, Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable
+
+from TLSSigAPIv2 import TLSSigAPIv2
+
+logger = logging.getLogger(__name__)
+
+
+class AdminSigManager(object):
+  """
+    cached admin user sig used to sign every rest call
+
+    the sig is generated once and refreshed on a background thread when it enters the
+    refresh window, so the request path only reads a cached string. generation is
+    single-flight: concurrent callers never sign twice. get() never blocks on io and is
+    safe to call from threads and from an asyncio event loop.
+
+    Attributes
+      admin: admin user id
+      expire_time: validity of each generated sig(seconds)
+      refresh_ahead: start refreshing this many seconds before expiry
+    """
+
+  def __init__(
+    self,
+    sdk_id,
+    key,
+    admin: str,
+    expire_time: int = 60 * 5,
+    refresh_ahead: float = None,
+    signer=None,
+    clock=time.time
+  ):
+    """
+        :param sdk_id: IM SDK ID
+        :param key:    IM SDK SECRET KEY
+        :param admin:  ADMIN
+        :param expire_time: validity of each generated sig(seconds)
+        :param refresh_ahead: seconds before expiry to refresh, default a fifth of expire_time
+        :param signer: object with gen_sig(identifier, expire), TLSSigAPIv2 by default
+        :param clock: returns the current unix time
+        """
+    self.admin = admin
+    self.expire_time = expire_time
+    self.refresh_ahead = refresh_ahead if refresh_ahead is not None else expire_time / 5.0
+    self.signer = signer if signer is not None else TLSSigAPIv2(sdk_id, key)
+    self.clock = clock
+    self._lock = threading.Lock()
+    self._sig = None
+    self._expires_at = 0
+    self._refreshing = False
+
+  def _sign(self):
+    issued_at = self.clock()
+    return self.signer.gen_sig(self.admin, self.expire_time), issued_at + self.expire_time
+
+  def get(self) -> str:
+    """
+        :return: a valid admin user sig
+        """
+    now = self.clock()
+    with self._lock:
+      if self._sig is not None and now < self._expires_at - self.refresh_ahead:
+        return self._sig
+
+      if self._sig is None or now >= self._expires_at:
+        # nothing usable cached: sign inline, other callers wait on the lock
+        self._sig, self._expires_at = self._sign()
+        return self._sig
+
+      if not self._refreshing:
+        self._refreshing = True
+        thread = threading.Thread(target=self._refresh, name="tcim-admin-sig-refresh")
+        thread.daemon = True
+        thread.start()
+      return self._sig
+
+  def _refresh(self):
+    try:
+      sig, expires_at = self._sign()
+      with self._lock:
+        if expires_at > self._expires_at:
+          self._sig, self._expires_at = sig, expires_at
+    except Exception as e:
+      logger.error("refresh admin user sig failed:{}".format(e))
+    finally:
+      with self._lock:
+        self._refreshing = False
+
+  def remaining(self) -> float:
+    """
+        :return: seconds the cached sig stays valid, 0 if none is cached
+        """
+    with self._lock:
+      if self._sig is None:
+        return 0
+      return max(0, self._expires_at - self.clock())
+
+  def invalidate(self):
+    """
+        drop the cached sig, the next get() signs a new one
+        """
+    with self._lock:
+      self._sig = None
+      self._expires_at = 0
+
+
+_worker_signer = None
+
+
+def _init_worker(sdk_id, key):
+  global _worker_signer
+  _worker_signer = TLSSigAPIv2(sdk_id, key)
+
+
+def _sign_chunk(user_ids, expire):
+  return [_worker_signer.gen_sig(user_id, expire) for user_id in user_ids]
+
+
+class UserSigGenerator(object):
+  """
+    bulk end-user sig generation
+
+    one TLSSigAPIv2 signer is reused for every sig. sigs are cached in a bounded LRU keyed
+    by (user_id, expire, age bucket). buckets last max_age seconds, or expire / 2 for short
+    expiries, so a cached sig always keeps at least half of its validity. large batches can
+    be spread across a process pool.
+
+    Attributes
+      cache_size: max cached sigs, least recently used are evicted first
+      max_age: max age of a cached sig(seconds)
+      processes: size of the process pool, 0 signs in the calling process
+      pool_threshold: min number of sigs to sign before the process pool is used
+      hits: cache hits
+      misses: cache misses
+    """
+
+  def __init__(
+    self,
+    sdk_id,
+    key,
+    cache_size: int = 100000,
+    max_age: int = 3600,
+    processes: int = 0,
+    pool_threshold: int = 2000,
+    signer=None,
+    clock=time.time
+  ):
+    """
+        :param sdk_id: IM SDK ID
+        :param key:    IM SDK SECRET KEY
+        :param cache_size: max cached sigs, 0 disables the cache
+        :param max_age: max age of a cached sig(seconds)
+        :param processes: size of the process pool, 0 signs in the calling process
+        :param pool_threshold: min number of sigs to sign before the process pool is used
+        :param signer: object with gen_sig(identifier, expire), TLSSigAPIv2 by default
+        :param clock: returns the current unix time
+        """
+    self.sdk_id = sdk_id
+    self.key = key
+    self.cache_size = cache_size
+    self.max_age = max_age
+    self.processes = processes
+    self.pool_threshold = pool_threshold
+    self.signer = signer if signer is not None else TLSSigAPIv2(sdk_id, key)
+    self.clock = clock
+    self.hits = 0
+    self.misses = 0
+    self._cache = OrderedDict()
+    self._lock = threading.Lock()
+    self._pool = None
+
+  def _cache_key(self, user_id: str, expire: int, now: float):
+    age = max(1, min(self.max_age, expire // 2))
+    return (user_id, expire, int(now // age))
+
+  def _cache_get(self, key):
+    with self._lock:
+      sig = self._cache.get(key)
+      if sig is None:
+        self.misses += 1
+        return None
+      self._cache.move_to_end(key)
+      self.hits += 1
+      return sig
+
+  def _cache_put(self, items):
+    if self.cache_size <= 0:
+      return
+    with self._lock:
+      for key, sig in items:
+        self._cache[key] = sig
+        self._cache.move_to_end(key)
+      while len(self._cache) > self.cache_size:
+        self._cache.popitem(last=False)
+
+  def gen(self, user_id: str, expire: int = 180 * 86400) -> str:
+    """
+        :param user_id: user id
+        :param expire: expire time(seconds)
+        :return: user sig
+        """
+    key = self._cache_key(user_id, expire, self.clock())
+    sig = self._cache_get(key)
+    if sig is None:
+      sig = self.signer.gen_sig(user_id, expire)
+      self._cache_put([(key, sig)])
+    return sig
+
+  def gen_many(self, user_ids: Iterable[str], expire: int = 180 * 86400) -> Dict[str, str]:
+    """
+        :param user_ids: user ids, duplicates are signed once
+        :param expire: expire time(seconds)
+        :return: {user_id: user sig}
+        """
+    now = self.clock()
+    sigs = {}
+    missing = []
+    for user_id in user_ids:
+      if user_id in sigs:
+        continue
+      sig = self._cache_get(self._cache_key(user_id, expire, now))
+      sigs[user_id] = sig
+      if sig is None:
+        missing.append(user_id)
+
+    if self.processes > 0 and len(missing) >= self.pool_threshold:
+      signed = self._sign_in_pool(missing, expire)
+    else:
+      signed = [self.signer.gen_sig(user_id, expire) for user_id in missing]
+
+    self._cache_put(
+      [(self._cache_key(user_id, expire, now), sig) for user_id, sig in zip(missing, signed)]
+    )
+    sigs.update(zip(missing, signed))
+    return sigs
+
+  def _sign_in_pool(self, user_ids, expire):
+    if self._pool is None:
+      self._pool = ProcessPoolExecutor(
+        max_workers=self.processes, initializer=_init_worker, initargs=(self.sdk_id, self.key)
+      )
+    chunk_size = max(1, -(-len(user_ids) // (self.processes * 4)))
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    signed = []
+    for sigs in self._pool.map(_sign_chunk, chunks, [expire] * len(chunks)):
+      signed.extend(sigs)
+    return signed
+
+  def cache_info(self) -> dict:
+    """
+        :return: {"hits", "misses", "size", "max_size"}
+        """
+    with self._lock:
+      return {
+        "hits": self.hits,
+        "misses": self.misses,
+        "size": len(self._cache),
+        "max_size": self.cache_size
+      }
+
+  def close(self):
+    """
+        shut down the process pool
+        """
+    if self._pool is not None:
+      self._pool.shutdown(wait=True)
+      self._pool = None
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.tcim_client import TCIMClient
+from tencentcloud_im.transport import BufferedResponse
+
+
+class FakeTransport(object):
+  """
+    in-memory stand-in for PooledTransport, routes calls to handlers by endpoint path
+    """
+
+  def __init__(self):
+    self.handlers = {}
+    self.calls = []
+    self.lock = threading.Lock()
+
+  def route(self, path, handler):
+    self.handlers[path] = handler
+
+  def post(self, url, params=None, data=None):
+    path = url.split("/v4/", 1)[1]
+    body = json.loads(data)
+    with self.lock:
+      self.calls.append((path, body))
+    result = self.handlers[path](body)
+    if isinstance(result, Exception):
+      raise result
+    return BufferedResponse(200, json.dumps(result).encode("utf8"))
+
+  def paths(self):
+    return [path for path, _ in self.calls]
+
+  def close(self):
+    pass
+
+
+class FakeAsyncTransport(object):
+
+  def __init__(self, transport):
+    self.transport = transport
+
+  async def post(self, url, params=None, data=None):
+    await asyncio.sleep(0)
+    return self.transport.post(url, params=params, data=data)
+
+  async def close(self):
+    pass
+
+
+def ok(**fields):
+  result = {"ActionStatus": "OK", "ErrorCode": 0, "ErrorInfo": ""}
+  result.update(fields)
+  return result
+
+
+@pytest.fixture
+def transport():
+  return FakeTransport()
+
+
+@pytest.fixture
+def client(transport):
+  return TCIMClient("1400000000", "secret", "admin", transport=transport)
+
+
+@pytest.fixture
+def async_client(transport):
+  return AsyncTCIMClient("1400000000", "secret", "admin", transport=FakeAsyncTransport(transport))
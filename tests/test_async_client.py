@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.tcim_client import GroupObj
+from tencentcloud_im.transport import BufferedResponse
+
+
+class FakeAsyncTransport(object):
+
+  def __init__(self):
+    self.calls = []
+    self.closed = False
+
+  async def post(self, url, params=None, data=None):
+    self.calls.append((url, params, json.loads(data)))
+    await asyncio.sleep(0)
+    return BufferedResponse(200, b'{"ActionStatus": "OK", "ErrorCode": 0}')
+
+  async def close(self):
+    self.closed = True
+
+
+class TestAsyncTCIMClient(object):
+
+  def test_methods_are_awaitable_and_share_payloads(self):
+    transport = FakeAsyncTransport()
+
+    async def run():
+      async with AsyncTCIMClient("1400000000", "secret", "admin", transport=transport) as client:
+        return await asyncio.gather(
+          *[client.check_user_online(["user{}".format(i)]) for i in range(20)]
+        )
+
+    responses = asyncio.run(run())
+    assert len(responses) == 20
+    assert responses[0].json()["ActionStatus"] == "OK"
+    url, params, data = transport.calls[3]
+    assert url.endswith("/openim/query_online_status")
+    assert params["identifier"] == "admin"
+    assert data == {"IsNeedDetail": 1, "To_Account": ["user3"]}
+    assert transport.closed
+
+  def test_rejected_call_is_awaitable(self):
+    client = AsyncTCIMClient("1400000000", "secret", "admin", transport=FakeAsyncTransport())
+    group = GroupObj("owner", "Unknown", "name")
+    assert asyncio.run(client.create_group(group)) is None
+
+  def test_bad_payload_is_logged_and_returns_none(self, client, transport):
+    async_client = AsyncTCIMClient("1400000000", "secret", "admin", transport=FakeAsyncTransport())
+    friends = [{"To_Account": "user1"}]
+    assert client.add_friend("user0", friends) is None
+    assert asyncio.run(async_client.add_friend("user0", friends)) is None
+    assert transport.calls == []
@@ -0,0 +1,268 @@
+import asyncio
+
+import pytest
+from conftest import FakeAsyncTransport, ok
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.breaker import (
+  CLOSED, HALF_OPEN, OPEN, AIMDLimiter, CircuitBreaker, EndpointGuard, GuardedExecutor
+)
+from tencentcloud_im.request import TCIMRequest
+from tencentcloud_im.retry import RetryPolicy
+from tencentcloud_im.tcim_client import TCIMClient
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+def overloaded(body):
+  return {"ActionStatus": "FAIL", "ErrorCode": 90035, "ErrorInfo": "busy"}
+
+
+class TestCircuitBreaker(object):
+
+  def test_opens_then_half_opens_then_closes(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=4, min_calls=4, reset_timeout=5, clock=clock)
+    for success in (True, False, False, True):
+      assert breaker.allow()
+      breaker.record(success)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    clock.now = 5
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["rejected"] == 2
+
+  def test_failed_trial_reopens(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=2, min_calls=2, reset_timeout=1, clock=clock)
+    breaker.record(False)
+    breaker.record(False)
+    clock.now = 1
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+  def test_outcome_of_an_older_state_is_ignored(self):
+    clock = FakeClock()
+    breaker = CircuitBreaker(window=2, min_calls=2, reset_timeout=1, clock=clock)
+    slow = breaker.allow()
+    breaker.record(False, breaker.allow())
+    breaker.record(False, breaker.allow())
+    assert breaker.state == OPEN
+    clock.now = 1
+    trial = breaker.allow()
+    assert breaker.state == HALF_OPEN
+
+    # the call admitted while closed neither closes the circuit nor frees the trial slot
+    breaker.record(True, slow)
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(True, trial)
+    assert breaker.state == CLOSED
+
+
+class TestAIMDLimiter(object):
+
+  def test_additive_increase_multiplicative_decrease(self):
+    clock = FakeClock()
+    limiter = AIMDLimiter(initial=10, max_limit=20, decrease=0.5, cooldown=1, clock=clock)
+    limiter.acquire()
+    limiter.release(0.01, True)
+    assert limiter.limit == 10.1
+
+    for _ in range(2):
+      limiter.acquire()
+      limiter.release(0.01, False)
+    # the second failure falls in the cooldown of the first one
+    assert limiter.limit == 5.05
+
+  def test_slow_call_counts_as_congestion(self):
+    limiter = AIMDLimiter(initial=8, decrease=0.5, cooldown=0, latency_floor=0.1)
+    for _ in range(3):
+      limiter.acquire()
+      limiter.release(0.2, True)
+    limit = limiter.limit
+    limiter.acquire()
+    limiter.release(1.0, True)
+    assert limiter.limit == limit * 0.5
+
+  def test_async_waiter_wakes_on_release(self):
+    limiter = AIMDLimiter(initial=1)
+
+    async def main():
+      await limiter.acquire_async()
+      waiting = asyncio.ensure_future(limiter.acquire_async())
+      await asyncio.sleep(0)
+      assert not waiting.done()
+      limiter.release(0.01, True)
+      await asyncio.wait_for(waiting, 1)
+      return limiter.inflight
+
+    assert asyncio.run(main()) == 1
+
+  def test_cancelled_waiter_does_not_take_the_slot(self):
+    limiter = AIMDLimiter(initial=1, max_limit=1)
+
+    async def main():
+      await limiter.acquire_async()
+      cancelled = asyncio.ensure_future(limiter.acquire_async())
+      waiting = asyncio.ensure_future(limiter.acquire_async())
+      await asyncio.sleep(0)
+      cancelled.cancel()
+      await asyncio.sleep(0)
+      limiter.release(0.01, True)
+      await asyncio.wait_for(waiting, 1)
+      return limiter.inflight
+
+    assert asyncio.run(main()) == 1
+
+
+class AsyncEcho(object):
+  is_async = True
+
+  async def execute(self, request):
+    return None
+
+
+class AsyncHang(object):
+  is_async = True
+
+  async def execute(self, request):
+    await asyncio.sleep(10)
+
+
+class TestGuardedClient(object):
+
+  def guard(self, clock):
+    return EndpointGuard(
+      breaker_factory=lambda: CircuitBreaker(window=3, min_calls=3, reset_timeout=5, clock=clock)
+    )
+
+  def test_open_circuit_fails_fast_per_family(self, transport):
+    clock = FakeClock()
+    guard = self.guard(clock)
+    transport.route("openim/query_online_status", overloaded)
+    transport.route("group_open_http_svc/get_appid_group_list", lambda body: ok())
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, endpoint_guard=guard)
+
+    for _ in range(3):
+      assert client.check_user_online(["user0"]).json()["ErrorCode"] == 90035
+    assert client.check_user_online(["user0"]) is None
+    assert len(transport.calls) == 3
+    assert client.get_group().json()["ActionStatus"] == "OK"
+
+    snapshot = guard.snapshot()
+    assert snapshot["openim"]["state"] == OPEN
+    assert snapshot["openim"]["rejected"] == 1
+    assert snapshot["group_open_http_svc"]["state"] == CLOSED
+    assert snapshot["group_open_http_svc"]["inflight"] == 0
+
+  def test_fatal_error_codes_do_not_open(self, transport):
+    transport.route(
+      "openim/query_online_status", lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 70107,
+        "ErrorInfo": "bad user"
+      }
+    )
+    guard = self.guard(FakeClock())
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, endpoint_guard=guard)
+    for _ in range(5):
+      client.check_user_online(["user0"])
+    assert guard.snapshot()["openim"]["state"] == CLOSED
+
+  def test_open_circuit_is_not_retried(self, transport):
+    transport.route("openim/query_online_status", overloaded)
+    policy = RetryPolicy(max_attempts=2, base_delay=0.001, max_delay=0.002)
+    client = TCIMClient(
+      "1400000000",
+      "secret",
+      "admin",
+      transport=transport,
+      retry_policy=policy,
+      endpoint_guard=self.guard(FakeClock())
+    )
+    for _ in range(3):
+      client.check_user_online(["user0"])
+    calls = len(transport.calls)
+    assert client.check_user_online(["user0"]) is None
+    assert len(transport.calls) == calls
+    # the circuit opened during the second call, its retry was refused without a request
+    assert calls == 3
+    assert policy.stats.snapshot()["retries"] == 2
+
+  def test_cancelled_limiter_wait_gives_back_the_trial(self):
+    clock = FakeClock()
+    guard = EndpointGuard(
+      breaker_factory=lambda: CircuitBreaker(window=2, min_calls=2, reset_timeout=1, clock=clock),
+      limiter_factory=lambda: AIMDLimiter(initial=1, max_limit=1)
+    )
+    breaker, limiter = guard.get("openim")
+    breaker.record(False)
+    breaker.record(False)
+    clock.now = 1
+    request = TCIMRequest.create("https://console.tim.qq.com/v4", "openim/sendmsg", {}, {})
+
+    async def main():
+      await limiter.acquire_async()
+      call = asyncio.ensure_future(GuardedExecutor(AsyncEcho(), guard).execute(request))
+      await asyncio.sleep(0)
+      call.cancel()
+      await asyncio.gather(call, return_exceptions=True)
+
+    asyncio.run(main())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+  def test_cancelled_trial_call_does_not_close_the_circuit(self):
+    clock = FakeClock()
+    guard = EndpointGuard(
+      breaker_factory=lambda: CircuitBreaker(window=2, min_calls=2, reset_timeout=1, clock=clock),
+      limiter_factory=lambda: AIMDLimiter(initial=4)
+    )
+    breaker, limiter = guard.get("openim")
+    breaker.record(False)
+    breaker.record(False)
+    clock.now = 1
+    request = TCIMRequest.create("https://console.tim.qq.com/v4", "openim/sendmsg", {}, {})
+
+    async def main():
+      call = GuardedExecutor(AsyncHang(), guard).execute(request)
+      await asyncio.wait_for(call, 0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+      asyncio.run(main())
+    assert breaker.state == HALF_OPEN
+    assert limiter.snapshot() == {"limit": 4.0, "inflight": 0, "latency": None}
+    assert breaker.allow()
+
+  def test_async_client(self, transport):
+    transport.route("openim/query_online_status", overloaded)
+    guard = self.guard(FakeClock())
+    client = AsyncTCIMClient(
+      "1400000000",
+      "secret",
+      "admin",
+      transport=FakeAsyncTransport(transport),
+      endpoint_guard=guard
+    )
+
+    async def main():
+      return [await client.check_user_online(["user0"]) for _ in range(4)]
+
+    results = asyncio.run(main())
+    assert sum(r is None for r in results) == 1
+    assert guard.snapshot()["openim"]["state"] == OPEN
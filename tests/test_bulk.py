@@ -0,0 +1,153 @@
+import asyncio
+
+from conftest import ok
+
+from tencentcloud_im.tcim_client import BatchMessageObj, GroupMemObj, MessageText
+
+
+def check_handler(body):
+  items = []
+  for item in body["CheckItem"]:
+    status = "Imported" if item["UserID"] != "user7" else "NotImported"
+    items.append({"UserID": item["UserID"], "ResultCode": 0, "AccountStatus": status})
+  return ok(ResultItem=items)
+
+
+class TestAccountBulk(object):
+
+  def test_batch_add_users_bulk_merges_fail_accounts(self, client, transport):
+
+    def handler(body):
+      if "user200" in body["Accounts"]:
+        return {"ActionStatus": "FAIL", "ErrorCode": 90035, "ErrorInfo": "busy"}
+      return ok(FailAccounts=[a for a in body["Accounts"] if a == "user3"])
+
+    transport.route("im_open_login_svc/multiaccount_import", handler)
+    user_ids = ["user{}".format(i) for i in range(250)]
+    result = client.batch_add_users_bulk(user_ids, max_workers=3)
+
+    assert [len(body["Accounts"]) for _, body in transport.calls] == [100, 100, 50]
+    assert result["ActionStatus"] == "FAIL"
+    assert result["ErrorCode"] == 90035
+    assert result["FailAccounts"] == ["user3"] + user_ids[200:]
+
+  def test_search_user_bulk_concatenates_result_items(self, client, transport):
+    transport.route("im_open_login_svc/account_check", check_handler)
+    result = client.search_user_bulk(["user{}".format(i) for i in range(10)], chunk_size=3)
+
+    assert len(transport.calls) == 4
+    assert result["ActionStatus"] == "OK"
+    assert [item["UserID"] for item in result["ResultItem"]][-2:] == ["user8", "user9"]
+    assert result["ResultItem"][7]["AccountStatus"] == "NotImported"
+
+  def test_del_user_bulk_reports_failed_chunk_per_account(self, client, transport):
+    transport.route("im_open_login_svc/account_delete", lambda body: ValueError("down"))
+    result = client.del_user_bulk(["user0", "user1"])
+
+    assert result["ActionStatus"] == "FAIL"
+    assert [item["ResultCode"] for item in result["ResultItem"]] == [-1, -1]
+
+  def test_async_bulk(self, async_client, transport):
+    transport.route("im_open_login_svc/account_check", check_handler)
+    result = asyncio.run(async_client.search_user_bulk(["user{}".format(i) for i in range(250)]))
+
+    assert len(transport.calls) == 3
+    assert len(result["ResultItem"]) == 250
+
+
+def batch_send_handler(body):
+  errors = [{"To_Account": a, "ErrorCode": 70107} for a in body["To_Account"] if a.endswith("13")]
+  return ok(MsgKey="key", ErrorList=errors)
+
+
+class TestBroadcast(object):
+
+  def test_broadcast_streams_generator_in_batches(self, client, transport):
+    transport.route("openim/batchsendmsg", batch_send_handler)
+    pulled = []
+
+    def recipients():
+      for i in range(1234):
+        pulled.append(i)
+        yield "user{}".format(i)
+
+    message = BatchMessageObj("admin", [], [MessageText("hi")])
+    stream = client.broadcast_message(message, recipients(), max_workers=2)
+    first = next(stream)
+    assert len(pulled) <= 500 * 3
+    reports = [first] + list(stream)
+
+    assert sorted(len(r.accounts) for r in reports) == [234, 500, 500]
+    assert reports[-1].done == 1234
+    assert reports[-1].failed_total == 13
+    assert all(body["From_Account"] == "admin" for _, body in transport.calls)
+    assert {body["MsgBody"][0]["MsgContent"]["Text"] for _, body in transport.calls} == {"hi"}
+    assert message.To_Account == []
+
+  def test_failed_batch_marks_every_recipient(self, client, transport):
+    busy = {"ActionStatus": "FAIL", "ErrorCode": 90035}
+    transport.route("openim/batchsendmsg", lambda body: busy)
+    message = BatchMessageObj("admin", [], [MessageText("hi")])
+    reports = list(client.broadcast_message(message, ["u0", "u1", "u2"], batch_size=2))
+
+    failed = {}
+    for report in reports:
+      failed.update(report.failed)
+    assert failed == {"u0": 90035, "u1": 90035, "u2": 90035}
+
+  def test_async_broadcast(self, async_client, transport):
+    transport.route("openim/batchsendmsg", batch_send_handler)
+    message = BatchMessageObj("admin", [], [MessageText("hi")])
+
+    async def run():
+      recipients = ("user{}".format(i) for i in range(1100))
+      return [r async for r in async_client.broadcast_message(message, recipients, rate=1000)]
+
+    reports = asyncio.run(run())
+    assert sorted(r.index for r in reports) == [0, 1, 2]
+    assert max(r.done for r in reports) == 1100
+
+
+def members(count, prefix="user"):
+  return [GroupMemObj("{}{}".format(prefix, i)) for i in range(count)]
+
+
+def add_member_handler(body):
+  if body["GroupId"] == "@busy" and body["MemberList"][0]["Member_Account"] == "user300":
+    return {"ActionStatus": "FAIL", "ErrorCode": 10002, "ErrorInfo": "busy"}
+  return ok(
+    MemberList=[{
+      "Member_Account": m["Member_Account"],
+      "Result": 1
+    } for m in body["MemberList"]]
+  )
+
+
+class TestGroupMemberBulk(object):
+
+  def test_add_group_member_bulk_chunks_every_group(self, client, transport):
+    transport.route("group_open_http_svc/add_group_member", add_member_handler)
+    result = client.add_group_member_bulk(
+      {
+        "@group0": members(700),
+        "@busy": members(350)
+      }, max_workers=3
+    )
+
+    sizes = sorted((body["GroupId"], len(body["MemberList"])) for _, body in transport.calls)
+    assert sizes == [
+      ("@busy", 50), ("@busy", 300), ("@group0", 100), ("@group0", 300), ("@group0", 300)
+    ]
+    assert result["@group0"]["ActionStatus"] == "OK"
+    assert [m["Member_Account"] for m in result["@group0"]["MemberList"]][-1] == "user699"
+    busy = result["@busy"]
+    assert (busy["ActionStatus"], busy["ErrorCode"]) == ("FAIL", 10002)
+    assert [m["Result"] for m in busy["MemberList"]].count(0) == 50
+    assert busy["MemberList"][349] == {"Member_Account": "user349", "Result": 0, "ErrorCode": 10002}
+
+  def test_async_import_group_members_bulk(self, async_client, transport):
+    transport.route("group_open_http_svc/import_group_member", add_member_handler)
+    result = asyncio.run(async_client.import_group_members_bulk({"@group0": members(601)}))
+
+    assert [len(body["MemberList"]) for _, body in transport.calls] == [300, 300, 1]
+    assert len(result["@group0"]["MemberList"]) == 601
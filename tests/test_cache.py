@@ -0,0 +1,213 @@
+import asyncio
+import multiprocessing
+
+from conftest import FakeAsyncTransport, ok
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.cache import LocalCache, ResponseCache, SQLiteCache
+from tencentcloud_im.tcim_client import GroupMemObj, TCIMClient
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+def cached_client(transport, cache):
+  return TCIMClient("1400000000", "secret", "admin", transport=transport, cache=cache)
+
+
+class TestLocalCache(object):
+
+  def test_ttl_and_lru_eviction(self):
+    clock = FakeClock()
+    backend = LocalCache(max_entries=2, clock=clock)
+    backend.set("a", b"1", 10, ["group:g1"])
+    backend.set("b", b"2", 5)
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3", 10)
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+
+    clock.now = 10
+    assert backend.get("a") is None
+    assert backend.get("c") is None
+    assert len(backend) == 0
+
+  def test_invalidate_by_tag(self):
+    backend = LocalCache()
+    backend.set("a", b"1", 10, ["group:g1", "user:u1"])
+    backend.set("b", b"2", 10, ["group:g2"])
+    assert backend.invalidate(["user:u1", "group:nope"]) == 1
+    assert backend.get("a") is None
+    assert backend.get("b") == b"2"
+
+
+def store_from_child(path):
+  SQLiteCache(path).set("child", b"hello", 60, ["group:g1"])
+
+
+class TestSQLiteCache(object):
+
+  def test_entries_survive_a_restart(self, tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCache(path).set("a", b"1", 60, ["group:g1"])
+    assert SQLiteCache(path).get("a") == b"1"
+
+  def test_ttl_and_size_bound(self, tmp_path):
+    clock = FakeClock()
+    backend = SQLiteCache(
+      str(tmp_path / "cache.db"), max_entries=2, prune_every=1, touch_interval=0, clock=clock
+    )
+    backend.set("a", b"1", 10)
+    clock.now = 1
+    backend.set("b", b"2", 5)
+    clock.now = 2
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3", 10)
+    assert len(backend) == 2
+    assert backend.get("b") is None
+    assert backend.evictions == 1
+
+    clock.now = 20
+    assert backend.get("a") is None
+
+  def test_processes_share_entries_and_invalidations(self, tmp_path):
+    path = str(tmp_path / "cache.db")
+    backend = SQLiteCache(path)
+    child = multiprocessing.get_context("fork").Process(target=store_from_child, args=(path,))
+    child.start()
+    child.join(10)
+    assert backend.get("child") == b"hello"
+    assert SQLiteCache(path).invalidate(["group:g1"]) == 1
+    assert backend.get("child") is None
+
+
+class TestCachingClient(object):
+
+  def test_repeated_reads_hit_the_cache(self, transport):
+    transport.route("group_open_http_svc/get_group_info", lambda body: ok(GroupInfo=[]))
+    transport.route("group_open_http_svc/get_online_member_num", lambda body: ok(OnlineMemberNum=3))
+    cache = ResponseCache()
+    client = cached_client(transport, cache)
+
+    for _ in range(3):
+      assert client.get_group_detail(["g1"]).json()["GroupInfo"] == []
+    client.get_group_detail(["g2"])
+    client.get_online_member_num("g1")
+    client.get_online_member_num("g1")
+
+    assert len(transport.calls) == 3
+    stats = cache.stats.snapshot()
+    assert (stats["hits"], stats["misses"]) == (3, 3)
+
+  def test_failures_and_unlisted_endpoints_are_not_cached(self, transport):
+    transport.route(
+      "group_open_http_svc/get_group_info", lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 10015,
+        "ErrorInfo": "bad"
+      }
+    )
+    transport.route("group_open_http_svc/get_appid_group_list", lambda body: ok())
+    client = cached_client(transport, ResponseCache())
+    client.get_group_detail(["g1"])
+    client.get_group_detail(["g1"])
+    client.get_group()
+    client.get_group()
+    assert len(transport.calls) == 4
+
+  def test_mutations_invalidate_their_group_and_members(self, transport):
+    transport.route("group_open_http_svc/get_group_info", lambda body: ok(GroupInfo=[]))
+    transport.route("group_open_http_svc/get_joined_group_list", lambda body: ok(GroupIdList=[]))
+    transport.route("group_open_http_svc/add_group_member", lambda body: ok(MemberList=[]))
+    transport.route("group_open_http_svc/modify_group_base_info", lambda body: ok())
+    cache = ResponseCache()
+    client = cached_client(transport, cache)
+
+    def reads():
+      client.get_group_detail(["g1", "g2"])
+      client.get_group_detail(["g3"])
+      client.get_joined_groups("user0")
+      client.get_joined_groups("user1")
+
+    reads()
+    client.add_group_member("g2", [GroupMemObj("user0")])
+    client.update_group_baseinfo("g3", group_name="renamed")
+    transport.calls.clear()
+    reads()
+
+    assert [body.get("GroupIdList", body.get("Member_Account")) for _, body in transport.calls
+            ] == [["g1", "g2"], ["g3"], "user0"]
+    assert cache.stats.invalidations == 3
+
+  def test_read_overtaken_by_a_mutation_is_not_stored(self, transport):
+    cache = ResponseCache()
+    client = cached_client(transport, cache)
+    mutated = []
+
+    def group_info(body):
+      # the mutation lands while the read is in flight
+      if not mutated:
+        mutated.append(client.update_group_baseinfo("g1", group_name="renamed"))
+      return ok(GroupInfo=[{"GroupId": "g1"}])
+
+    transport.route("group_open_http_svc/get_group_info", group_info)
+    transport.route("group_open_http_svc/modify_group_base_info", lambda body: ok())
+    client.get_group_detail(["g1"])
+    client.get_group_detail(["g1"])
+    client.get_group_detail(["g1"])
+    assert transport.paths().count("group_open_http_svc/get_group_info") == 2
+
+  def test_explicit_invalidation(self, transport):
+    transport.route("group_open_attr_http_svc/get_group_attr", lambda body: ok(GroupAttrAry=[]))
+    cache = ResponseCache(ttls={"group_open_attr_http_svc/get_group_attr": 60})
+    client = cached_client(transport, cache)
+    client.get_group_attr("g1")
+    assert cache.invalidate_group("g1") == 1
+    client.get_group_attr("g1")
+    assert len(transport.calls) == 2
+
+  def test_async_client(self, transport):
+    transport.route("group_open_http_svc/get_role_in_group", lambda body: ok(UserIdList=[]))
+    client = AsyncTCIMClient(
+      "1400000000",
+      "secret",
+      "admin",
+      transport=FakeAsyncTransport(transport),
+      cache=ResponseCache()
+    )
+
+    async def main():
+      first = await client.get_mem_role_in_group("g1", ["user0"])
+      second = await client.get_mem_role_in_group("g1", ["user0"])
+      return first.json() == second.json()
+
+    assert asyncio.run(main())
+    assert len(transport.calls) == 1
+
+  def test_account_check_shared_through_sqlite(self, transport, tmp_path):
+    transport.route(
+      "im_open_login_svc/account_check",
+      lambda body: ok(ResultItem=[{
+        "UserID": "user0",
+        "AccountStatus": "Imported"
+      }])
+    )
+    transport.route("im_open_login_svc/account_delete", lambda body: ok(ResultItem=[]))
+    path = str(tmp_path / "cache.db")
+    worker0 = cached_client(transport, ResponseCache(backend=SQLiteCache(path)))
+    worker1 = cached_client(transport, ResponseCache(backend=SQLiteCache(path)))
+
+    worker0.search_user(["user0"])
+    assert worker1.search_user(["user0"]).json()["ResultItem"][0]["UserID"] == "user0"
+    worker1.del_user(["user0"])
+    worker0.search_user(["user0"])
+    assert transport.paths() == [
+      "im_open_login_svc/account_check", "im_open_login_svc/account_delete",
+      "im_open_login_svc/account_check"
+    ]
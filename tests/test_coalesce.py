@@ -0,0 +1,209 @@
+import asyncio
+import threading
+
+from conftest import ok
+
+from tencentcloud_im.coalesce import (
+  AccountLoader, GroupDetailLoader, MessageCoalescer, OnlineStatusLoader
+)
+from tencentcloud_im.tcim_client import MessageObj, MessageText
+
+
+def batch_send(body):
+  failed = [account for account in body["To_Account"] if account.endswith("9")]
+  return ok(MsgKey="key", ErrorList=[{"To_Account": a, "ErrorCode": 90011} for a in failed])
+
+
+def message(to_account, text="hi", from_account="admin"):
+  return MessageObj(from_account, to_account, [MessageText(text)])
+
+
+class TestMessageCoalescer(object):
+
+  def test_identical_bodies_share_batchsendmsg(self, client, transport):
+    transport.route("openim/batchsendmsg", batch_send)
+    transport.route("openim/sendmsg", lambda body: ok(MsgKey="single"))
+    coalescer = MessageCoalescer(client, max_delay=10, max_batch=4)
+
+    futures = [coalescer.send_message(message("user{}".format(i))) for i in range(10)]
+    other = coalescer.send_message(message("user0", text="bye"))
+    coalescer.close()
+
+    assert transport.paths().count("openim/batchsendmsg") == 3
+    assert transport.paths().count("openim/sendmsg") == 1
+    assert [len(body["To_Account"]) for path, body in transport.calls if "batch" in path
+            ] == [4, 4, 2]
+    assert futures[0].result() == {
+      "ActionStatus": "OK",
+      "ErrorCode": 0,
+      "ErrorInfo": "",
+      "MsgKey": "key",
+      "MsgTime": None
+    }
+    assert futures[9].result()["ErrorCode"] == 90011
+    assert other.result()["MsgKey"] == "single"
+    assert (coalescer.submitted, coalescer.dispatched) == (11, 4)
+
+  def test_max_delay_sends_partial_batch(self, client, transport):
+    transport.route("openim/batchsendmsg", batch_send)
+    coalescer = MessageCoalescer(client, max_delay=0.01)
+    futures = [coalescer.send_message(message("user{}".format(i))) for i in range(3)]
+
+    assert all(future.result(timeout=5)["ActionStatus"] == "OK" for future in futures)
+    assert transport.paths() == ["openim/batchsendmsg"]
+    coalescer.close()
+
+  def test_repeated_recipient_starts_a_new_batch(self, client, transport):
+    transport.route("openim/sendmsg", lambda body: ok())
+    coalescer = MessageCoalescer(client, max_delay=10)
+    coalescer.send_message(message("user0"))
+    coalescer.send_message(message("user0"))
+    coalescer.close()
+    assert transport.paths() == ["openim/sendmsg", "openim/sendmsg"]
+
+  def test_failed_call_fails_every_recipient(self, client, transport):
+    transport.route(
+      "openim/batchsendmsg", lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 90035,
+        "ErrorInfo": "busy"
+      }
+    )
+    coalescer = MessageCoalescer(client, max_delay=10)
+    futures = [coalescer.send_message(message("user{}".format(i))) for i in range(2)]
+    coalescer.close()
+    assert [future.result()["ErrorInfo"] for future in futures] == ["busy", "busy"]
+
+  def test_async_client(self, async_client, transport):
+    transport.route("openim/batchsendmsg", batch_send)
+
+    async def main():
+      coalescer = MessageCoalescer(async_client, max_delay=0)
+      results = await asyncio.gather(
+        *[coalescer.send_message(message("user{}".format(i))) for i in range(600)]
+      )
+      await coalescer.close()
+      return results
+
+    results = asyncio.run(main())
+    assert [len(body["To_Account"]) for _, body in transport.calls] == [500, 100]
+    assert sum(result["ActionStatus"] == "FAIL" for result in results) == 60
+
+
+def online_status(body):
+  accounts = body["To_Account"]
+  return ok(
+    QueryResult=[{
+      "To_Account": a,
+      "Status": "Online"
+    } for a in accounts if a != "ghost"],
+    ErrorList=[{
+      "To_Account": "ghost",
+      "ErrorCode": 70107
+    }] if "ghost" in accounts else []
+  )
+
+
+class TestKeyLoaders(object):
+
+  def test_online_status_dedupes_and_resolves_each_user(self, client, transport):
+    transport.route("openim/query_online_status", online_status)
+    loader = OnlineStatusLoader(client, max_delay=10)
+    futures = loader.load_many(["user0", "user1", "user0", "ghost"])
+    loader.close()
+
+    assert len(transport.calls) == 1
+    assert transport.calls[0][1]["To_Account"] == ["user0", "user1", "ghost"]
+    assert futures[0].result() == futures[2].result() == {"To_Account": "user0", "Status": "Online"}
+    assert futures[3].result()["ErrorCode"] == 70107
+
+  def test_account_loader_splits_at_limit(self, client, transport):
+    transport.route(
+      "im_open_login_svc/account_check", lambda body: ok(
+        ResultItem=[
+          {
+            "UserID": item["UserID"],
+            "ResultCode": 0,
+            "AccountStatus": "Imported"
+          } for item in body["CheckItem"]
+        ]
+      )
+    )
+    loader = AccountLoader(client, max_delay=10)
+    futures = loader.load_many(["user{}".format(i) for i in range(250)])
+    loader.close()
+
+    assert sorted(len(body["CheckItem"]) for _, body in transport.calls) == [50, 100, 100]
+    assert futures[249].result()["UserID"] == "user249"
+
+  def test_failed_call_gives_every_user_its_error(self, client, transport):
+    transport.route("im_open_login_svc/account_check", lambda body: RuntimeError("down"))
+    loader = AccountLoader(client, max_delay=10)
+    futures = loader.load_many(["user0", "user1"])
+    loader.close()
+    assert futures[1].result() == {"UserID": "user1", "ResultCode": -1, "ResultInfo": "no response"}
+
+  def test_async_loader_batches_one_loop_tick(self, async_client, transport):
+    transport.route("openim/query_online_status", online_status)
+
+    async def handler(user_id, loader):
+      return await loader.load(user_id)
+
+    async def main():
+      loader = OnlineStatusLoader(async_client, max_delay=0)
+      results = await asyncio.gather(*[handler("user{}".format(i % 10), loader) for i in range(50)])
+      await loader.close()
+      return results
+
+    results = asyncio.run(main())
+    assert len(transport.calls) == 1
+    assert results[12] == {"To_Account": "user2", "Status": "Online"}
+
+
+def group_info(body):
+  return ok(
+    GroupInfo=[
+      {
+        "GroupId": group_id,
+        "ErrorCode": 0 if group_id.startswith("@") else 10010,
+        "Filter": body.get("ResponseFilter")
+      } for group_id in body["GroupIdList"]
+    ]
+  )
+
+
+class TestGroupDetailLoader(object):
+
+  def test_chunks_by_filter_set(self, client, transport):
+    transport.route("group_open_http_svc/get_group_info", group_info)
+    loader = GroupDetailLoader(client, max_delay=10)
+    futures = loader.load_many(["@group{}".format(i) for i in range(120)])
+    named = loader.load("@group0", baseInfoFilter=["Name"])
+    missing = loader.load("nope")
+    loader.close()
+
+    sizes = sorted(len(body["GroupIdList"]) for _, body in transport.calls)
+    assert sizes == [1, 21, 50, 50]
+    assert futures[119].result()["GroupId"] == "@group119"
+    assert named.result()["Filter"] == {"GroupBaseInfoFilter": ["Name"]}
+    assert missing.result()["ErrorCode"] == 10010
+
+  def test_in_flight_group_is_not_requested_again(self, client, transport):
+    started, release = threading.Event(), threading.Event()
+
+    def slow(body):
+      started.set()
+      release.wait(5)
+      return group_info(body)
+
+    transport.route("group_open_http_svc/get_group_info", slow)
+    loader = GroupDetailLoader(client, max_delay=0)
+    first = loader.load("@group0")
+    assert started.wait(5)
+    second = loader.load("@group0")
+    release.set()
+
+    assert first.result(timeout=5) == second.result(timeout=5)
+    loader.close()
+    assert len(transport.calls) == 1
+    assert loader.submitted == 2
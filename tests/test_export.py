@@ -0,0 +1,140 @@
+import gzip
+import json
+
+import pytest
+from conftest import ok
+
+from tencentcloud_im.export import (
+  export_app_group_history, export_c2c_history, export_group_history
+)
+from tencentcloud_im.paginate import PageError
+
+
+def roam_pages(total):
+  """
+    admin_getroammsg over messages 0..total-1 sent at time = index, newest first
+    """
+
+  def handler(body):
+    newest = body["MaxTime"] if not body.get("LastMsgKey") else int(body["LastMsgKey"]) - 1
+    times = list(range(newest, max(-1, newest - body["MaxCnt"]), -1))
+    complete = not times or times[-1] == 0
+    return ok(
+      Complete=1 if complete else 0,
+      LastMsgTime=times[-1] if times else 0,
+      LastMsgKey=str(times[-1]) if times else "",
+      MsgList=[{
+        "MsgKey": str(t),
+        "MsgTimeStamp": t
+      } for t in times]
+    )
+
+  return handler
+
+
+def group_pages(body):
+  newest = body.get("ReqMsgSeq", 45)
+  seqs = list(range(newest, max(0, newest - body["ReqMsgNumber"]), -1))
+  return ok(IsFinished=1, RspMsgList=[{"MsgSeq": seq} for seq in seqs])
+
+
+def read_ndjson(path):
+  opener = gzip.open if path.endswith(".gz") else open
+  with opener(path, "rt") as f:
+    return [json.loads(line) for line in f]
+
+
+class TestHistoryExport(object):
+
+  def test_c2c_history_to_gzip(self, client, transport, tmp_path):
+    transport.route("openim/admin_getroammsg", roam_pages(25))
+    path = str(tmp_path / "c2c.ndjson.gz")
+    report = export_c2c_history(client, "user0", "user1", path, max_time=24, page_size=10)
+
+    assert (report.count, report.pages, report.complete) == (25, 3, True)
+    assert [message["MsgTimeStamp"] for message in read_ndjson(path)] == list(range(24, -1, -1))
+    assert export_c2c_history(client, "user0", "user1", path).pages == 0
+
+  def test_group_history_resumes_after_failure(self, client, transport, tmp_path):
+    calls = []
+
+    def flaky(body):
+      calls.append(body.get("ReqMsgSeq"))
+      if len(calls) == 2:
+        return {"ActionStatus": "FAIL", "ErrorCode": 10002, "ErrorInfo": "busy"}
+      return group_pages(body)
+
+    transport.route("group_open_http_svc/group_msg_get_simple", flaky)
+    path = str(tmp_path / "group.ndjson")
+    with pytest.raises(PageError):
+      export_group_history(client, "@group0", path, prefetch=False)
+    assert len(read_ndjson(path)) == 20
+
+    report = export_group_history(client, "@group0", path, prefetch=False)
+    assert report.complete and report.count == 45
+    assert [message["MsgSeq"] for message in read_ndjson(path)] == list(range(45, 0, -1))
+    assert calls == [None, 25, 25, 5]
+
+  def test_data_written_after_the_checkpoint_is_dropped(self, client, transport, tmp_path):
+    transport.route("group_open_http_svc/group_msg_get_simple", group_pages)
+    path = str(tmp_path / "group.ndjson")
+    export_group_history(client, "@group0", path)
+    with open(path, "rb") as f:
+      offset = sum(len(line) for line in f.readlines()[:40])
+    # crashed after writing the last page but before checkpointing it
+    with open(path + ".checkpoint", "w") as f:
+      json.dump({"cursor": 5, "offset": offset, "count": 40, "complete": False}, f)
+
+    assert export_group_history(client, "@group0", path).count == 45
+    assert [message["MsgSeq"] for message in read_ndjson(path)] == list(range(45, 0, -1))
+
+
+def app_groups(body):
+  return ok(GroupIdList=[{"GroupId": "@group{}".format(i)} for i in range(10)], Next=0)
+
+
+class TestAppGroupHistoryExport(object):
+
+  def test_shards_split_the_groups(self, client, transport, tmp_path):
+    transport.route("group_open_http_svc/get_appid_group_list", app_groups)
+    transport.route("group_open_http_svc/group_msg_get_simple", group_pages)
+    out_dir = str(tmp_path)
+
+    shards = [
+      list(export_app_group_history(client, out_dir, shard, 2, max_workers=3)) for shard in (0, 1)
+    ]
+    groups = [record["group_id"] for shard in shards for record in shard]
+    assert sorted(groups) == sorted("@group{}".format(i) for i in range(10))
+    assert all(record["count"] == 45 for shard in shards for record in shard)
+    assert all(shard for shard in shards)
+    assert len(read_ndjson(shards[0][0]["path"])) == 45
+
+  def test_rerun_only_exports_unfinished_groups(self, client, transport, tmp_path):
+    broken = {"@group3"}
+
+    def history(body):
+      if body["GroupId"] in broken:
+        return {"ActionStatus": "FAIL", "ErrorCode": 10002, "ErrorInfo": "busy"}
+      return group_pages(body)
+
+    transport.route("group_open_http_svc/get_appid_group_list", app_groups)
+    transport.route("group_open_http_svc/group_msg_get_simple", history)
+    out_dir = str(tmp_path)
+
+    records = list(export_app_group_history(client, out_dir, compress=False))
+    assert [r["group_id"] for r in records if r["status"] == "failed"] == ["@group3"]
+
+    broken.clear()
+    transport.calls.clear()
+    records = list(export_app_group_history(client, out_dir, compress=False))
+    assert [(r["group_id"], r["status"]) for r in records] == [("@group3", "done")]
+    assert {body.get("GroupId") for _, body in transport.calls} == {None, "@group3"}
+
+  def test_group_file_error_is_recorded_as_failed(self, client, transport, tmp_path):
+    transport.route("group_open_http_svc/get_appid_group_list", app_groups)
+    transport.route("group_open_http_svc/group_msg_get_simple", group_pages)
+    (tmp_path / "%40group3.ndjson").mkdir()
+
+    records = list(export_app_group_history(client, str(tmp_path), compress=False))
+    assert len(records) == 10
+    assert [r["group_id"] for r in records if r["status"] == "failed"] == ["@group3"]
@@ -0,0 +1,170 @@
+import json
+import threading
+
+import pytest
+from conftest import ok
+
+from tencentcloud_im.migrate import C2CMigration, GroupHistoryImport
+from tencentcloud_im.tcim_client import GroupMessageObj, MessageObj, MessageText
+
+
+def history(conversations, per_conversation):
+  records = []
+  for index in range(per_conversation):
+    for conversation in range(conversations):
+      sender, receiver = "user{}".format(conversation), "peer{}".format(conversation)
+      if index % 2:
+        sender, receiver = receiver, sender
+      records.append(
+        {
+          "From_Account": sender,
+          "To_Account": receiver,
+          "MsgBody": [{
+            "MsgType": "TIMTextElem",
+            "MsgContent": {
+              "Text": str(index)
+            }
+          }],
+          "MsgTimeStamp": 1600000000 + index,
+        }
+      )
+  return records
+
+
+class RecordingImport(object):
+
+  def __init__(self, fail=()):
+    self.fail = set(fail)
+    self.lock = threading.Lock()
+    self.seen = {}
+
+  def __call__(self, body):
+    conversation = tuple(sorted((body["From_Account"], body["To_Account"])))
+    with self.lock:
+      self.seen.setdefault(conversation, []).append(body["MsgTimeStamp"])
+    if body["MsgTimeStamp"] in self.fail:
+      return {"ActionStatus": "FAIL", "ErrorCode": 20003, "ErrorInfo": "bad account"}
+    return ok()
+
+
+class TestC2CMigration(object):
+
+  def test_parallel_import_keeps_conversation_order(self, client, transport, tmp_path):
+    handler = RecordingImport(fail=[1600000003])
+    transport.route("openim/importmsg", handler)
+    migration = C2CMigration(client, str(tmp_path / "checkpoint"), max_workers=4, queue_size=2)
+
+    report = migration.run(history(6, 5))
+    assert (report.imported, report.failed, report.offset, report.complete) == (24, 6, 30, True)
+    assert len(handler.seen) == 6
+    assert all(stamps == sorted(stamps) for stamps in handler.seen.values())
+    with open(migration.failed_path) as f:
+      assert [json.loads(line)["ErrorCode"] for line in f] == [20003] * 6
+    assert migration.run(history(6, 5)).imported == 0
+
+  def test_ndjson_source_resumes_from_checkpoint(self, client, transport, tmp_path):
+    source = str(tmp_path / "history.ndjson")
+    records = history(2, 5)
+    with open(source, "w") as f:
+      for record in records:
+        f.write(json.dumps(record) + "\n")
+      f.write("{not json\n")
+    handler = RecordingImport()
+    transport.route("openim/importmsg", handler)
+    checkpoint = str(tmp_path / "checkpoint")
+
+    try:
+      C2CMigration(client, checkpoint, max_workers=2, checkpoint_every=1).run_ndjson(source)
+    except ValueError:
+      pass
+    assert json.load(open(checkpoint))["offset"] == 10
+
+    with open(source, "r+") as f:
+      lines = f.readlines()[:-1]
+      f.seek(0)
+      f.truncate()
+      f.writelines(lines + [json.dumps(record) + "\n" for record in history(1, 1)])
+    report = C2CMigration(client, checkpoint).run_ndjson(source)
+    assert (report.imported, report.offset, report.complete) == (1, 11, True)
+
+  def test_message_objects_get_a_random_stable_across_runs(self, client, transport, tmp_path):
+    transport.route("openim/importmsg", lambda body: ok())
+    for run in range(2):
+      message = MessageObj("user0", "user1", [MessageText("hi")])
+      C2CMigration(client, str(tmp_path / "checkpoint{}".format(run))).run([(message, 1600000000)])
+    assert transport.calls[0][1]["MsgRandom"] == transport.calls[1][1]["MsgRandom"]
+    assert transport.calls[0][1]["MsgTimeStamp"] == 1600000000
+
+  def test_identical_messages_get_distinct_randoms(self, client, transport, tmp_path):
+    transport.route("openim/importmsg", lambda body: ok())
+    record = history(1, 1)[0]
+    C2CMigration(client, str(tmp_path / "checkpoint")).run([record, dict(record)])
+    assert len({body["MsgRandom"] for _, body in transport.calls}) == 2
+
+  def test_worker_error_stops_the_run(self, client, transport, tmp_path):
+    transport.route("openim/importmsg", RecordingImport(fail=[1600000000]))
+    migration = C2CMigration(
+      client, str(tmp_path / "checkpoint"), max_workers=2, queue_size=1, failed_path=str(tmp_path)
+    )
+    with pytest.raises(OSError):
+      migration.run(history(4, 50))
+    state = json.load(open(str(tmp_path / "checkpoint")))
+    assert not state["complete"]
+    assert state["offset"] < 200
+
+
+def group_import(body):
+  results = [
+    {
+      "MsgSeq": i,
+      "MsgTime": message["SendTime"],
+      "Result": 80001 if message["From_Account"] == "spam" else 0
+    } for i, message in enumerate(body["MsgList"])
+  ]
+  return ok(ImportMsgResult=results)
+
+
+class TestGroupHistoryImport(object):
+
+  def test_sorts_with_spilled_runs_and_packs_batches(self, client, transport, tmp_path):
+    transport.route("group_open_http_svc/import_group_msg", group_import)
+    times = [(i * 7919) % 45 for i in range(45)]
+    messages = [
+      {
+        "From_Account": "spam" if t == 30 else "user0",
+        "SendTime": 1600000000 + t,
+        "MsgBody": []
+      } for t in times
+    ]
+    importer = GroupHistoryImport(client, buffer_size=10, tmp_dir=str(tmp_path))
+    report = importer.import_group("@group0", iter(messages))
+
+    assert [len(body["MsgList"]) for _, body in transport.calls] == [20, 20, 5]
+    sent = [m["SendTime"] for _, body in transport.calls for m in body["MsgList"]]
+    assert sent == sorted(sent)
+    assert report.imported == 44
+    assert [failure["SendTime"] for failure in report.failed] == [1600000030]
+    assert list(tmp_path.iterdir()) == []
+
+  def test_identical_messages_get_distinct_randoms(self, client, transport):
+    transport.route("group_open_http_svc/import_group_msg", group_import)
+    message = {"From_Account": "user0", "SendTime": 1600000000, "MsgBody": []}
+    GroupHistoryImport(client).import_group("@group0", [message, dict(message)])
+    assert len({m["Random"] for m in transport.calls[0][1]["MsgList"]}) == 2
+
+  def test_groups_run_in_parallel_and_failed_calls_fail_every_message(self, client, transport):
+
+    def handler(body):
+      if body["GroupId"] == "@broken":
+        return {"ActionStatus": "FAIL", "ErrorCode": 10007, "ErrorInfo": "no permission"}
+      return group_import(body)
+
+    transport.route("group_open_http_svc/import_group_msg", handler)
+    messages = [GroupMessageObj("user0", 1600000000 + i, [MessageText("hi")]) for i in range(3)]
+    groups = {"@group{}".format(i): list(reversed(messages)) for i in range(3)}
+    groups["@broken"] = messages
+    reports = GroupHistoryImport(client).run(groups)
+
+    assert [reports["@group{}".format(i)].imported for i in range(3)] == [3, 3, 3]
+    assert [failure["Result"] for failure in reports["@broken"].failed] == [10007] * 3
+    assert not reports["@broken"].ok
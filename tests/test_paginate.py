@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from conftest import ok
+
+from tencentcloud_im.paginate import PageError
+
+
+def friend_pages(body):
+  start = body["StartIndex"]
+  items = [{"To_Account": "user{}".format(i)} for i in range(start, min(start + 3, 7))]
+  complete = start + 3 >= 7
+  return ok(
+    UserDataItem=items,
+    CompleteFlag=1 if complete else 0,
+    NextStartIndex=0 if complete else start + 3
+  )
+
+
+def app_group_pages(body):
+  start = body["Next"]
+  items = [{"GroupId": "@group{}".format(i)} for i in range(start, min(start + body["Limit"], 5))]
+  return ok(GroupIdList=items, Next=0 if start + body["Limit"] >= 5 else start + body["Limit"])
+
+
+def member_pages(body):
+  offset, limit = body.get("Offset", 0), body["Limit"]
+  members = [{"Member_Account": "user{}".format(i)} for i in range(offset, min(offset + limit, 5))]
+  return ok(MemberNum=5, MemberList=members)
+
+
+def community_member_pages(body):
+  cursor = int(body.get("Next", "0"))
+  members = [{"Member_Account": "user{}".format(i)} for i in range(cursor, min(cursor + 2, 5))]
+  return ok(MemberList=members, Next=str(cursor + 2) if cursor + 2 < 5 else "")
+
+
+class TestIterators(object):
+
+  def test_iter_friends(self, client, transport):
+    transport.route("sns/friend_get", friend_pages)
+    friends = [friend["To_Account"] for friend in client.iter_friends("admin")]
+    assert friends == ["user{}".format(i) for i in range(7)]
+    assert [body["StartIndex"] for _, body in transport.calls] == [0, 3, 6]
+
+  def test_iter_app_groups_is_lazy(self, client, transport):
+    transport.route("group_open_http_svc/get_appid_group_list", app_group_pages)
+    groups = client.iter_app_groups(page_size=2)
+    assert next(groups)["GroupId"] == "@group0"
+    assert len(transport.calls) == 1
+    assert [group["GroupId"] for group in groups] == ["@group{}".format(i) for i in range(1, 5)]
+    assert len(transport.calls) == 3
+
+  def test_iter_group_members_by_offset_with_prefetch(self, client, transport):
+    transport.route("group_open_http_svc/get_group_member_info", member_pages)
+    members = list(client.iter_group_members("@group0", page_size=2, prefetch=True))
+    assert [member["Member_Account"] for member in members
+            ] == ["user0", "user1", "user2", "user3", "user4"]
+    assert [body.get("Offset", 0) for _, body in transport.calls] == [0, 2, 4]
+
+  def test_iter_group_members_by_next(self, client, transport):
+    transport.route("group_open_http_svc/get_group_member_info", community_member_pages)
+    members = list(client.iter_group_members("@community", page_size=2))
+    assert len(members) == 5
+    assert [body.get("Next") for _, body in transport.calls] == [None, "2", "4"]
+
+  def test_iter_joined_groups_raises_on_failed_page(self, client, transport):
+    pages = [
+      ok(TotalCount=3, GroupIdList=[{
+        "GroupId": "@group0"
+      }, {
+        "GroupId": "@group1"
+      }]), {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 10004,
+        "ErrorInfo": "bad"
+      }
+    ]
+    transport.route("group_open_http_svc/get_joined_group_list", lambda body: pages.pop(0))
+    groups = client.iter_joined_groups("user0", page_size=2)
+    assert [next(groups)["GroupId"], next(groups)["GroupId"]] == ["@group0", "@group1"]
+    with pytest.raises(PageError) as error:
+      next(groups)
+    assert error.value.code == 10004
+
+  def test_async_iterators(self, async_client, transport):
+    transport.route("sns/friend_get", friend_pages)
+    transport.route(
+      "group_open_http_svc/get_joined_group_list",
+      lambda body: ok(TotalCount=1, GroupIdList=[{
+        "GroupId": "@group0"
+      }])
+    )
+
+    async def main():
+      friends = [friend async for friend in async_client.iter_friends("admin", prefetch=True)]
+      groups = [group async for group in async_client.iter_joined_groups("user0")]
+      return len(friends), groups
+
+    assert asyncio.run(main()) == (7, [{"GroupId": "@group0"}])
@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from conftest import FakeAsyncTransport, ok
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.ratelimit import RateLimiter, RedisBackend, SharedFileBackend, TokenBucket
+from tencentcloud_im.tcim_client import TCIMClient
+
+
+class FakeClock(object):
+
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class TestTokenBucket(object):
+
+  def test_burst_then_paced(self):
+    clock = FakeClock()
+    bucket = TokenBucket(10, capacity=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert abs(bucket.reserve() - 0.1) < 1e-9
+    assert abs(bucket.reserve() - 0.2) < 1e-9
+    clock.now = 1.0
+    assert bucket.reserve() == 0
+
+
+class TestRateLimiter(object):
+
+  def test_rules_match_path_then_family_then_default(self):
+    limiter = RateLimiter({"group_open_http_svc/*": (5, 10), "*": 0})
+    assert limiter.rule("openim/sendmsg") == (200, 200)
+    assert limiter.rule("group_open_http_svc/get_group_info") == (5, 10)
+    assert limiter.rule("unknown/path") == (0, 1)
+    assert limiter.reserve("unknown/path") == 0
+
+  def test_each_endpoint_gets_its_own_bucket(self):
+    limiter = RateLimiter({"openim/*": 1})
+    assert limiter.reserve("openim/a") == 0
+    assert limiter.reserve("openim/b") == 0
+    assert limiter.reserve("openim/a") > 0.9
+
+  def test_client_calls_are_paced(self, transport):
+    transport.route("openim/query_online_status", lambda body: ok())
+    limiter = RateLimiter({"openim/query_online_status": (50, 1)})
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, rate_limiter=limiter)
+    start = time.monotonic()
+    for _ in range(6):
+      client.check_user_online(["user0"])
+    assert time.monotonic() - start >= 0.09
+    assert limiter.waited > 0
+
+  def test_async_client_waits_without_blocking(self, transport):
+    transport.route("openim/query_online_status", lambda body: ok())
+    limiter = RateLimiter({"openim/query_online_status": (100, 1)})
+    client = AsyncTCIMClient(
+      "1400000000",
+      "secret",
+      "admin",
+      transport=FakeAsyncTransport(transport),
+      rate_limiter=limiter
+    )
+
+    async def run():
+      start = time.monotonic()
+      await asyncio.gather(*[client.check_user_online(["user0"]) for _ in range(6)])
+      return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.045
+    assert len(transport.calls) == 6
+
+  def test_blocking_backend_runs_off_the_event_loop(self):
+    threads = []
+
+    class ThreadRecordingBackend(object):
+
+      def reserve(self, key, rate, capacity, tokens=1):
+        threads.append(threading.current_thread())
+        return 0.0
+
+    limiter = RateLimiter(backend=ThreadRecordingBackend())
+    asyncio.run(limiter.acquire_async("openim/sendmsg"))
+    assert threads and threads[0] is not threading.current_thread()
+
+    local = RateLimiter({"openim/sendmsg": (10, 2)})
+    assert asyncio.run(local.reserve_async("openim/sendmsg")) == 0
+
+
+def reserve_from_worker(path, count, queue):
+  limiter = RateLimiter({"openim/sendmsg": (10, 1)}, backend=SharedFileBackend(path))
+  queue.put([limiter.reserve("openim/sendmsg") for _ in range(count)])
+
+
+class TestSharedBackends(object):
+
+  def test_file_backend_is_shared_across_processes(self, tmp_path):
+    path = str(tmp_path / "ratelimit")
+    SharedFileBackend(path)
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [
+      context.Process(target=reserve_from_worker, args=(path, 10, queue)) for _ in range(4)
+    ]
+    for worker in workers:
+      worker.start()
+    waits = []
+    for _ in workers:
+      waits.extend(queue.get(timeout=10))
+    for worker in workers:
+      worker.join()
+
+    # 40 calls against one 10/s budget: the last caller waits ~3.9s, not ~0.9s
+    assert len(waits) == 40
+    assert max(waits) > 3.5
+    assert os.path.getsize(path) == 256 * SharedFileBackend.SLOT.size
+
+  def test_file_backend_keeps_buckets_apart(self, tmp_path):
+    backend = SharedFileBackend(str(tmp_path / "ratelimit"), slots=4)
+    assert backend.reserve("a", 1, 1) == 0
+    assert backend.reserve("b", 1, 1) == 0
+    assert backend.reserve("a", 1, 1) > 0.9
+    backend.close()
+
+  def test_redis_backend(self):
+    fakeredis = pytest.importorskip("fakeredis")
+    limiter = RateLimiter({"openim/sendmsg": (10, 2)}, backend=RedisBackend(fakeredis.FakeRedis()))
+    waits = [limiter.reserve("openim/sendmsg") for _ in range(4)]
+    assert waits[:2] == [0, 0]
+    assert 0.15 < waits[3] <= 0.2
+
+  def test_redis_backend_async_client(self):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    backend = RedisBackend(
+      fakeredis.FakeRedis(server=server), async_client=fakeredis.FakeAsyncRedis(server=server)
+    )
+    limiter = RateLimiter({"openim/sendmsg": (10, 2)}, backend=backend)
+
+    async def run():
+      return [await limiter.reserve_async("openim/sendmsg") for _ in range(3)]
+
+    waits = asyncio.run(run())
+    assert waits[:2] == [0, 0]
+    assert 0.05 < waits[2] <= 0.1
+    assert 0.15 < limiter.reserve("openim/sendmsg") <= 0.2
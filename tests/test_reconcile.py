@@ -0,0 +1,278 @@
+from conftest import ok
+
+from tencentcloud_im.paginate import PageError
+from tencentcloud_im.reconcile import FriendReconciler, MembershipReconciler
+from tencentcloud_im.requeue import UNSPECIFIED_ERROR_CODE
+from tencentcloud_im.tcim_client import FriendObj, GroupMemObj
+
+CURRENT = [
+  {
+    "Member_Account": "owner",
+    "Role": "Owner",
+    "NameCard": ""
+  },
+  {
+    "Member_Account": "keep",
+    "Role": "Member",
+    "NameCard": ""
+  },
+  {
+    "Member_Account": "promote",
+    "Role": "Member",
+    "NameCard": ""
+  },
+  {
+    "Member_Account": "stale",
+    "Role": "Admin",
+    "NameCard": ""
+  },
+] + [{
+  "Member_Account": "gone{}".format(i),
+  "Role": "Member",
+  "NameCard": ""
+} for i in range(150)]
+
+
+def current_pages(body):
+  offset, limit = body.get("Offset", 0), body["Limit"]
+  return ok(MemberNum=len(CURRENT), MemberList=CURRENT[offset:offset + limit])
+
+
+def add_handler(body):
+  return ok(
+    MemberList=[{
+      "Member_Account": m["Member_Account"],
+      "Result": 1
+    } for m in body["MemberList"]]
+  )
+
+
+def desired():
+  admin = GroupMemObj("promote", "Admin")
+  carded = GroupMemObj("newbie")
+  carded.NameCard = "hello"
+  return ["owner", "keep", admin, carded, GroupMemObj("new_admin", "Admin")]
+
+
+def route(transport, delete=None, modify=None):
+  transport.route("group_open_http_svc/get_group_member_info", current_pages)
+  transport.route("group_open_http_svc/add_group_member", add_handler)
+  transport.route("group_open_http_svc/delete_group_member", delete or (lambda body: ok()))
+  transport.route("group_open_http_svc/modify_group_member_info", modify or (lambda body: ok()))
+
+
+class TestMembershipReconciler(object):
+
+  def test_dry_run_plans_minimal_calls(self, client, transport):
+    route(transport)
+    plan = MembershipReconciler(client).reconcile("@group0", desired(), dry_run=True)
+
+    assert set(transport.paths()) == {"group_open_http_svc/get_group_member_info"}
+    assert plan.to_add == ["newbie", "new_admin"]
+    assert plan.to_delete == ["stale"] + ["gone{}".format(i) for i in range(150)]
+    assert plan.to_update == {
+      "promote": {
+        "Role": "Admin"
+      },
+      "newbie": {
+        "NameCard": "hello"
+      },
+      "new_admin": {
+        "Role": "Admin"
+      },
+    }
+    assert plan.unchanged == 2
+    assert plan.as_dict()["add"] == ["newbie", "new_admin"]
+
+  def test_apply_chunks_deletes_and_updates_changed_members(self, client, transport):
+    route(transport)
+    result = MembershipReconciler(client, max_workers=2).reconcile("@group0", desired())
+
+    assert result.ok
+    deletes = [body for path, body in transport.calls if path.endswith("delete_group_member")]
+    assert sorted(len(body["MemberToDel_Account"]) for body in deletes) == [51, 100]
+    adds = [body for path, body in transport.calls if path.endswith("add_group_member")]
+    assert [[m["Member_Account"] for m in body["MemberList"]] for body in adds
+            ] == [["newbie", "new_admin"]]
+    updates = {
+      body["Member_Account"]: body
+      for path, body in transport.calls
+      if path.endswith("modify_group_member_info")
+    }
+    assert updates["promote"]["Role"] == "Admin"
+    assert updates["newbie"]["NameCard"] == "hello"
+    assert set(updates) == {"promote", "newbie", "new_admin"}
+
+  def test_failures_are_reported_per_account(self, client, transport):
+    route(
+      transport,
+      delete=lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 10004,
+        "ErrorInfo": ""
+      },
+      modify=lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 10003,
+        "ErrorInfo": ""
+      } if body["Member_Account"] == "promote" else ok()
+    )
+    result = MembershipReconciler(client).reconcile("@group0", desired())
+
+    assert not result.ok
+    assert result.failed["stale"] == 10004
+    assert result.failed["promote"] == 10003
+    assert len(result.failed) == 152
+
+  def test_refused_and_pending_adds(self, client, transport):
+    route(transport)
+    transport.route(
+      "group_open_http_svc/add_group_member", lambda body: ok(
+        MemberList=[
+          {
+            "Member_Account": "newbie",
+            "Result": 0
+          },
+          {
+            "Member_Account": "new_admin",
+            "Result": 3
+          },
+        ]
+      )
+    )
+    result = MembershipReconciler(client).reconcile("@group0", desired())
+
+    assert result.failed["newbie"] == UNSPECIFIED_ERROR_CODE
+    assert "new_admin" not in result.failed
+    assert result.pending == ["new_admin"]
+    updated = [
+      body["Member_Account"]
+      for path, body in transport.calls
+      if path.endswith("modify_group_member_info")
+    ]
+    assert updated == ["promote"]
+
+  def test_in_sync_group_makes_no_writes(self, client, transport):
+    route(transport)
+    accounts = [m["Member_Account"] for m in CURRENT if m["Role"] != "Admin"]
+    plan = MembershipReconciler(client).plan("@group0", accounts + [GroupMemObj("stale", "Admin")])
+
+    assert plan.empty
+
+
+def friend(account, remark="", groups=()):
+  tags = [{"Tag": "Tag_SNS_IM_AddSource", "Value": "AddSource_Type_Server"}]
+  if remark:
+    tags.append({"Tag": "Tag_SNS_IM_Remark", "Value": remark})
+  if groups:
+    tags.append({"Tag": "Tag_SNS_IM_Group", "Value": list(groups)})
+  return {"To_Account": account, "ValueItem": tags}
+
+
+FRIENDS = [
+  friend("keep"),
+  friend("renamed", "old"),
+  friend("regrouped", "", ["a"]),
+  friend("mate", "m"),
+] + [friend("gone{}".format(i)) for i in range(120)]
+
+
+def friend_pages(body):
+  start = body["StartIndex"]
+  items = FRIENDS[start:start + 50]
+  complete = start + 50 >= len(FRIENDS)
+  return ok(
+    UserDataItem=items,
+    CompleteFlag=1 if complete else 0,
+    NextStartIndex=0 if complete else start + 50
+  )
+
+
+def result_items(field):
+
+  def handler(body):
+    items = body[field]
+    accounts = [item if isinstance(item, str) else item["To_Account"] for item in items]
+    return ok(ResultItem=[{"To_Account": account, "ResultCode": 0} for account in accounts])
+
+  return handler
+
+
+def route_friends(transport, add=None):
+  transport.route("sns/friend_get", friend_pages)
+  transport.route("sns/friend_add", add or result_items("AddFriendItem"))
+  transport.route("sns/friend_delete", result_items("To_Account"))
+  transport.route("sns/friend_update", result_items("UpdateItem"))
+
+
+def desired_friends():
+  return [
+    "keep", "mate",
+    FriendObj("renamed", "Server", remark="new"),
+    FriendObj("regrouped", "Server", group_name="b"),
+    FriendObj("fresh", "Server", remark="hi", group_name="b")
+  ]
+
+
+class TestFriendReconciler(object):
+
+  def test_plan_diffs_friends_and_tags(self, client, transport):
+    route_friends(transport)
+    plan = FriendReconciler(client).reconcile("user0", desired_friends(), dry_run=True)
+
+    assert set(transport.paths()) == {"sns/friend_get"}
+    assert plan.as_dict()["add"] == ["fresh"]
+    assert plan.to_delete == ["gone{}".format(i) for i in range(120)]
+    assert plan.to_update == {
+      "renamed": {
+        "Tag_SNS_IM_Remark": "new"
+      },
+      "regrouped": {
+        "Tag_SNS_IM_Group": ["b"]
+      },
+    }
+    assert plan.unchanged == 2
+
+  def test_apply_issues_chunked_calls(self, client, transport):
+    route_friends(transport)
+    result = FriendReconciler(client).reconcile("user0", desired_friends())
+
+    assert result.ok
+    deletes = [body for path, body in transport.calls if path == "sns/friend_delete"]
+    assert [len(body["To_Account"]) for body in deletes] == [100, 20]
+    add = [body for path, body in transport.calls if path == "sns/friend_add"][0]
+    assert add["AddFriendItem"][0]["Remark"] == "hi"
+    update = [body for path, body in transport.calls if path == "sns/friend_update"][0]
+    assert update["UpdateItem"][0] == {
+      "To_Account": "renamed",
+      "SnsItem": [{
+        "Tag": "Tag_SNS_IM_Remark",
+        "Value": "new"
+      }]
+    }
+
+  def test_reconcile_many_runs_users_in_parallel(self, client, transport):
+    route_friends(
+      transport, add=lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 30001,
+        "ErrorInfo": ""
+      }
+    )
+    users = {"user{}".format(i): desired_friends() for i in range(6)}
+    outcomes = dict(FriendReconciler(client, max_workers=3).reconcile_many(users))
+
+    assert sorted(outcomes) == sorted(users)
+    assert all(outcome.failed == {"fresh": 30001} for outcome in outcomes.values())
+
+  def test_reconcile_many_reports_page_errors(self, client, transport):
+    transport.route(
+      "sns/friend_get", lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 30001,
+        "ErrorInfo": ""
+      }
+    )
+    outcomes = dict(FriendReconciler(client).reconcile_many([("user0", ["user1"])], dry_run=True))
+
+    assert isinstance(outcomes["user0"], PageError)
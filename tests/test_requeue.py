@@ -0,0 +1,114 @@
+import asyncio
+
+from conftest import ok
+
+from tencentcloud_im.requeue import AWAITING_APPROVAL_CODE, UNSPECIFIED_ERROR_CODE, BatchRequeue
+from tencentcloud_im.retry import RetryPolicy
+from tencentcloud_im.tcim_client import BatchMessageObj, FriendObj, GroupMemObj, MessageText
+
+
+def requeue(client, **kwargs):
+  return BatchRequeue(client, policy=RetryPolicy(base_delay=0.001, max_delay=0.001), **kwargs)
+
+
+class TestBatchRequeue(object):
+
+  def test_only_failed_accounts_are_resubmitted(self, client, transport):
+    failures = {"user1": 2, "user2": 1}
+
+    def handler(body):
+      failed = []
+      for account in body["Accounts"]:
+        if failures.get(account, 0) > 0:
+          failures[account] -= 1
+          failed.append(account)
+      return ok(FailAccounts=failed)
+
+    transport.route("im_open_login_svc/multiaccount_import", handler)
+    report = requeue(client).batch_add_users(["user0", "user1", "user2"])
+
+    assert [body["Accounts"] for _, body in transport.calls] == [
+      ["user0", "user1", "user2"],
+      ["user1", "user2"],
+      ["user1"],
+    ]
+    assert report.ok
+    assert report.rounds == 3
+    assert report.outcomes["user1"].attempts == 3
+
+  def test_fatal_item_codes_are_not_resubmitted(self, client, transport):
+
+    def handler(body):
+      items = []
+      for friend in body["AddFriendItem"]:
+        code = {"id2": 30006, "id3": 90035}.get(friend["To_Account"], 0)
+        items.append({"To_Account": friend["To_Account"], "ResultCode": code, "ResultInfo": ""})
+      return ok(ResultItem=items)
+
+    transport.route("sns/friend_add", handler)
+    friends = [FriendObj("id{}".format(i), "Web") for i in range(1, 4)]
+    report = requeue(client, max_rounds=2).add_friend("admin", friends)
+
+    assert [len(body["AddFriendItem"]) for _, body in transport.calls] == [3, 1]
+    assert report.failed == ["id2", "id3"]
+    assert report.outcomes["id2"].attempts == 1
+    assert report.outcomes["id3"].code == 90035
+
+  def test_add_group_member_results(self, client, transport):
+
+    def handler(body):
+      results = []
+      for member in body["MemberList"]:
+        account = member["Member_Account"]
+        results.append({"Member_Account": account, "Result": 0 if account == "b" else 2})
+      return ok(MemberList=results)
+
+    transport.route("group_open_http_svc/add_group_member", handler)
+    members = [GroupMemObj("a"), GroupMemObj("b")]
+    report = requeue(client, retry_unspecified=False).add_group_member("@TGS#1", members)
+    assert len(transport.calls) == 1
+    assert report.outcomes["a"].ok
+    assert report.outcomes["b"].code == UNSPECIFIED_ERROR_CODE
+
+  def test_members_awaiting_approval_are_final(self, client, transport):
+    transport.route(
+      "group_open_http_svc/add_group_member",
+      lambda body: ok(MemberList=[{
+        "Member_Account": "a",
+        "Result": 3
+      }])
+    )
+    report = requeue(client).add_group_member("@TGS#1", [GroupMemObj("a")])
+    assert len(transport.calls) == 1
+    assert report.outcomes["a"].code == AWAITING_APPROVAL_CODE
+    assert report.pending == ["a"]
+    assert report.failed == []
+    assert report.ok
+
+  def test_transient_batch_send_error_is_not_resubmitted(self, client, transport):
+    transport.route(
+      "openim/batchsendmsg", lambda body: {
+        "ActionStatus": "FAIL",
+        "ErrorCode": 70169,
+        "ErrorInfo": "timeout"
+      }
+    )
+    message = BatchMessageObj("admin", ["u0"], [MessageText("hi")])
+    report = requeue(client).batch_send_message(message)
+    assert len(transport.calls) == 1
+    assert report.outcomes["u0"].code == 70169
+
+  def test_lost_batch_send_is_not_resubmitted(self, client, transport):
+    transport.route("openim/batchsendmsg", lambda body: ValueError("timeout"))
+    message = BatchMessageObj("admin", ["u0", "u1"], [MessageText("hi")])
+    report = requeue(client).batch_send_message(message)
+    assert len(transport.calls) == 1
+    assert report.failed == ["u0", "u1"]
+
+  def test_async_client(self, async_client, transport):
+    errors = [[{"To_Account": "u1", "ErrorCode": 90035}], []]
+    transport.route("openim/batchsendmsg", lambda body: ok(ErrorList=errors.pop(0)))
+    message = BatchMessageObj("admin", ["u0", "u1"], [MessageText("hi")])
+    report = asyncio.run(requeue(async_client).batch_send_message(message))
+    assert [body["To_Account"] for _, body in transport.calls] == [["u0", "u1"], ["u1"]]
+    assert report.ok
@@ -0,0 +1,98 @@
+import asyncio
+
+import requests
+from conftest import FakeAsyncTransport, ok
+
+from tencentcloud_im.async_client import AsyncTCIMClient
+from tencentcloud_im.retry import FATAL, REJECTED, TRANSIENT, RetryPolicy
+from tencentcloud_im.tcim_client import MessageObj, MessageText, TCIMClient
+
+
+def fail(code):
+  return {"ActionStatus": "FAIL", "ErrorCode": code, "ErrorInfo": "error"}
+
+
+def scripted(*results):
+  results = list(results)
+  return lambda body: results.pop(0)
+
+
+def fast_policy(**kwargs):
+  return RetryPolicy(base_delay=0.001, max_delay=0.002, **kwargs)
+
+
+class TestRetryPolicy(object):
+
+  def test_classification(self):
+    policy = RetryPolicy()
+    assert policy.classify_code(90035) == REJECTED
+    assert policy.classify_code(70169) == TRANSIENT
+    assert policy.classify_code(70107) == FATAL
+    assert policy.classify(error=requests.exceptions.ConnectTimeout())[0] == REJECTED
+    assert policy.classify(error=requests.exceptions.ReadTimeout()) == (TRANSIENT, "ReadTimeout")
+
+  def test_backoff_is_capped(self):
+    policy = RetryPolicy(base_delay=1, max_delay=3)
+    assert all(0 <= policy.delay(10) <= 3 for _ in range(100))
+    assert all(0 <= policy.delay(1) <= 1 for _ in range(100))
+
+
+class TestRetryingClient(object):
+
+  def test_transient_error_is_retried(self, transport):
+    transport.route("openim/query_online_status", scripted(fail(70169), fail(90035), ok()))
+    policy = fast_policy()
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, retry_policy=policy)
+
+    assert client.check_user_online(["user0"]).json()["ActionStatus"] == "OK"
+    assert len(transport.calls) == 3
+    stats = policy.stats.snapshot()
+    assert stats["retries"] == 2
+    assert stats["reasons"] == {"ErrorCode:70169": 1, "ErrorCode:90035": 1}
+
+  def test_fatal_error_is_returned_at_once(self, transport):
+    transport.route("openim/query_online_status", scripted(fail(70107)))
+    client = TCIMClient(
+      "1400000000", "secret", "admin", transport=transport, retry_policy=fast_policy()
+    )
+    assert client.check_user_online(["user0"]).json()["ErrorCode"] == 70107
+    assert len(transport.calls) == 1
+
+  def test_non_idempotent_call_only_retried_when_rejected(self, transport):
+    transport.route("openim/sendmsg", scripted(fail(90035), fail(70169), ok()))
+    policy = fast_policy()
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, retry_policy=policy)
+    message = MessageObj("admin", "user0", [MessageText("hi")])
+
+    assert client.send_message(message).json()["ErrorCode"] == 70169
+    assert len(transport.calls) == 2
+    assert policy.stats.gave_up == 1
+
+  def test_exhausted_exceptions_keep_returning_none(self, transport):
+    transport.route("openim/query_online_status", lambda body: requests.exceptions.ReadTimeout())
+    policy = fast_policy(max_attempts=3)
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, retry_policy=policy)
+
+    assert client.check_user_online(["user0"]) is None
+    assert len(transport.calls) == 3
+    assert policy.stats.gave_up == 1
+
+  def test_deadline_stops_retries(self, transport):
+    transport.route("openim/query_online_status", lambda body: fail(70169))
+    policy = RetryPolicy(max_attempts=100, base_delay=0.05, max_delay=0.05, deadline=0.01)
+    client = TCIMClient("1400000000", "secret", "admin", transport=transport, retry_policy=policy)
+    client.check_user_online(["user0"])
+    assert len(transport.calls) < 100
+
+  def test_async_retry(self, transport):
+    transport.route("openim/query_online_status", scripted(fail(60006), ok()))
+    client = AsyncTCIMClient(
+      "1400000000",
+      "secret",
+      "admin",
+      transport=FakeAsyncTransport(transport),
+      retry_policy=fast_policy()
+    )
+    response = asyncio.run(client.check_user_online(["user0"]))
+    assert response.json()["ActionStatus"] == "OK"
+    assert len(transport.calls) == 2
@@ -0,0 +1,72 @@
+from tencentcloud_im.executor import FanoutExecutor, RecordingExecutor
+from tencentcloud_im.tcim_client import GroupMemObj, TCIMClient
+from tencentcloud_im.transport import PooledTransport
+
+
+class FakeSession(object):
+
+  def __init__(self):
+    self.headers = {}
+    self.calls = []
+    self.closed = False
+
+  def post(self, url, params=None, data=None, headers=None, timeout=None):
+    self.calls.append((url, params, data, timeout, headers))
+    return "response"
+
+  def close(self):
+    self.closed = True
+
+
+class TestPooledTransport(object):
+
+  def test_default_session_mounts_pooled_adapter(self):
+    transport = PooledTransport(pool_connections=2, pool_maxsize=7)
+    adapter = transport.session.get_adapter("https://console.tim.qq.com/v4")
+    assert adapter._pool_maxsize == 7
+    assert adapter._pool_connections == 2
+    transport.close()
+
+  def test_client_shares_injected_session(self):
+    session = FakeSession()
+    transport = PooledTransport(timeout=3, keep_alive=False, session=session)
+    with TCIMClient("1400000000", "secret", "admin", transport=transport) as client:
+      client.abolition_user_sig("user0")
+      client.search_user(["user0"])
+
+    assert session.headers == {}
+    assert session.calls[0][4] == {"Connection": "close"}
+    assert len(session.calls) == 2
+    assert session.calls[0][0].endswith("/im_open_login_svc/kick")
+    assert session.calls[1][3] == 3
+    assert session.closed
+
+
+class TestExecutors(object):
+
+  def test_recording_executor_builds_without_io(self):
+    session = FakeSession()
+    client = TCIMClient("1400000000", "secret", "admin", transport=PooledTransport(session=session))
+    builder = client.with_executor(RecordingExecutor())
+    request = builder.add_group_member("@TGS#1", [GroupMemObj("user0")])
+
+    assert session.calls == []
+    assert request.path == "group_open_http_svc/add_group_member"
+    assert request.family == "group_open_http_svc"
+    assert request.params["usersig"] == client.user_sig
+    assert request.json()["MemberList"] == [{"Member_Account": "user0"}]
+    assert builder.executor.requests == [request]
+
+    client.executor.execute(request)
+    assert session.calls[0][0] == request.url
+    assert session.calls[0][2] == request.body
+
+  def test_fanout_executor_returns_futures(self):
+    session = FakeSession()
+    client = TCIMClient("1400000000", "secret", "admin", transport=PooledTransport(session=session))
+    fanout = client.with_executor(FanoutExecutor(client.executor, max_workers=4))
+    futures = [fanout.search_user(["user{}".format(i)]) for i in range(10)]
+
+    assert [f.result() for f in futures] == ["response"] * 10
+    assert len(session.calls) == 10
+    fanout.executor.close()
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from tencentcloud_im.usersig import AdminSigManager, UserSigGenerator
+
+
+class FakeClock(object):
+
+  def __init__(self, now=1000.0):
+    self.now = now
+
+  def __call__(self):
+    return self.now
+
+
+class CountingSigner(object):
+
+  def __init__(self, delay=0):
+    self.count = 0
+    self.delay = delay
+    self.lock = threading.Lock()
+
+  def gen_sig(self, identifier, expire):
+    time.sleep(self.delay)
+    with self.lock:
+      self.count += 1
+      return "{}-{}-{}".format(identifier, expire, self.count)
+
+
+class TestAdminSigManager(object):
+
+  def test_sig_is_cached_until_refresh_window(self):
+    clock = FakeClock()
+    signer = CountingSigner()
+    manager = AdminSigManager(1400000000, "k", "admin", 300, signer=signer, clock=clock)
+
+    assert manager.remaining() == 0
+    sig = manager.get()
+    clock.now += 200
+    assert manager.get() == sig
+    assert signer.count == 1
+    assert manager.remaining() == 100
+
+  def test_refresh_runs_in_background(self):
+    clock = FakeClock()
+    signer = CountingSigner()
+    manager = AdminSigManager(1400000000, "k", "admin", 300, signer=signer, clock=clock)
+    first = manager.get()
+    clock.now += 250
+
+    assert manager.get() == first
+    for _ in range(100):
+      if manager.get() != first:
+        break
+      time.sleep(0.01)
+    assert manager.get() == "admin-300-2"
+    assert manager.remaining() == 300
+
+  def test_expired_sig_is_signed_once_under_concurrency(self):
+    signer = CountingSigner(delay=0.05)
+    manager = AdminSigManager(1400000000, "k", "admin", 300, signer=signer)
+    sigs = []
+    threads = [threading.Thread(target=lambda: sigs.append(manager.get())) for _ in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    assert signer.count == 1
+    assert set(sigs) == {"admin-300-1"}
+
+
+class TestUserSigGenerator(object):
+
+  def test_bulk_sigs_are_cached_per_age_bucket(self):
+    clock = FakeClock(now=0)
+    signer = CountingSigner()
+    generator = UserSigGenerator(1400000000, "k", max_age=60, signer=signer, clock=clock)
+
+    sigs = generator.gen_many(["u0", "u1", "u0"], 600)
+    assert sorted(sigs) == ["u0", "u1"]
+    assert signer.count == 2
+    assert generator.gen("u1", 600) == sigs["u1"]
+    clock.now = 61
+    assert generator.gen("u1", 600) != sigs["u1"]
+    assert generator.cache_info()["hits"] == 1
+
+  def test_short_expiry_is_not_served_past_half_its_validity(self):
+    clock = FakeClock(now=0)
+    generator = UserSigGenerator(1400000000, "k", signer=CountingSigner(), clock=clock)
+
+    sig = generator.gen("u", 60)
+    clock.now = 29
+    assert generator.gen("u", 60) == sig
+    clock.now = 30
+    assert generator.gen("u", 60) != sig
+    clock.now = 3000
+    assert generator.gen("u", 60) != sig
+
+  def test_lru_eviction(self):
+    generator = UserSigGenerator(1400000000, "k", cache_size=2, signer=CountingSigner())
+    generator.gen_many(["u0", "u1"], 600)
+    generator.gen("u0", 600)
+    generator.gen("u2", 600)
+    assert generator.cache_info()["size"] == 2
+    generator.gen("u0", 600)
+    generator.gen("u1", 600)
+    assert generator.cache_info()["misses"] == 4
+
+  def test_process_pool_signs_valid_sigs(self):
+    generator = UserSigGenerator(1400000000, "secret", processes=2, pool_threshold=10)
+    try:
+      sigs = generator.gen_many(["user{}".format(i) for i in range(50)], 600)
+    finally:
+      generator.close()
+    assert len(sigs) == 50
+    assert len(set(sigs.values())) == 50